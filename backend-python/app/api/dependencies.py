@@ -0,0 +1,56 @@
+from typing import Optional
+from fastapi import Header, HTTPException, Query, Request
+
+from app.services.container import ServiceContainer, ServiceUnavailableError
+
+def get_services(request: Request) -> ServiceContainer:
+    """Retorna o contêiner de serviços da aplicação"""
+    return request.app.state.services
+
+async def _resolve(request: Request, name: str):
+    try:
+        return await get_services(request).aget(name)
+    except ServiceUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def get_claude_service(request: Request):
+    return await _resolve(request, "claude")
+
+async def get_firestore_service(request: Request):
+    return await _resolve(request, "firestore")
+
+async def get_neo4j_service(request: Request):
+    return await _resolve(request, "neo4j")
+
+async def get_vector_service(request: Request):
+    return await _resolve(request, "vector")
+
+async def get_storage_service(request: Request):
+    return await _resolve(request, "storage")
+
+async def get_job_queue(request: Request):
+    return await _resolve(request, "jobs")
+
+def get_cache_bypass(
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+) -> bool:
+    """Indica se o cliente pediu para ignorar o cache (X-Cache-Bypass ou Cache-Control: no-cache)"""
+    if x_cache_bypass and x_cache_bypass.lower() in ("1", "true", "yes"):
+        return True
+    return bool(cache_control and "no-cache" in cache_control.lower())
+
+
+def get_field_selection(serializer):
+    """
+    Dependência que interpreta ?fields= para as respostas de `serializer`
+
+    Sem o parâmetro, a resposta omite os campos volumosos (raw_response);
+    fields=* devolve o documento completo.
+    """
+    def dependency(fields: Optional[str] = Query(None, description="Campos da resposta, separados por vírgula (* para todos)")):
+        try:
+            return serializer.parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return dependency
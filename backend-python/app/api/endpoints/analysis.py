@@ -1,4 +1,9 @@
+import os
+import time
+import asyncio
+import logging
 from fastapi import APIRouter, Depends, HTTPException, Body, Form
+from fastapi.responses import StreamingResponse
 from typing import Dict, Optional
 from pydantic import BaseModel
 
@@ -7,8 +12,35 @@ from app.services.firestore_service import FirestoreService
 from app.services.graph.neo4j_service import Neo4jService
 from app.services.vector.vertex_vector_service import VertexVectorService
 from app.models.dimensional_analysis import DimensionalAnalysis
+from app.services.container import ServiceContainer
+from app.services.serialization import analysis_serializer, dumps
+from app.api.dependencies import (
+    get_services,
+    get_claude_service,
+    get_firestore_service,
+    get_neo4j_service,
+    get_vector_service,
+    get_cache_bypass,
+    get_field_selection,
+)
 
 router = APIRouter()
+logger = logging.getLogger("vintra-backend.analysis")
+
+# Tempo máximo (segundos) de cada destino de persistência
+SINK_TIMEOUTS = {
+    "firestore": float(os.getenv("ANALYSIS_FIRESTORE_TIMEOUT", "10")),
+    "neo4j": float(os.getenv("ANALYSIS_NEO4J_TIMEOUT", "10")),
+    "vector": float(os.getenv("ANALYSIS_VECTOR_TIMEOUT", "15")),
+}
+
+# Tempo máximo (segundos) do resumo da trajetória, calculado antes da gravação:
+# com o cache frio, a resposta segue sem trajetória e a carga da série continua
+# em segundo plano, aquecendo o cache para as próximas análises do paciente
+TRAJECTORY_TIMEOUT = float(os.getenv("ANALYSIS_TRAJECTORY_TIMEOUT", "0.5"))
+
+# Responder após o Firestore e concluir Neo4j/vetor em segundo plano
+BACKGROUND_SINKS = os.getenv("ANALYSIS_BACKGROUND_SINKS", "false").lower() == "true"
 
 # Modelos
 class AnalysisRequest(BaseModel):
@@ -16,24 +48,79 @@ class AnalysisRequest(BaseModel):
     contexto_paciente: Optional[str] = None
     sessao_id: Optional[str] = None
 
-# Dependências
-def get_claude_service():
-    return ClaudeService()
+@router.post("/analisar/stream")
+async def analisar_sessao_stream(
+    request: AnalysisRequest,
+    ignorar_cache: bool = Depends(get_cache_bypass),
+    campos = Depends(get_field_selection(analysis_serializer)),
+    services: ServiceContainer = Depends(get_services),
+    claude_service: ClaudeService = Depends(get_claude_service),
+    firestore_service: FirestoreService = Depends(get_firestore_service),
+    neo4j_service: Neo4jService = Depends(get_neo4j_service),
+    vector_service: VertexVectorService = Depends(get_vector_service)
+):
+    """
+    Realiza análise dimensional VINTRA emitindo server-sent events
+
+    Cada dimensão é enviada assim que sua linha é lida ("dimensao"), cada seção
+    textual ao terminar ("secao") e a análise persistida ao final ("resultado"),
+    com os campos de ?fields=.
+    """
+    sessao_id = request.sessao_id or f"temp_{int(time.time())}"
 
-def get_firestore_service():
-    return FirestoreService()
+    async def eventos():
+        yield _sse("inicio", {"sessao_id": sessao_id})
+        try:
+            async for nome, dados in claude_service.stream_dimensional(
+                request.transcricao, request.contexto_paciente, bypass_cache=ignorar_cache
+            ):
+                if nome == "analise":
+                    analise = dados
+                else:
+                    if nome == "cache":
+                        cache_status = dados
+                    yield _sse(nome, dados)
 
-def get_neo4j_service():
-    return Neo4jService()
+            # Persistência única ao final da geração
+            resultado = await _persistir_analise(
+                analise,
+                request.transcricao,
+                sessao_id,
+                firestore_service,
+                neo4j_service,
+                vector_service,
+                services=services,
+                segundo_plano=BACKGROUND_SINKS
+            )
+            yield _sse("resultado", analysis_serializer.select({**resultado, "cache": cache_status}, campos))
+        except asyncio.TimeoutError:
+            yield _sse("erro", {"detail": "Tempo limite da análise dimensional excedido"})
+        except HTTPException as e:
+            yield _sse("erro", {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"Erro na análise em streaming (sessão {sessao_id}): {e}", exc_info=True)
+            yield _sse("erro", {"detail": "Erro na análise dimensional"})
+
+    # Content-Encoding: identity impede que o GZipMiddleware retenha os eventos
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Content-Encoding": "identity"}
+    )
 
-def get_vector_service():
-    return VertexVectorService()
+def _sse(evento, dados):
+    """Formata um server-sent event com dados JSON"""
+    return f"event: {evento}\ndata: {dumps(dados).decode()}\n\n"
 
 @router.post("/analisar/{sessao_id}")
 async def analisar_sessao_com_id(
     sessao_id: str,
     transcricao: str = Form(...),
     contexto_paciente: Optional[str] = Form(None),
+    segundo_plano: Optional[bool] = None,
+    ignorar_cache: bool = Depends(get_cache_bypass),
+    campos = Depends(get_field_selection(analysis_serializer)),
+    services: ServiceContainer = Depends(get_services),
     claude_service: ClaudeService = Depends(get_claude_service),
     firestore_service: FirestoreService = Depends(get_firestore_service),
     neo4j_service: Neo4jService = Depends(get_neo4j_service),
@@ -41,19 +128,27 @@ async def analisar_sessao_com_id(
 ):
     """Realiza análise dimensional VINTRA de uma transcrição com ID de sessão"""
     
-    return await _analisar_transcricao(
+    resultado = await _analisar_transcricao(
         transcricao, 
         contexto_paciente, 
         sessao_id, 
         claude_service, 
         firestore_service, 
         neo4j_service, 
-        vector_service
+        vector_service,
+        services=services,
+        segundo_plano=segundo_plano,
+        usar_cache=not ignorar_cache
     )
+    return analysis_serializer.response(resultado, campos)
 
 @router.post("/analisar")
 async def analisar_sessao(
     request: AnalysisRequest,
+    segundo_plano: Optional[bool] = None,
+    ignorar_cache: bool = Depends(get_cache_bypass),
+    campos = Depends(get_field_selection(analysis_serializer)),
+    services: ServiceContainer = Depends(get_services),
     claude_service: ClaudeService = Depends(get_claude_service),
     firestore_service: FirestoreService = Depends(get_firestore_service),
     neo4j_service: Neo4jService = Depends(get_neo4j_service),
@@ -61,15 +156,19 @@ async def analisar_sessao(
 ):
     """Realiza análise dimensional VINTRA de uma transcrição"""
     
-    return await _analisar_transcricao(
+    resultado = await _analisar_transcricao(
         request.transcricao, 
         request.contexto_paciente, 
         request.sessao_id or f"temp_{int(time.time())}", 
         claude_service, 
         firestore_service, 
         neo4j_service, 
-        vector_service
+        vector_service,
+        services=services,
+        segundo_plano=segundo_plano,
+        usar_cache=not ignorar_cache
     )
+    return analysis_serializer.response(resultado, campos)
 
 async def _analisar_transcricao(
     transcricao: str,
@@ -78,75 +177,212 @@ async def _analisar_transcricao(
     claude_service: ClaudeService,
     firestore_service: FirestoreService,
     neo4j_service: Neo4jService,
-    vector_service: VertexVectorService
+    vector_service: VertexVectorService,
+    services: Optional[ServiceContainer] = None,
+    segundo_plano: Optional[bool] = None,
+    usar_cache: bool = True
 ):
-    """Função auxiliar para analisar transcrição"""
+    """
+    Função auxiliar para analisar transcrição
+    
+    Após a geração, a análise é gravada no Firestore e, confirmada a gravação,
+    Neo4j e o índice vetorial são gravados em paralelo. Com `segundo_plano`, a
+    resposta sai assim que o Firestore confirma e os destinos secundários
+    terminam como tarefas do contêiner de serviços.
+    Análises repetidas (mesma transcrição e contexto) vêm do cache, salvo
+    quando `usar_cache` é falso.
+    """
+    if segundo_plano is None:
+        segundo_plano = BACKGROUND_SINKS
     
     # Chamar Claude para análise dimensional
-    analise = await claude_service.analyze_dimensional(transcricao, contexto_paciente)
+    try:
+        analise, cache_status = await claude_service.analyze_dimensional_cached(
+            transcricao, contexto_paciente, bypass=not usar_cache
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Tempo limite da análise dimensional excedido")
     
-    # Armazenar no Firestore
-    analysis_id = await firestore_service.store_dimensional_analysis(sessao_id, analise)
+    resultado = await _persistir_analise(
+        analise,
+        transcricao,
+        sessao_id,
+        firestore_service,
+        neo4j_service,
+        vector_service,
+        services=services,
+        segundo_plano=segundo_plano
+    )
+    return {**resultado, "cache": cache_status}
+
+async def _persistir_analise(
+    analise: Dict,
+    transcricao: str,
+    sessao_id: str,
+    firestore_service: FirestoreService,
+    neo4j_service: Neo4jService,
+    vector_service: VertexVectorService,
+    services: Optional[ServiceContainer] = None,
+    segundo_plano: bool = False,
+    analysis_id: Optional[str] = None
+):
+    """
+    Grava a análise nos destinos de persistência e monta a resposta
     
-    # Criar nó de estado dimensional no Neo4j
+    O Firestore é gravado primeiro: se falhar, nada foi gravado no grafo nem
+    no índice vetorial, e a repetição da análise pelo cliente não deixa
+    estados ou embeddings órfãos. Os destinos secundários usam o ID da
+    análise como chave (estado no grafo) ou a sessão (embedding), de modo que
+    regravá-los não os duplica. Com `analysis_id` (ex.: o ID do job), a
+    análise no Firestore também é regravada em vez de duplicada.
+    """
+    analise["trajetoria"] = await _calcular_trajetoria(sessao_id, analise, neo4j_service)
+    
+    firestore_status, analysis_id = await _executar_sink(
+        "firestore",
+        sessao_id,
+        firestore_service.store_dimensional_analysis(sessao_id, analise, analysis_id)
+    )
+    if firestore_status != "ok":
+        raise HTTPException(
+            status_code=504 if firestore_status == "timeout" else 502,
+            detail="Falha ao armazenar análise dimensional"
+        )
+    
+    # Destinos secundários: estado no grafo e embedding vetorial
+    secundarios = _persistir_secundarios(
+        sessao_id, analysis_id, analise, transcricao, neo4j_service, vector_service
+    )
+    if segundo_plano and services is not None:
+        services.spawn(secundarios)
+        persistencia = {"firestore": firestore_status, "neo4j": "pendente", "vector": "pendente"}
+    else:
+        persistencia = {"firestore": firestore_status, **(await secundarios)}
+    
+    # Retornar análise dimensional
+    return {
+        "id": analysis_id,
+        "sessao_id": sessao_id,
+        **analise,
+        "persistencia": persistencia
+    }
+
+async def _calcular_trajetoria(sessao_id, analise, neo4j_service):
+    """Resumo da trajetória do paciente com o novo estado (None se indisponível)"""
     try:
-        node_id = await neo4j_service.create_dimensional_state(sessao_id, analise)
-        print(f"Nó dimensional criado com ID: {node_id}")
+        return await asyncio.wait_for(
+            neo4j_service.preview_trajectory(sessao_id, analise),
+            TRAJECTORY_TIMEOUT
+        )
     except Exception as e:
-        print(f"Erro ao criar nó dimensional no Neo4j: {e}")
+        logger.warning(f"Trajetória indisponível (sessão {sessao_id}): {e!r}")
+        return None
+
+async def _calcular_trajetorias(itens, neo4j_service):
+    """
+    Resumos da trajetória de vários estados novos, na ordem de `itens`
     
-    # Criar embedding vetorial
+    Args:
+        itens: Lista de tuplas (sessao_id, análise)
+        
+    Returns:
+        list: Resumos (todos None se indisponíveis no tempo limite)
+    """
     try:
-        embedding = await vector_service.create_dimensional_embedding(
-            analise, 
-            transcricao
+        return await asyncio.wait_for(
+            neo4j_service.preview_trajectories(itens),
+            TRAJECTORY_TIMEOUT
         )
-        print(f"Embedding criado com {embedding['dimensions']} dimensões")
-        # Armazenar embedding
-        await vector_service.store_embedding(sessao_id, embedding)
     except Exception as e:
-        print(f"Erro ao criar embedding: {e}")
+        logger.warning(f"Trajetórias indisponíveis ({len(itens)} itens): {e!r}")
+        return [None] * len(itens)
+
+async def _persistir_secundarios(sessao_id, analysis_id, analise, transcricao, neo4j_service, vector_service):
+    """Grava o estado dimensional (chave: ID da análise) no Neo4j e o embedding em paralelo"""
+    (neo4j_status, _), (vector_status, _) = await asyncio.gather(
+        _executar_sink(
+            "neo4j",
+            sessao_id,
+            neo4j_service.create_dimensional_state(sessao_id, analise, state_id=analysis_id)
+        ),
+        _executar_sink(
+            "vector",
+            sessao_id,
+            _persistir_embedding(sessao_id, analise, transcricao, vector_service)
+        )
+    )
+    return {"neo4j": neo4j_status, "vector": vector_status}
+
+async def _persistir_embedding(sessao_id, analise, transcricao, vector_service):
+    """Cria o embedding vetorial e o armazena no índice"""
+    embedding = await vector_service.create_dimensional_embedding(analise, transcricao)
+    return await vector_service.store_embedding(sessao_id, embedding)
+
+async def _executar_sink(nome, sessao_id, coro):
+    """
+    Executa um destino de persistência com tempo limite e captura de erro
     
-    # Retornar análise dimensional
+    Args:
+        nome: Nome do destino ("firestore", "neo4j", "vector")
+        sessao_id: ID da sessão (para os logs)
+        coro: Corrotina de gravação
+        
+    Returns:
+        tuple: Status ("ok", "timeout" ou "erro") e resultado da gravação
+    """
+    inicio = time.perf_counter()
+    contexto = {"sink": nome, "sessao_id": sessao_id}
+    try:
+        resultado = await asyncio.wait_for(coro, SINK_TIMEOUTS[nome])
+    except asyncio.TimeoutError:
+        logger.error(
+            f"Destino '{nome}' excedeu {SINK_TIMEOUTS[nome]}s (sessão {sessao_id})",
+            extra=contexto
+        )
+        return "timeout", None
+    except Exception as e:
+        logger.error(
+            f"Erro no destino '{nome}' (sessão {sessao_id}): {e}",
+            exc_info=True,
+            extra=contexto
+        )
+        return "erro", None
+    
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    logger.info(f"Destino '{nome}' gravado em {duracao_ms:.2f}ms (sessão {sessao_id})", extra=contexto)
+    return "ok", resultado
+
+@router.get("/cache/stats")
+async def estatisticas_cache(claude_service: ClaudeService = Depends(get_claude_service)):
+    """Contadores de acertos/falhas do cache de análises dimensionais"""
+    return claude_service.cache.stats()
+
+@router.get("/extracao/stats")
+async def estatisticas_extracao(claude_service: ClaudeService = Depends(get_claude_service)):
+    """Frequência de cada caminho de extração (completa, recuperada, padrão)"""
+    return claude_service.metrics.snapshot()
+
+@router.get("/embeddings/stats")
+async def estatisticas_embeddings(vector_service: VertexVectorService = Depends(get_vector_service)):
+    """Chamadas ao modelo de embedding, tamanho médio dos lotes e uso do cache de vetores"""
     return {
-        "id": analysis_id,
-        "sessao_id": sessao_id,
-        **analise
+        "lotes": vector_service.batcher.stats(),
+        "cache": vector_service.cache.stats()
     }
 
 @router.get("/similar/{sessao_id}")
 async def buscar_similares(
     sessao_id: str,
     limit: int = 5,
-    firestore_service: FirestoreService = Depends(get_firestore_service),
     vector_service: VertexVectorService = Depends(get_vector_service)
 ):
-    """Busca sessões similares com base em valores dimensionais"""
+    """Busca sessões similares a partir do embedding armazenado da sessão"""
+    similar_sessions = await vector_service.search_similar_to_session(sessao_id, limit)
     
-    # Implementação simples para MVP
-    # Em produção usaria Firestore para buscar valores dimensionais reais
-    # e Vertex Vector Search para busca semântica
-    
-    # Valores mock para demonstração
-    dimensional_values = {
-        "v1": -2.5,
-        "v2": 7.0,
-        "v3": 3.0,
-        "v4": 8.0,
-        "v5": 6.0,
-        "v6": 5.0,
-        "v7": 4.0,
-        "v8": 7.0,
-        "v9_past": 7.0,
-        "v9_present": 3.0,
-        "v9_future": 2.0,
-        "v10": 4.0
-    }
-    
-    # Buscar sessões similares
-    similar_sessions = await vector_service.search_similar_sessions(dimensional_values, limit)
+    if similar_sessions is None:
+        raise HTTPException(status_code=404, detail="Embedding da sessão não encontrado")
     
     return {
         "sessao_id": sessao_id,
         "similar_sessions": similar_sessions
-    }
\ No newline at end of file
+    }
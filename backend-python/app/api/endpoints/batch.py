@@ -0,0 +1,346 @@
+import os
+import time
+import json
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from pydantic import ValidationError
+
+from app.services.claude_service import ClaudeService
+from app.services.firestore_service import FirestoreService
+from app.services.graph.neo4j_service import Neo4jService
+from app.services.vector.vertex_vector_service import VertexVectorService
+from app.services.serialization import analysis_serializer, dumps
+from app.api.endpoints.analysis import AnalysisRequest, _calcular_trajetorias, _executar_sink
+from app.api.dependencies import (
+    get_claude_service,
+    get_firestore_service,
+    get_neo4j_service,
+    get_vector_service,
+    get_cache_bypass,
+    get_field_selection,
+)
+
+router = APIRouter()
+logger = logging.getLogger("vintra-backend.batch")
+
+# Análises simultâneas por lote (padrão e limite superior)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# Máximo de análises iniciadas por segundo (0 = sem limite)
+BATCH_RATE_LIMIT = float(os.getenv("BATCH_RATE_LIMIT", "0"))
+
+# Análises acumuladas antes de cada gravação em massa
+BATCH_WRITE_SIZE = int(os.getenv("BATCH_WRITE_SIZE", "25"))
+
+# Itens aceitos por requisição
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+@router.post("/analisar/lote")
+async def analisar_lote(
+    request: Request,
+    paralelismo: Optional[int] = None,
+    taxa: Optional[float] = None,
+    ignorar_cache: bool = Depends(get_cache_bypass),
+    campos = Depends(get_field_selection(analysis_serializer)),
+    claude_service: ClaudeService = Depends(get_claude_service),
+    firestore_service: FirestoreService = Depends(get_firestore_service),
+    neo4j_service: Neo4jService = Depends(get_neo4j_service),
+    vector_service: VertexVectorService = Depends(get_vector_service)
+):
+    """
+    Analisa várias transcrições e devolve os resultados em NDJSON
+
+    O corpo pode ser uma lista JSON de AnalysisRequest ou um stream
+    application/x-ndjson (um item por linha). Cada item gera uma linha com
+    seu índice assim que é persistido ou falha; a última linha traz o resumo.
+    As análises trazem os campos de ?fields= (sem raw_response por padrão).
+
+    Args:
+        paralelismo: Análises simultâneas (padrão BATCH_CONCURRENCY)
+        taxa: Máximo de análises iniciadas por segundo (padrão BATCH_RATE_LIMIT)
+    """
+    paralelismo = paralelismo or BATCH_CONCURRENCY
+    if not 1 <= paralelismo <= BATCH_MAX_CONCURRENCY:
+        raise HTTPException(
+            status_code=422,
+            detail=f"paralelismo deve estar entre 1 e {BATCH_MAX_CONCURRENCY}"
+        )
+    taxa = BATCH_RATE_LIMIT if taxa is None else taxa
+    if taxa < 0:
+        raise HTTPException(status_code=422, detail="taxa não pode ser negativa")
+
+    # O corpo é lido antes de responder: depois que o StreamingResponse começa,
+    # o Starlette passa a consumir as mensagens do cliente para detectar desconexão
+    if "ndjson" in request.headers.get("content-type", ""):
+        corpo = await _ler_ndjson(request)
+    else:
+        try:
+            corpo = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Corpo JSON inválido")
+        if not isinstance(corpo, list):
+            raise HTTPException(status_code=422, detail="O corpo deve ser uma lista de análises")
+    if len(corpo) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {BATCH_MAX_ITEMS} itens por lote")
+    itens = _ler_lista(corpo)
+
+    lote = LoteAnalise(
+        claude_service,
+        firestore_service,
+        neo4j_service,
+        vector_service,
+        paralelismo=paralelismo,
+        taxa=taxa,
+        usar_cache=not ignorar_cache
+    )
+
+    async def linhas():
+        async for resultado in lote.executar(itens):
+            if "resultado" in resultado:
+                resultado = {**resultado, "resultado": analysis_serializer.select(resultado["resultado"], campos)}
+            yield dumps(resultado) + b"\n"
+
+    # Content-Encoding: identity impede que o GZipMiddleware retenha as linhas até o fim
+    return StreamingResponse(
+        linhas(), media_type="application/x-ndjson", headers={"Content-Encoding": "identity"}
+    )
+
+async def _ler_lista(corpo):
+    for indice, item in enumerate(corpo):
+        yield indice, item
+
+async def _ler_ndjson(request):
+    """Lê o corpo NDJSON linha a linha (um item ou erro de decodificação por linha)"""
+    itens = []
+    pendente = b""
+    async for pedaco in request.stream():
+        pendente += pedaco
+        *linhas, pendente = pendente.split(b"\n")
+        itens.extend(_decodificar(linha) for linha in linhas if linha.strip())
+        if len(itens) > BATCH_MAX_ITEMS:
+            break
+    if pendente.strip():
+        itens.append(_decodificar(pendente))
+    return itens
+
+def _decodificar(linha):
+    try:
+        return json.loads(linha)
+    except ValueError as e:
+        return ValueError(f"Linha NDJSON inválida: {e}")
+
+class _LimiteTaxa:
+    """Espaça o início das análises para no máximo `taxa` por segundo"""
+
+    def __init__(self, taxa):
+        self.intervalo = 1.0 / taxa if taxa else 0.0
+        self._proximo = 0.0
+        self._lock = None
+
+    async def aguardar(self):
+        if not self.intervalo:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            agora = time.monotonic()
+            espera = self._proximo - agora
+            self._proximo = max(agora, self._proximo) + self.intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+class LoteAnalise:
+    """
+    Executa um lote de análises com concorrência limitada
+
+    As análises prontas são acumuladas e gravadas em massa (um commit em lote
+    no Firestore, um UNWIND no Neo4j, chamadas agrupadas de embedding), em
+    paralelo com as análises que ainda estão sendo geradas.
+    """
+
+    def __init__(self, claude_service, firestore_service, neo4j_service, vector_service,
+                 paralelismo=BATCH_CONCURRENCY, taxa=BATCH_RATE_LIMIT,
+                 tamanho_gravacao=BATCH_WRITE_SIZE, usar_cache=True):
+        self.claude_service = claude_service
+        self.firestore_service = firestore_service
+        self.neo4j_service = neo4j_service
+        self.vector_service = vector_service
+        self.paralelismo = paralelismo
+        self.limite_taxa = _LimiteTaxa(taxa)
+        self.tamanho_gravacao = max(1, tamanho_gravacao)
+        self.usar_cache = usar_cache
+
+    async def executar(self, itens):
+        """
+        Processa os itens e produz um resultado por item, na ordem de conclusão
+
+        Args:
+            itens: Iterador assíncrono de (índice, dict do item ou exceção)
+
+        Yields:
+            dict: Resultado de cada item e, por último, {"resumo": {...}}
+        """
+        resultados = asyncio.Queue()
+        semaforo = asyncio.Semaphore(self.paralelismo)
+        prontos = []
+        analises = set()
+        gravacoes = set()
+        resumo = {"total": 0, "ok": 0, "erro": 0}
+        inicio = time.perf_counter()
+
+        def gravar_prontos():
+            if prontos:
+                grupo = prontos[:]
+                prontos.clear()
+                tarefa = asyncio.ensure_future(self._gravar(grupo, resultados))
+                gravacoes.add(tarefa)
+                tarefa.add_done_callback(gravacoes.discard)
+
+        async def analisar(indice, pedido):
+            try:
+                await self.limite_taxa.aguardar()
+                analise, cache_status = await self.claude_service.analyze_dimensional_cached(
+                    pedido.transcricao,
+                    pedido.contexto_paciente,
+                    bypass=not self.usar_cache
+                )
+            except Exception as e:
+                logger.error(f"Erro na análise do item {indice} do lote: {e}", exc_info=True)
+                await resultados.put(_erro(indice, pedido.sessao_id, _mensagem(e)))
+                return
+            finally:
+                semaforo.release()
+
+            prontos.append((indice, pedido, analise, cache_status))
+            if len(prontos) >= self.tamanho_gravacao:
+                gravar_prontos()
+
+        async def produzir():
+            try:
+                async for indice, item in itens:
+                    resumo["total"] += 1
+                    pedido = _validar(indice, item)
+                    if isinstance(pedido, dict):
+                        await resultados.put(pedido)
+                        continue
+                    await semaforo.acquire()
+                    tarefa = asyncio.ensure_future(analisar(indice, pedido))
+                    analises.add(tarefa)
+                    tarefa.add_done_callback(analises.discard)
+
+                while analises:
+                    await asyncio.gather(*list(analises))
+                gravar_prontos()
+                while gravacoes:
+                    await asyncio.gather(*list(gravacoes))
+            finally:
+                await resultados.put(None)
+
+        produtor = asyncio.ensure_future(produzir())
+        try:
+            while True:
+                resultado = await resultados.get()
+                if resultado is None:
+                    break
+                resumo["ok" if resultado["status"] == "ok" else "erro"] += 1
+                yield resultado
+
+            # Propaga falha na leitura do corpo
+            await produtor
+            resumo["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+            yield {"resumo": resumo}
+        finally:
+            # Cliente desconectou: cancelar o trabalho pendente
+            for tarefa in [produtor, *analises, *gravacoes]:
+                tarefa.cancel()
+
+    async def _gravar(self, grupo, resultados):
+        """
+        Grava um grupo de análises em massa e publica o resultado de cada item
+
+        Como na análise individual, a trajetória de cada item é calculada antes
+        da gravação, e Neo4j e índice vetorial só são gravados depois que o
+        Firestore confirma, com os estados identificados pelos IDs das análises.
+        """
+        rotulo = f"lote[{grupo[0][0]}..{grupo[-1][0]}]"
+
+        # Trajetórias na ordem de entrada: itens do mesmo paciente são encadeados
+        em_ordem = sorted(grupo, key=lambda item: item[0])
+        trajetorias = await _calcular_trajetorias(
+            [(pedido.sessao_id, analise) for _, pedido, analise, _ in em_ordem],
+            self.neo4j_service
+        )
+        for (_, _, analise, _), trajetoria in zip(em_ordem, trajetorias):
+            analise["trajetoria"] = trajetoria
+
+        firestore_status, ids = await _executar_sink(
+            "firestore",
+            rotulo,
+            self.firestore_service.store_dimensional_analyses(
+                [(pedido.sessao_id, analise) for _, pedido, analise, _ in grupo]
+            )
+        )
+        if firestore_status != "ok":
+            for indice, pedido, _, _ in grupo:
+                await resultados.put(_erro(indice, pedido.sessao_id, "Falha ao armazenar análise dimensional"))
+            return
+
+        (neo4j_status, _), (vector_status, _) = await asyncio.gather(
+            _executar_sink(
+                "neo4j",
+                rotulo,
+                self.neo4j_service.create_dimensional_states(
+                    [(pedido.sessao_id, analise) for _, pedido, analise, _ in grupo],
+                    state_ids=ids
+                )
+            ),
+            _executar_sink("vector", rotulo, self._gravar_embeddings(grupo))
+        )
+
+        persistencia = {"firestore": firestore_status, "neo4j": neo4j_status, "vector": vector_status}
+        for posicao, (indice, pedido, analise, cache_status) in enumerate(grupo):
+            await resultados.put({
+                "indice": indice,
+                "status": "ok",
+                "resultado": {
+                    "id": ids[posicao],
+                    "sessao_id": pedido.sessao_id,
+                    **analise,
+                    "persistencia": persistencia,
+                    "cache": cache_status
+                }
+            })
+
+    async def _gravar_embeddings(self, grupo):
+        embeddings = await self.vector_service.create_dimensional_embeddings(
+            [(analise, pedido.transcricao) for _, pedido, analise, _ in grupo]
+        )
+        return await self.vector_service.store_embeddings(
+            [(pedido.sessao_id, embedding) for (_, pedido, _, _), embedding in zip(grupo, embeddings)]
+        )
+
+def _validar(indice, item):
+    """Converte o item em AnalysisRequest, ou devolve o resultado de erro"""
+    if isinstance(item, Exception):
+        return _erro(indice, None, str(item))
+    try:
+        pedido = AnalysisRequest.parse_obj(item)
+    except ValidationError as e:
+        return _erro(indice, None, e.errors())
+    if not pedido.sessao_id:
+        pedido.sessao_id = f"temp_{int(time.time())}_{indice}"
+    return pedido
+
+def _erro(indice, sessao_id, erro):
+    return {"indice": indice, "status": "erro", "sessao_id": sessao_id, "erro": erro}
+
+def _mensagem(erro):
+    if isinstance(erro, HTTPException):
+        return erro.detail
+    if isinstance(erro, asyncio.TimeoutError):
+        return "Tempo limite excedido na análise dimensional"
+    return str(erro) or erro.__class__.__name__
@@ -0,0 +1,145 @@
+import re
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from pydantic import BaseModel
+
+from app.services.storage_service import StorageService
+from app.api.dependencies import get_storage_service
+
+router = APIRouter()
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class UploadRequest(BaseModel):
+    caminho: str
+    content_type: Optional[str] = None
+    tamanho: Optional[int] = None
+
+@router.post("/uploads")
+async def iniciar_upload(
+    request: UploadRequest,
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """
+    Inicia um upload retomável (gravações longas de sessão)
+
+    As partes são enviadas em sequência com PUT /uploads/{upload_id}; após uma
+    falha, GET /uploads/{upload_id} informa o offset a partir do qual reenviar.
+    """
+    try:
+        return await storage_service.start_upload(request.caminho, request.content_type, request.tamanho)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/uploads/{upload_id}")
+async def status_upload(
+    upload_id: str,
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """Offset atual e conclusão de um upload retomável"""
+    try:
+        return await storage_service.upload_status(upload_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload não encontrado")
+
+@router.put("/uploads/{upload_id}")
+async def enviar_parte(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    final: bool = False,
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """
+    Envia uma parte de um upload retomável, lida do corpo em streaming
+
+    Args:
+        offset: Posição do primeiro byte da parte (deve ser o offset atual)
+        final: Última parte; conclui o arquivo
+    """
+    try:
+        return await storage_service.append_upload(upload_id, offset, request.stream(), final=final)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload não encontrado")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.put("/arquivos/{caminho:path}")
+async def enviar_arquivo(
+    caminho: str,
+    request: Request,
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """Grava o corpo da requisição em blocos, sem carregá-lo inteiro na memória"""
+    try:
+        url = await storage_service.upload_stream(request.stream(), caminho, request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"caminho": caminho, "url": url}
+
+@router.get("/arquivos/{caminho:path}")
+async def baixar_arquivo(
+    caminho: str,
+    range: Optional[str] = Header(None),
+    storage_service: StorageService = Depends(get_storage_service)
+):
+    """
+    Envia um arquivo em streaming, com suporte a Range (busca no áudio)
+
+    Um cabeçalho Range de faixa única gera 206 com Content-Range; faixas
+    múltiplas ou malformadas são ignoradas e o arquivo vai inteiro.
+    """
+    try:
+        info = await storage_service.stat(caminho)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    size = info["size"]
+    # Content-Encoding: identity impede que o GZipMiddleware comprima (e retenha) o áudio
+    headers = {"Accept-Ranges": "bytes", "Content-Encoding": "identity"}
+    faixa = _ler_range(range, size)
+    if faixa is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = faixa
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        storage_service.download_stream(caminho, start, end),
+        status_code=status_code,
+        media_type=info["content_type"],
+        headers=headers
+    )
+
+def _ler_range(valor, size):
+    """
+    Interpreta um cabeçalho Range de faixa única
+
+    Returns:
+        tuple: (início, fim inclusivo), ou None para enviar o arquivo inteiro
+
+    Raises:
+        HTTPException: 416 se a faixa estiver fora do arquivo
+    """
+    match = RANGE_PATTERN.match(valor.strip()) if valor else None
+    if match is None or match.groups() == ("", ""):
+        return None
+    inicio, fim = match.groups()
+    if inicio == "":
+        # Sufixo: os últimos N bytes
+        start, end = max(0, size - int(fim)), size - 1
+    else:
+        start = int(inicio)
+        end = min(int(fim), size - 1) if fim else size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Faixa fora do arquivo",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
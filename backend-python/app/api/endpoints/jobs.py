@@ -0,0 +1,95 @@
+import time
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.api.endpoints.analysis import AnalysisRequest, _persistir_analise
+from app.api.dependencies import get_job_queue
+from app.services.jobs.job_queue import JobQueue
+
+router = APIRouter()
+
+# Tipo de job para análise dimensional
+ANALYSIS_JOB = "analise"
+
+@router.post("/jobs", status_code=202)
+async def criar_job_analise(
+    request: AnalysisRequest,
+    response: Response,
+    queue: JobQueue = Depends(get_job_queue)
+):
+    """Enfileira uma análise dimensional e retorna imediatamente o ID do job"""
+    payload = {
+        "transcricao": request.transcricao,
+        "contexto_paciente": request.contexto_paciente,
+        "sessao_id": request.sessao_id or f"temp_{int(time.time())}"
+    }
+    job_id = await queue.aenqueue(ANALYSIS_JOB, payload)
+
+    status_url = f"/api/vintra/jobs/{job_id}"
+    response.headers["Location"] = status_url
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "sessao_id": payload["sessao_id"],
+        "status_url": status_url
+    }
+
+@router.get("/jobs/metrics")
+async def metricas_jobs(queue: JobQueue = Depends(get_job_queue)):
+    """Profundidade da fila de jobs por estado"""
+    return await queue.ametrics()
+
+@router.get("/jobs/{job_id}")
+async def consultar_job(job_id: str, queue: JobQueue = Depends(get_job_queue)):
+    """Consulta o estado de um job de análise"""
+    job = await queue.aget(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "sessao_id": job["payload"].get("sessao_id"),
+        "tentativas": job["attempts"],
+        "max_tentativas": job["max_attempts"],
+        "erro": job["error"],
+        "resultado": job["result"]
+    }
+
+def build_job_handlers(services):
+    """
+    Handlers executados pelo pool de workers
+
+    Args:
+        services: ServiceContainer da aplicação
+
+    Returns:
+        dict: {tipo do job: corrotina(payload, JobContext)}
+    """
+    async def processar_analise(payload, job):
+        # Novas tentativas reaproveitam a análise gerada (checkpoint do job) e
+        # regravam os destinos com o ID do job como ID da análise, sem duplicá-los
+        analise = job.checkpoint.get("analise")
+        cache_status = job.checkpoint.get("cache")
+        if analise is None:
+            claude_service = await services.aget("claude")
+            analise, cache_status = await claude_service.analyze_dimensional_cached(
+                payload["transcricao"], payload.get("contexto_paciente")
+            )
+            await job.save(analise=jsonable_encoder(analise), cache=cache_status)
+
+        resultado = await _persistir_analise(
+            analise,
+            payload["transcricao"],
+            payload["sessao_id"],
+            await services.aget("firestore"),
+            await services.aget("neo4j"),
+            await services.aget("vector"),
+            services=services,
+            segundo_plano=False,
+            analysis_id=job.job_id
+        )
+        return jsonable_encoder({**resultado, "cache": cache_status})
+
+    return {ANALYSIS_JOB: processar_analise}
@@ -1,18 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 
 from app.models.patient import Patient, PatientCreate
-from app.services.firestore_service import FirestoreService
+from app.services.firestore_service import FirestoreService, PATIENT_LIST_FIELDS
 from app.services.graph.neo4j_service import Neo4jService
+from app.services.serialization import patient_serializer
+from app.api.dependencies import get_firestore_service, get_neo4j_service, get_field_selection
 
 router = APIRouter()
 
-# Dependências
-def get_firestore_service():
-    return FirestoreService()
-
-def get_neo4j_service():
-    return Neo4jService()
+# Tamanho padrão e máximo de uma página da listagem de pacientes
+PATIENTS_PAGE_SIZE = int(os.getenv("PATIENTS_PAGE_SIZE", "50"))
+PATIENTS_MAX_PAGE_SIZE = int(os.getenv("PATIENTS_MAX_PAGE_SIZE", "200"))
 
 @router.post("/", response_model=Patient)
 async def create_patient(
@@ -21,8 +22,9 @@ async def create_patient(
     neo4j_service: Neo4jService = Depends(get_neo4j_service)
 ):
     """Cria um novo paciente no sistema"""
-    # Salvar no Firestore
-    patient_id = await firestore_service.create_patient(patient.dict())
+    # Salvar no Firestore (patient_data recebe data_criacao)
+    patient_data = patient.dict()
+    patient_id = await firestore_service.create_patient(patient_data)
     
     # Criar nó no Neo4j (apenas metadados não identificáveis)
     safe_metadata = {
@@ -36,13 +38,20 @@ async def create_patient(
         # Erro no Neo4j não deve impedir a criação do paciente
         print(f"Erro ao criar nó de paciente no Neo4j: {e}")
     
-    # Recuperar o paciente completo
-    patient_data = await firestore_service.get_patient(patient_id)
-    return {**patient_data, "id": patient_id}
+    # O documento gravado já está em patient_data; não é preciso relê-lo
+    return patient_serializer.response({**patient_data, "id": patient_id})
+
+@router.get("/cache/stats")
+async def patient_cache_stats(
+    firestore_service: FirestoreService = Depends(get_firestore_service)
+):
+    """Estatísticas dos caches de leitura de pacientes e sessões"""
+    return firestore_service.cache_stats()
 
 @router.get("/{patient_id}", response_model=Patient)
 async def get_patient(
     patient_id: str,
+    campos = Depends(get_field_selection(patient_serializer)),
     firestore_service: FirestoreService = Depends(get_firestore_service)
 ):
     """Recupera um paciente pelo ID"""
@@ -51,37 +60,65 @@ async def get_patient(
     if not patient_data:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
     
-    return {**patient_data, "id": patient_id}
+    return patient_serializer.response({**patient_data, "id": patient_id}, campos)
+
+@router.get("/{patient_id}/trajetoria")
+async def get_patient_trajectory(
+    patient_id: str,
+    limite: int = Query(100, ge=1, le=1000),
+    neo4j_service: Neo4jService = Depends(get_neo4j_service)
+):
+    """Trajetória dimensional do paciente: métricas por sessão e resumo da última"""
+    trajectory = await neo4j_service.get_trajectory_analysis(patient_id)
+    
+    if not len(trajectory):
+        raise HTTPException(status_code=404, detail="Paciente sem estados dimensionais")
+    
+    return {
+        "paciente_id": patient_id,
+        "sessoes": trajectory.to_dict(limite),
+        "resumo": trajectory.summary()
+    }
 
 @router.get("/", response_model=List[Patient])
 async def list_patients(
+    limite: int = Query(PATIENTS_PAGE_SIZE, ge=1, le=PATIENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    formato: str = Query("json", regex="^(json|ndjson)$"),
+    campos = Depends(get_field_selection(patient_serializer)),
     firestore_service: FirestoreService = Depends(get_firestore_service)
 ):
-    """Lista todos os pacientes"""
-    # Implementação simulada para MVP
-    # Em produção, isso viria do Firestore real
+    """
+    Lista pacientes com paginação por cursor
+    
+    Somente os campos da listagem são lidos (sem contato e metadados), salvo
+    quando outros são pedidos em ?fields=. O cursor da próxima página vem no
+    cabeçalho X-Next-Cursor. Com
+    formato=ndjson, todos os pacientes a partir do cursor são enviados em
+    streaming, um por linha, para exportação.
+    """
+    # Campos lidos do Firestore: os da listagem ou os pedidos (todos com fields=*)
+    if campos is None:
+        leitura = PATIENT_LIST_FIELDS
+    elif "*" in campos:
+        leitura = None
+    else:
+        leitura = [name for name in campos if name != "id"]
+    
+    if formato == "ndjson":
+        async def linhas():
+            async for patient_id, patient_data in firestore_service.iter_patients(cursor=cursor, fields=leitura):
+                yield patient_serializer.dumps({**patient_data, "id": patient_id}, campos) + b"\n"
+        
+        # Content-Encoding: identity impede que o GZipMiddleware retenha as linhas até o fim
+        return StreamingResponse(
+            linhas(), media_type="application/x-ndjson", headers={"Content-Encoding": "identity"}
+        )
     
-    # Lista fixa para demonstração
-    return [
-        {
-            "id": "patient_1",
-            "nome": "João Silva",
-            "data_nascimento": "1980-01-15",
-            "data_criacao": "2023-10-01T14:30:00",
-            "genero": "Masculino"
-        },
-        {
-            "id": "patient_2",
-            "nome": "Maria Santos",
-            "data_nascimento": "1975-05-20",
-            "data_criacao": "2023-09-15T10:15:00",
-            "genero": "Feminino"
-        },
-        {
-            "id": "patient_3",
-            "nome": "Carlos Oliveira",
-            "data_nascimento": "1990-11-05",
-            "data_criacao": "2023-10-10T09:20:00",
-            "genero": "Masculino"
-        }
-    ]
\ No newline at end of file
+    page, next_cursor = await firestore_service.list_patients(limite, cursor=cursor, fields=leitura)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return Response(
+        patient_serializer.dumps_many([{**patient_data, "id": patient_id} for patient_id, patient_data in page], campos),
+        media_type="application/json",
+        headers=headers
+    )
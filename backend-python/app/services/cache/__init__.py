@@ -0,0 +1 @@
+# VINTRA Cache Services
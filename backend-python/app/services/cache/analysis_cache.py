@@ -0,0 +1,153 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import sqlite3
+import asyncio
+import threading
+import unicodedata
+
+from app.services.cache.ttl_cache import TTLCache
+
+class AnalysisCache:
+    """
+    Cache endereçado por conteúdo para análises dimensionais
+
+    A chave é o hash da transcrição normalizada, do contexto do paciente, do
+    modelo e da versão do prompt; mudar o prompt ou o modelo gera chaves novas
+    e as entradas antigas deixam de ser usadas. Há um nível LRU em memória e um
+    nível opcional em disco (SQLite) que sobrevive a reinicializações.
+    """
+
+    def __init__(self, version, path=None):
+        """
+        Args:
+            version: Identificador do modelo e da versão do prompt
+            path: Arquivo SQLite do nível em disco (padrão: ANALYSIS_CACHE_PATH; vazio desativa)
+        """
+        self.version = version
+        self.enabled = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+        self.ttl = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+        self.memory = TTLCache(
+            max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "512")),
+            ttl=self.ttl
+        )
+        self.disk_hits = 0
+        self.bypasses = 0
+
+        self.path = path if path is not None else os.getenv("ANALYSIS_CACHE_PATH", "")
+        self._conn = None
+        self._lock = threading.Lock()
+        if self.enabled and self.path:
+            self._open_disk()
+
+    def _open_disk(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        # Entradas de outras versões de prompt/modelo nunca mais serão lidas
+        self._conn.execute(
+            "DELETE FROM analysis_cache WHERE version != ? OR expires_at <= ?",
+            (self.version, time.time())
+        )
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    def make_key(self, transcription, patient_context=None, variant=None):
+        """
+        Calcula a chave do cache
+
+        Args:
+            transcription: Transcrição da sessão
+            patient_context: Contexto opcional do paciente
+            variant: Distingue análises geradas por outro caminho (ex.: streaming
+                em texto quando a versão é de saída JSON)
+
+        Returns:
+            str: Hash SHA-256 hexadecimal
+        """
+        parts = [self.version, _normalize(transcription), _normalize(patient_context or "")]
+        if variant is not None:
+            parts.append(variant)
+        material = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get(self, key):
+        """
+        Recupera uma análise do cache
+
+        Returns:
+            dict: Cópia da análise armazenada, ou None
+        """
+        if not self.enabled:
+            return None
+
+        value = self.memory.get(key)
+        if value is None and self._conn is not None:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+        return copy.deepcopy(value) if value is not None else None
+
+    async def set(self, key, analysis):
+        """Armazena uma análise nos dois níveis"""
+        if not self.enabled:
+            return
+        value = copy.deepcopy(analysis)
+        self.memory.set(key, value)
+        if self._conn is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    def record_bypass(self):
+        self.bypasses += 1
+
+    def _disk_get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM analysis_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _disk_set(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, version, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, self.version, json.dumps(value, default=str), time.time() + self.ttl)
+            )
+
+    def stats(self):
+        """Contadores de acertos e falhas por nível"""
+        memory = self.memory.stats()
+        return {
+            "enabled": self.enabled,
+            "version": self.version,
+            "memory": memory,
+            "disk_enabled": self._conn is not None,
+            "disk_hits": self.disk_hits,
+            "hits": memory["hits"] + self.disk_hits,
+            "misses": memory["misses"] - self.disk_hits,
+            "bypasses": self.bypasses
+        }
+
+def _normalize(text):
+    """Normaliza Unicode e espaços para que reenvios idênticos gerem a mesma chave"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
@@ -0,0 +1,109 @@
+import os
+import copy
+import asyncio
+import logging
+
+from app.services.cache.ttl_cache import TTLCache
+
+logger = logging.getLogger("vintra-backend.cache")
+
+class DocumentCache:
+    """
+    Cache de leitura (read-through) para documentos do Firestore
+
+    Na ausência, o documento é lido uma única vez mesmo com leituras
+    simultâneas. Depois do TTL, o valor antigo continua sendo servido por
+    DOCUMENT_CACHE_STALE_SECONDS enquanto uma releitura em segundo plano o
+    atualiza. Gravações chamam `set` ou `invalidate`; uma releitura iniciada
+    antes da invalidação não sobrescreve o valor novo. A invalidação vale só
+    para este processo: o TTL limita a defasagem em relação a outros workers.
+    """
+
+    def __init__(self, name):
+        """
+        Args:
+            name: Nome do cache (para estatísticas e logs)
+        """
+        self.name = name
+        self.enabled = os.getenv("DOCUMENT_CACHE_ENABLED", "true").lower() == "true"
+        self.cache = TTLCache(
+            max_entries=int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "2048")),
+            ttl=float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "60")),
+            stale_ttl=float(os.getenv("DOCUMENT_CACHE_STALE_SECONDS", "300"))
+        )
+        # Leituras em andamento por chave
+        self._loading = {}
+        self.revalidations = 0
+
+    async def get(self, key, loader):
+        """
+        Retorna o documento do cache ou o lê com `loader`
+
+        Args:
+            key: ID do documento
+            loader: Corrotina loader(key) -> dados do documento ou None
+
+        Returns:
+            dict: Cópia dos dados do documento, ou None se não existir
+        """
+        if not self.enabled:
+            return await loader(key)
+
+        value, stale = self.cache.get_stale(key)
+        if value is not None:
+            if stale and key not in self._loading:
+                self.revalidations += 1
+                self._start_load(key, loader)
+            return copy.deepcopy(value)
+
+        task = self._loading.get(key) or self._start_load(key, loader)
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def peek(self, key):
+        """Valor dentro do TTL, sem leitura nem revalidação (None se ausente ou expirado)"""
+        if not self.enabled:
+            return None
+        return self.cache.get(key)
+
+    def _start_load(self, key, loader):
+        task = asyncio.ensure_future(self._load(key, loader))
+        self._loading[key] = task
+        # Releituras em segundo plano não têm quem aguarde o resultado
+        task.add_done_callback(_log_failure)
+        return task
+
+    async def _load(self, key, loader):
+        # Uma invalidação durante a leitura desvincula a tarefa da chave
+        current = asyncio.current_task()
+        try:
+            value = await loader(key)
+            # Documentos ausentes não são guardados: podem ser criados a seguir
+            if value is not None and self._loading.get(key) is current:
+                self.cache.set(key, copy.deepcopy(value))
+            return value
+        finally:
+            if self._loading.get(key) is current:
+                del self._loading[key]
+
+    def set(self, key, value):
+        """Grava o valor recém-escrito no cache (invalidando leituras em andamento)"""
+        self.invalidate(key)
+        if self.enabled and value is not None:
+            self.cache.set(key, copy.deepcopy(value))
+
+    def invalidate(self, key):
+        """Descarta a entrada e impede que leituras em andamento a regravem"""
+        self._loading.pop(key, None)
+        self.cache.invalidate(key)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "revalidations": self.revalidations,
+            "loading": len(self._loading),
+            **self.cache.stats()
+        }
+
+def _log_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Falha na leitura do documento para o cache: {task.exception()}")
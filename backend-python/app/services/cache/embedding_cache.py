@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import asyncio
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Cache persistente de embeddings endereçado pelo texto de entrada
+
+    A chave é o hash do texto canônico (Unicode NFC, espaços normalizados) e do
+    modelo de embedding. Os vetores são guardados como float32 compactos num
+    arquivo SQLite limitado em bytes (descarta os menos usados) e os mais
+    recentes são carregados em memória na inicialização.
+    """
+
+    def __init__(self, model_id, path=None):
+        """
+        Args:
+            model_id: Modelo que gerou os vetores (parte da chave)
+            path: Arquivo SQLite (padrão: EMBEDDING_CACHE_PATH; vazio = somente memória)
+        """
+        self.model_id = model_id
+        self.enabled = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+        self.max_disk_bytes = int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        self.max_memory_bytes = int(float(os.getenv("EMBEDDING_CACHE_MEMORY_MB", "32")) * 1024 * 1024)
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.path = path if path is not None else os.getenv(
+            "EMBEDDING_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "vintra-embeddings.db")
+        )
+        self._conn = None
+        if self.enabled and self.path:
+            self._open_disk()
+
+    def _open_disk(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_last_used ON embedding_cache (last_used)")
+        self._disk_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embedding_cache"
+        ).fetchone()[0]
+
+        # Carga inicial: vetores usados mais recentemente, até o limite de memória
+        for key, blob in self._conn.execute(
+            "SELECT key, vector FROM embedding_cache ORDER BY last_used DESC"
+        ):
+            if self._memory_bytes + len(blob) > self.max_memory_bytes:
+                break
+            self._memory[key] = np.frombuffer(blob, dtype=np.float32)
+            self._memory_bytes += len(blob)
+        self._memory = OrderedDict(reversed(list(self._memory.items())))
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    def make_key(self, text):
+        """
+        Calcula a chave do cache
+
+        Returns:
+            str: Hash SHA-256 hexadecimal do modelo e do texto canônico
+        """
+        canonical = " ".join(unicodedata.normalize("NFC", text).split())
+        material = json.dumps([self.model_id, canonical], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get_many(self, texts):
+        """
+        Recupera os vetores de vários textos
+
+        Returns:
+            list: Vetor float32 de cada texto, ou None se ausente
+        """
+        if not self.enabled:
+            return [None] * len(texts)
+
+        keys = [self.make_key(text) for text in texts]
+        with self._lock:
+            vectors = [self._memory_get(key) for key in keys]
+        missing = [key for key, vector in zip(keys, vectors) if vector is None]
+
+        if missing and self._conn is not None:
+            found = await asyncio.to_thread(self._disk_get, missing)
+            with self._lock:
+                for key, vector in found.items():
+                    self._memory_set(key, vector)
+                self.disk_hits += len(found)
+            vectors = [found.get(key) if vector is None else vector for key, vector in zip(keys, vectors)]
+
+        with self._lock:
+            misses = sum(vector is None for vector in vectors)
+            self.misses += misses
+            self.hits += len(vectors) - misses
+        return vectors
+
+    async def set_many(self, texts, vectors):
+        """Armazena vetores em memória e em disco"""
+        if not self.enabled:
+            return
+        items = [
+            (self.make_key(text), np.asarray(vector, dtype=np.float32))
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            for key, vector in items:
+                self._memory_set(key, vector)
+        if self._conn is not None:
+            await asyncio.to_thread(self._disk_set, items)
+
+    def _memory_get(self, key):
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+        return vector
+
+    def _memory_set(self, key, vector):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.nbytes
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _disk_get(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})",
+                keys
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows]
+                )
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    def _disk_set(self, items):
+        now = time.time()
+        with self._lock:
+            # O tamanho em disco só é atualizado se a transação for confirmada
+            delta = 0
+            self._conn.execute("BEGIN")
+            try:
+                for key, vector in items:
+                    row = self._conn.execute(
+                        "SELECT LENGTH(vector) FROM embedding_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row:
+                        delta -= row[0]
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO embedding_cache (key, vector, last_used) VALUES (?, ?, ?)",
+                        (key, vector.tobytes(), now)
+                    )
+                    delta += vector.nbytes
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._disk_bytes += delta
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Descarta os vetores menos usados até 90% do limite em disco"""
+        target = self.max_disk_bytes * 0.9
+        rows = self._conn.execute(
+            "SELECT key, LENGTH(vector) FROM embedding_cache ORDER BY last_used ASC"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            evicted.append((key,))
+            self._disk_bytes -= size
+        self._conn.executemany("DELETE FROM embedding_cache WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def stats(self):
+        """Acertos, falhas e ocupação de cada nível"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "model": self.model_id,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_enabled": self._conn is not None,
+                "disk_bytes": self._disk_bytes,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Cache LRU em memória com expiração por entrada
+
+    Limitado por número de entradas; a entrada menos usada é descartada
+    quando o limite é atingido. Com `stale_ttl`, entradas expiradas continuam
+    disponíveis por mais esse tempo em `get_stale`, para quem aceita servir
+    um valor antigo enquanto o revalida.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, stale_ttl=0):
+        """
+        Args:
+            max_entries: Número máximo de entradas
+            ttl: Tempo de vida padrão das entradas, em segundos
+            stale_ttl: Tempo adicional em que a entrada expirada ainda pode ser lida por `get_stale`
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Recupera um valor válido
+
+        Returns:
+            Valor armazenado, ou None se ausente ou expirado
+        """
+        return self.get_stale(key, allow_stale=False)[0]
+
+    def get_stale(self, key, allow_stale=True):
+        """
+        Recupera um valor, aceitando entradas expiradas dentro de `stale_ttl`
+
+        Returns:
+            tuple: (valor, expirado); (None, False) se ausente
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] + self.stale_ttl <= now:
+                del self._data[key]
+                entry = None
+            if entry is None or (entry[1] <= now and not allow_stale):
+                self.misses += 1
+                return None, False
+            self._data.move_to_end(key)
+            if entry[1] <= now:
+                self.stale_hits += 1
+                return entry[0], True
+            self.hits += 1
+            return entry[0], False
+
+    def set(self, key, value, ttl=None):
+        """Armazena um valor, descartando a entrada menos usada se necessário"""
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Remove uma entrada"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Estatísticas de uso do cache"""
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.stale_hits) / total, 4) if total else 0.0
+        }
@@ -1,8 +1,35 @@
 import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import vertexai
 from vertexai.language_models import TextGenerationModel
-import re
 import json
+import hashlib
+import logging
+
+from app.services.response_parser import IncrementalResponseParser, parse_response
+from app.services.transcript_chunker import chunk_transcript
+from app.services.cache.analysis_cache import AnalysisCache
+from app.services.structured_output import (
+    DEFAULTS,
+    DIMENSION_FIELDS,
+    TEXT_FIELDS,
+    ExtractionMetrics,
+    describe_field,
+    extract_json_object,
+    schema_description,
+    validate_fields,
+)
+
+logger = logging.getLogger("vintra-backend.claude")
+
+# Modelo usado na análise dimensional
+MODEL_ID = "claude-3-sonnet@20240229"
+
+# Incrementar ao mudar a extração ou o formato do resultado sem mudar o prompt
+PROMPT_VERSION = "2"
 
 class ClaudeService:
     def __init__(self):
@@ -14,42 +41,450 @@ class ClaudeService:
         vertexai.init(project=project_id, location=location)
         
         # Carregar modelo Claude
-        self.model = TextGenerationModel.from_pretrained("claude-3-sonnet@20240229")
+        self.model = TextGenerationModel.from_pretrained(MODEL_ID)
+        
+        # Limites para gerações simultâneas e tempo máximo por chamada
+        self.max_concurrency = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "16"))
+        self.timeout = float(os.getenv("CLAUDE_TIMEOUT_SECONDS", "120"))
+        
+        # Executor dedicado ao cliente síncrono, fora do event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="claude"
+        )
+        # Criado sob demanda, dentro do event loop que o utiliza
+        self._semaphore = None
+        
+        # "text" (blocos markdown) ou "json" (saída estruturada validada pelo schema)
+        self.output_mode = os.getenv("CLAUDE_OUTPUT_MODE", "text").lower()
+        # Perguntas complementares para campos ausentes ou fora da escala
+        self.reask_attempts = int(os.getenv("CLAUDE_REASK_ATTEMPTS", "1"))
+        self.metrics = ExtractionMetrics()
+        
+        # Transcrições acima do limite são analisadas em trechos paralelos (map-reduce)
+        self.long_transcript_chars = int(os.getenv("CLAUDE_LONG_TRANSCRIPT_CHARS", "24000"))
+        self.chunk_chars = int(os.getenv("CLAUDE_CHUNK_CHARS", "12000"))
+        self.chunk_overlap_chars = int(os.getenv("CLAUDE_CHUNK_OVERLAP_CHARS", "1000"))
+        
+        # Cache de análises por conteúdo (transcrição, contexto, modelo, prompt)
+        self.cache = AnalysisCache(self.cache_version())
+    
+    def close(self):
+        """Libera as threads do executor do modelo e o cache em disco"""
+        self._executor.shutdown(wait=False)
+        self.cache.close()
+    
+    def cache_version(self):
+        """
+        Versão das análises geradas por este serviço
+        
+        Inclui o hash do template do prompt, de modo que qualquer alteração em
+        `_build_dimensional_prompt` invalida automaticamente o cache.
+        """
+        template = (
+            self._build_dimensional_prompt("{transcricao}", "{contexto}")
+            + self._build_structured_prompt("{transcricao}", "{contexto}")
+            + self._build_reask_prompt("{transcricao}", "{contexto}", DIMENSION_FIELDS)
+            + self._build_chunk_prompt("{trecho}", 1, 2, "{contexto}")
+            + self._build_reduce_prompt(DEFAULTS, ["{resumo}"], "{contexto}")
+            + f"{self.long_transcript_chars}:{self.chunk_chars}:{self.chunk_overlap_chars}"
+        )
+        template_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+        return f"{MODEL_ID}:{PROMPT_VERSION}:{self.output_mode}:{template_hash}"
     
-    async def analyze_dimensional(self, transcription, patient_context=None):
+    async def analyze_dimensional_cached(self, transcription, patient_context=None, timeout=None, bypass=False):
+        """
+        Análise dimensional com cache por conteúdo
+        
+        Args:
+            transcription: A transcrição textual
+            patient_context: Contexto opcional do paciente
+            timeout: Tempo máximo da geração em segundos (opcional)
+            bypass: Ignorar o cache na leitura (o resultado novo é armazenado)
+            
+        Returns:
+            tuple: (análise, estado do cache: "hit", "miss" ou "bypass")
+        """
+        key = self.cache.make_key(transcription, patient_context)
+        
+        if bypass:
+            self.cache.record_bypass()
+        else:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached, "hit"
+        
+        result = await self.analyze_dimensional(transcription, patient_context, timeout=timeout)
+        await self.cache.set(key, result)
+        return result, "bypass" if bypass else "miss"
+    
+    async def _predict(self, prompt, timeout=None, **kwargs):
+        """
+        Executa uma geração sem bloquear o event loop
+        
+        Args:
+            prompt: Prompt completo
+            timeout: Tempo máximo em segundos (padrão: CLAUDE_TIMEOUT_SECONDS)
+            **kwargs: Parâmetros de geração repassados ao modelo
+            
+        Returns:
+            Resposta do modelo
+            
+        Raises:
+            asyncio.TimeoutError: Se a geração exceder o tempo limite
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        await self._semaphore.acquire()
+        try:
+            # Preferir o cliente assíncrono nativo quando disponível
+            predict_async = getattr(self.model, "predict_async", None)
+            if predict_async is not None:
+                call = asyncio.ensure_future(predict_async(prompt=prompt, **kwargs))
+            else:
+                loop = asyncio.get_running_loop()
+                call = loop.run_in_executor(
+                    self._executor,
+                    functools.partial(self.model.predict, prompt=prompt, **kwargs)
+                )
+        except BaseException:
+            self._semaphore.release()
+            raise
+        
+        # A vaga só é liberada quando a geração termina de fato: uma chamada no
+        # executor que excede o tempo limite continua ocupando sua thread, e
+        # liberar a vaga antes faria as próximas chamadas esperarem na fila do
+        # executor (consumindo o próprio tempo limite)
+        call.add_done_callback(self._release_slot)
+        if predict_async is None:
+            call = asyncio.shield(call)
+        return await asyncio.wait_for(call, timeout or self.timeout)
+    
+    def _release_slot(self, future):
+        self._semaphore.release()
+        # Resultado de uma chamada abandonada por tempo limite: evita o aviso
+        # de exceção não recuperada
+        if not future.cancelled():
+            future.exception()
+    
+    async def analyze_dimensional(self, transcription, patient_context=None, timeout=None):
         """
         Analisa uma transcrição para extrair dados dimensionais VINTRA
         
         Args:
             transcription: A transcrição textual
             patient_context: Contexto opcional do paciente
+            timeout: Tempo máximo da geração em segundos (opcional)
             
         Returns:
             dict: Análise dimensional VINTRA
         """
+        if self._is_long(transcription):
+            return await self._analyze_long(transcription, patient_context, timeout)
+        
+        structured = self.output_mode == "json"
+        
         # Construir prompt para análise dimensional
-        prompt = self._build_dimensional_prompt(transcription, patient_context)
+        if structured:
+            prompt = self._build_structured_prompt(transcription, patient_context)
+        else:
+            prompt = self._build_dimensional_prompt(transcription, patient_context)
         
         # Chamar Claude via Vertex AI
-        response = self.model.predict(prompt=prompt, max_output_tokens=8192)
-        
-        # Processar resposta para extrair valores dimensionais
-        raw_response = response.text
-        dimensional_values = self._extract_dimensional_values(raw_response)
-        
-        # Extrair elementos textuais
-        narrative = self._extract_section(raw_response, "Síntese Narrativa", "Formulação Integrativa")
-        formulation = self._extract_section(raw_response, "Formulação Integrativa", "Recomendações")
-        recommendations = self._extract_recommendations(raw_response)
-        
-        # Montar resultado completo
-        result = {
-            **dimensional_values,
-            "sintese_narrativa": narrative,
-            "formulacao_integrativa": formulation,
-            "recomendacoes": recommendations,
+        response = await self._predict(prompt, timeout=timeout, max_output_tokens=8192)
+        
+        return await self._finalize(
+            response.text, transcription, patient_context, timeout, structured=structured
+        )
+    
+    async def stream_dimensional(self, transcription, patient_context=None, timeout=None, bypass_cache=False):
+        """
+        Analisa uma transcrição emitindo eventos conforme o modelo gera o texto
+        
+        Args:
+            transcription: A transcrição textual
+            patient_context: Contexto opcional do paciente
+            timeout: Tempo máximo da geração completa em segundos (opcional)
+            bypass_cache: Ignorar o cache na leitura
+            
+        Yields:
+            tuple: (evento, dados) — "cache" no início, "dimensao" e "secao"
+                durante a geração e "analise" com o resultado completo ao final
+        """
+        # O streaming sempre usa o prompt em texto (os eventos saem do parser
+        # incremental); no modo JSON suas análises não passaram pela validação
+        # do esquema e ficam numa chave própria, fora do alcance de /analisar
+        variant = "texto" if self.output_mode == "json" else None
+        key = self.cache.make_key(transcription, patient_context, variant=variant)
+        
+        if bypass_cache:
+            self.cache.record_bypass()
+        else:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                # Reproduzir a análise armazenada como se tivesse sido gerada
+                yield "cache", "hit"
+                parser = IncrementalResponseParser()
+                for event in parser.feed(cached.get("raw_response") or ""):
+                    yield event
+                for event in parser.finish():
+                    yield event
+                yield "analise", cached
+                return
+        
+        yield "cache", "bypass" if bypass_cache else "miss"
+        
+        if self._is_long(transcription):
+            # Trechos são analisados em paralelo; os eventos saem da resposta combinada
+            result = await self._analyze_long(transcription, patient_context, timeout)
+            await self.cache.set(key, result)
+            parser = IncrementalResponseParser()
+            for event in parser.feed(result["raw_response"]) + parser.finish():
+                yield event
+            yield "analise", result
+            return
+        
+        prompt = self._build_dimensional_prompt(transcription, patient_context)
+        parser = IncrementalResponseParser()
+        chunks = []
+        
+        async for text in self._predict_streaming(prompt, timeout=timeout, max_output_tokens=8192):
+            chunks.append(text)
+            for event in parser.feed(text):
+                yield event
+        
+        for event in parser.finish():
+            yield event
+        
+        result = await self._finalize("".join(chunks), transcription, patient_context, timeout)
+        await self.cache.set(key, result)
+        yield "analise", result
+    
+    async def _predict_streaming(self, prompt, timeout=None, **kwargs):
+        """
+        Executa uma geração em streaming sem bloquear o event loop
+        
+        O iterador síncrono do SDK é consumido numa thread do executor e os
+        pedaços são repassados ao event loop por uma fila.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+        
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop já encerrado
+                stop.set()
+        
+        def produce():
+            try:
+                for chunk in self.model.predict_streaming(prompt=prompt, **kwargs):
+                    if stop.is_set():
+                        break
+                    put(chunk.text)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+                # A vaga só é liberada quando a thread sai do SDK (como em _predict):
+                # `stop` só é verificado entre pedaços, e um cliente desconectado
+                # não pode liberar a vaga com a thread ainda presa na geração
+                try:
+                    loop.call_soon_threadsafe(semaphore.release)
+                except RuntimeError:
+                    pass
+        
+        semaphore = self._semaphore
+        await semaphore.acquire()
+        try:
+            loop.run_in_executor(self._executor, produce)
+        except BaseException:
+            semaphore.release()
+            raise
+        
+        deadline = loop.time() + (timeout or self.timeout)
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), max(0, deadline - loop.time()))
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Cliente desconectado ou tempo excedido: interromper a thread produtora
+            stop.set()
+    
+    def _is_long(self, transcription):
+        return self.long_transcript_chars > 0 and len(transcription) > self.long_transcript_chars
+    
+    async def _analyze_long(self, transcription, patient_context, timeout):
+        """
+        Análise map-reduce de transcrições longas
+        
+        Cada trecho (com sobreposição e sem quebrar turnos de fala) recebe
+        valores dimensionais e um resumo em paralelo; os valores são combinados
+        pela média ponderada pelo tamanho de cada trecho e uma única chamada
+        curta produz as seções narrativas a partir dos resumos.
+        
+        Returns:
+            dict: Análise dimensional VINTRA
+        """
+        chunks = chunk_transcript(transcription, self.chunk_chars, self.chunk_overlap_chars)
+        self.metrics.incr("segmentada")
+        self.metrics.incr("trechos", len(chunks))
+        
+        responses = await asyncio.gather(
+            *[
+                self._predict(
+                    self._build_chunk_prompt(chunk.text, index + 1, len(chunks), patient_context),
+                    timeout=timeout,
+                    max_output_tokens=1024
+                )
+                for index, chunk in enumerate(chunks)
+            ],
+            return_exceptions=True
+        )
+        
+        # Média ponderada dos valores válidos de cada dimensão
+        totals, weights = {}, {}
+        summaries = []
+        for index, (chunk, response) in enumerate(zip(chunks, responses)):
+            if isinstance(response, BaseException):
+                logger.error(f"Erro na análise do trecho {index + 1}/{len(chunks)}: {response}")
+                continue
+            data = extract_json_object(response.text) or parse_response(response.text)
+            valid, _ = validate_fields(data, DIMENSION_FIELDS)
+            for name, value in valid.items():
+                totals[name] = totals.get(name, 0.0) + value * chunk.weight
+                weights[name] = weights.get(name, 0.0) + chunk.weight
+            summary = data.get("resumo")
+            if isinstance(summary, str) and summary.strip():
+                summaries.append(f"Trecho {index + 1}: {summary.strip()}")
+        
+        if not weights and not summaries:
+            # Nenhum trecho respondeu: propagar o primeiro erro
+            errors = [r for r in responses if isinstance(r, BaseException)]
+            raise errors[0] if errors else RuntimeError("Nenhum trecho analisado")
+        
+        dimensions = {name: round(totals[name] / weights[name], 2) for name in weights}
+        missing = [name for name in DIMENSION_FIELDS if name not in dimensions]
+        
+        response = await self._predict(
+            self._build_reduce_prompt({**DEFAULTS, **dimensions}, summaries, patient_context),
+            timeout=timeout,
+            max_output_tokens=4096
+        )
+        sections, missing_sections = validate_fields(parse_response(response.text), TEXT_FIELDS)
+        missing += missing_sections
+        
+        if missing:
+            self.metrics.record("padrao", missing)
+            logger.warning(f"Campos sem valor na análise segmentada, usando padrão: {missing}")
+        else:
+            self.metrics.record("completa")
+        
+        values = {**DEFAULTS, **dimensions, **sections}
+        raw_response = self._render_dimensions(values) + "\n\n" + response.text.strip()
+        return self._build_result(raw_response, values)
+    
+    def _render_dimensions(self, values):
+        """Bloco de análise dimensional no formato da resposta em texto"""
+        lines = ["## Análise Dimensional"]
+        for name in DIMENSION_FIELDS:
+            if not name.startswith("v9_"):
+                lines.append(f"- {name}: {values[name]}")
+            elif name == "v9_past":
+                lines.append(
+                    f"- v9: passado: {values['v9_past']}, presente: {values['v9_present']}, "
+                    f"futuro: {values['v9_future']}"
+                )
+        return "\n".join(lines)
+    
+    async def _finalize(self, raw_response, transcription, patient_context, timeout, structured=False):
+        """
+        Valida os campos extraídos e repergunta apenas os que falharam
+        
+        Args:
+            raw_response: Texto completo do modelo
+            transcription: A transcrição (usada na pergunta complementar)
+            patient_context: Contexto opcional do paciente
+            timeout: Tempo máximo de cada geração
+            structured: Se a resposta foi pedida em JSON
+            
+        Returns:
+            dict: Análise dimensional completa
+        """
+        parsed = extract_json_object(raw_response) if structured else None
+        if structured and parsed is None:
+            # JSON inválido: aproveitar o que o parser de texto conseguir
+            self.metrics.incr("json_invalido")
+        if parsed is None:
+            parsed = parse_response(raw_response)
+        
+        valid, missing = validate_fields(parsed)
+        recovered = {}
+        if missing and self.reask_attempts > 0:
+            recovered = await self._reask_missing(transcription, patient_context, missing, timeout)
+        
+        pending = [name for name in missing if name not in recovered]
+        if not missing:
+            self.metrics.record("completa")
+        elif not pending:
+            self.metrics.record("recuperada", missing)
+        else:
+            self.metrics.record("padrao", missing)
+            logger.warning(f"Campos sem valor após nova pergunta, usando padrão: {pending}")
+        
+        return self._build_result(raw_response, {**DEFAULTS, **valid, **recovered})
+    
+    async def _reask_missing(self, transcription, patient_context, fields, timeout):
+        """
+        Pede ao modelo somente os campos ausentes ou inválidos
+        
+        Returns:
+            dict: Campos recuperados e validados
+        """
+        recovered = {}
+        pending = list(fields)
+        for _ in range(self.reask_attempts):
+            self.metrics.incr("reperguntas")
+            prompt = self._build_reask_prompt(transcription, patient_context, pending)
+            # Campos textuais precisam de mais espaço que valores numéricos
+            max_tokens = 2048 if set(pending) - set(DIMENSION_FIELDS) else 256
+            try:
+                response = await self._predict(prompt, timeout=timeout, max_output_tokens=max_tokens)
+            except Exception as e:
+                logger.error(f"Erro na pergunta complementar ({pending}): {e}")
+                break
+            
+            valid, pending = validate_fields(extract_json_object(response.text) or {}, pending)
+            recovered.update(valid)
+            if not pending:
+                break
+        return recovered
+    
+    def _build_result(self, raw_response, values):
+        """Monta a análise dimensional completa a partir dos campos validados"""
+        result = {name: values[name] for name in DIMENSION_FIELDS}
+        
+        # Trajetória depende do histórico do paciente, não da transcrição:
+        # calculada na persistência, fora do cache de análises
+        result["trajetoria"] = None
+        
+        result.update({
+            "sintese_narrativa": values["sintese_narrativa"],
+            "formulacao_integrativa": values["formulacao_integrativa"],
+            "recomendacoes": values["recomendacoes"],
             "raw_response": raw_response
-        }
+        })
         
         return result
     
@@ -103,88 +538,89 @@ class ClaudeService:
             
         return prompt
     
-    def _extract_dimensional_values(self, response_text):
-        """Extrai valores dimensionais do texto de resposta"""
-        # Dicionário para armazenar valores dimensionais
-        values = {}
-        
-        # Extrair valores para v1-v8 e v10
-        for i in range(1, 9):
-            pattern = rf"v[₁-₁₀]?{i}\s*[:=]\s*([+-]?\d+(\.\d+)?)"
-            match = re.search(pattern, response_text, re.IGNORECASE)
-            if match:
-                values[f"v{i}"] = float(match.group(1))
-        
-        # Tratar v10 separadamente (pode ser v₁₀ ou v10)
-        pattern = r"v[₁₀]?10\s*[:=]\s*([+-]?\d+(\.\d+)?)"
-        match = re.search(pattern, response_text, re.IGNORECASE)
-        if match:
-            values["v10"] = float(match.group(1))
-        
-        # Extrair valores para v9 (passado, presente, futuro)
-        past_pattern = r"v[₉]?9.*passado\s*[:=]\s*([+-]?\d+(\.\d+)?)"
-        present_pattern = r"v[₉]?9.*presente\s*[:=]\s*([+-]?\d+(\.\d+)?)"
-        future_pattern = r"v[₉]?9.*futuro\s*[:=]\s*([+-]?\d+(\.\d+)?)"
-        
-        past_match = re.search(past_pattern, response_text, re.IGNORECASE)
-        present_match = re.search(present_pattern, response_text, re.IGNORECASE)
-        future_match = re.search(future_pattern, response_text, re.IGNORECASE)
-        
-        if past_match:
-            values["v9_past"] = float(past_match.group(1))
-        if present_match:
-            values["v9_present"] = float(present_match.group(1))
-        if future_match:
-            values["v9_future"] = float(future_match.group(1))
-        
-        # Definir valores padrão para dimensões não encontradas
-        for i in range(1, 9):
-            key = f"v{i}"
-            if key not in values:
-                values[key] = 5.0  # Valor médio como padrão
-        
-        if "v10" not in values:
-            values["v10"] = 5.0
+    def _build_structured_prompt(self, transcription, patient_context):
+        """Constrói prompt para análise dimensional com saída JSON"""
+        prompt = f"""
+        Você é um assistente clínico especializado no modelo VINTRA (Visualização INtegrativa TRAjetorial).
+        
+        Analise a seguinte transcrição de acordo com as 10 dimensões do VINTRA.
+        
+        Transcrição: "{transcription}"
+        
+        Responda SOMENTE com um objeto JSON válido, sem texto antes ou depois, com os campos:
+{schema_description()}
+        
+        Para a dimensão v9 (Perspectiva Temporal), informe passado, presente e futuro separadamente.
+        """
+        
+        if patient_context:
+            prompt += f"\n\nContexto adicional do paciente: {patient_context}"
             
-        if "v9_past" not in values:
-            values["v9_past"] = 5.0
-        if "v9_present" not in values:
-            values["v9_present"] = 5.0
-        if "v9_future" not in values:
-            values["v9_future"] = 5.0
-        
-        # Trajetória temporal (mock para MVP)
-        values["trajetoria"] = {"tendencia": "neutro", "velocidade": 0.5}
-        
-        return values
-    
-    def _extract_section(self, text, section_name, next_section=None):
-        """Extrai uma seção específica do texto de resposta"""
-        pattern = rf"##\s*{section_name}(.*?)"
-        if next_section:
-            pattern += rf"(?=##\s*{next_section}|$)"
-        else:
-            pattern += r"$"
+        return prompt
+    
+    def _build_chunk_prompt(self, chunk, index, total, patient_context):
+        """Constrói prompt para um trecho de uma transcrição longa"""
+        prompt = f"""
+        Você é um assistente clínico especializado no modelo VINTRA (Visualização INtegrativa TRAjetorial).
+        
+        O texto abaixo é o trecho {index} de {total} de uma sessão longa; o início pode repetir o final do trecho anterior.
+        Avalie as 10 dimensões do VINTRA considerando somente este trecho.
+        
+        Trecho: "{chunk}"
+        
+        Responda SOMENTE com um objeto JSON válido, sem texto antes ou depois, com os campos:
+{schema_description(DIMENSION_FIELDS)}
+        - "resumo": texto com 3 a 5 frases resumindo os temas e a fala do paciente neste trecho
+        """
+        
+        if patient_context:
+            prompt += f"\n\nContexto adicional do paciente: {patient_context}"
+            
+        return prompt
+    
+    def _build_reduce_prompt(self, dimensions, summaries, patient_context):
+        """Constrói o prompt que redige as seções finais a partir dos trechos"""
+        dimension_lines = "\n".join(f"- {name}: {dimensions[name]}" for name in DIMENSION_FIELDS)
+        summary_lines = "\n".join(summaries)
+        prompt = f"""
+        Você é um assistente clínico especializado no modelo VINTRA (Visualização INtegrativa TRAjetorial).
+        
+        Uma sessão longa foi analisada em trechos. Valores dimensionais combinados:
+{dimension_lines}
+        
+        Resumos dos trechos, em ordem:
+{summary_lines}
+        
+        Estruture sua resposta nos seguintes blocos bem definidos:
+        
+        ## Síntese Narrativa
+        Elabore uma síntese narrativa (ipsissima) capturando os aspectos principais da fala do paciente.
+        
+        ## Formulação Integrativa
+        Apresente uma formulação integrativa do caso, relacionando as dimensões e propondo hipóteses.
+        
+        ## Recomendações
+        Liste 3-5 recomendações específicas baseadas na análise.
+        """
+        
+        if patient_context:
+            prompt += f"\n\nContexto adicional do paciente: {patient_context}"
             
-        match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-        if match:
-            content = match.group(1).strip()
-            return content
-        return ""
-    
-    def _extract_recommendations(self, text):
-        """Extrai as recomendações como uma lista"""
-        recommendations_text = self._extract_section(text, "Recomendações")
-        
-        # Extrair itens de lista numerados ou com marcadores
-        pattern = r"(?:^\d+\.\s*|\*\s*|-)?\s*(.+?)(?=$|\n\d+\.|\n\*|\n-)"
-        matches = re.findall(pattern, recommendations_text, re.MULTILINE)
-        
-        # Limpar e filtrar recomendações vazias
-        recommendations = [item.strip() for item in matches if item.strip()]
-        
-        # Se não conseguir extrair como lista, usar o texto completo
-        if not recommendations and recommendations_text:
-            return [recommendations_text]
+        return prompt
+    
+    def _build_reask_prompt(self, transcription, patient_context, fields):
+        """Constrói a pergunta complementar para os campos que falharam"""
+        field_lines = "\n".join(f'- "{name}": {describe_field(name)}' for name in fields)
+        prompt = f"""
+        Na análise VINTRA da transcrição abaixo, os seguintes campos ficaram ausentes ou fora da escala:
+{field_lines}
+        
+        Transcrição: "{transcription}"
+        
+        Responda SOMENTE com um objeto JSON contendo exatamente esses campos.
+        """
+        
+        if patient_context:
+            prompt += f"\n\nContexto adicional do paciente: {patient_context}"
             
-        return recommendations
\ No newline at end of file
+        return prompt
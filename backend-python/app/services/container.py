@@ -0,0 +1,152 @@
+import asyncio
+import inspect
+import logging
+import os
+import threading
+
+from app.services.claude_service import ClaudeService
+from app.services.firestore_service import FirestoreService
+from app.services.graph.neo4j_service import Neo4jService
+from app.services.storage_service import StorageService
+from app.services.vector.vertex_vector_service import VertexVectorService
+from app.services.jobs.job_queue import JobQueue
+
+logger = logging.getLogger("vintra-backend.services")
+
+# Tempo máximo para concluir tarefas em segundo plano no encerramento
+DRAIN_TIMEOUT = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT", "30"))
+
+# Fábricas padrão, na ordem em que os serviços devem ser aquecidos
+DEFAULT_FACTORIES = {
+    "firestore": FirestoreService,
+    "claude": ClaudeService,
+    "vector": VertexVectorService,
+    "neo4j": Neo4jService,
+    "storage": StorageService,
+    "jobs": JobQueue,
+}
+
+class ServiceUnavailableError(RuntimeError):
+    """Serviço não pôde ser construído (credenciais ausentes, rede, etc.)"""
+
+class ServiceContainer:
+    """
+    Mantém uma instância de cada serviço por worker, durante toda a vida da aplicação.
+
+    Os clientes (Vertex AI, Firestore, driver Neo4j) são construídos uma única vez
+    e compartilhados entre requisições. Instâncias podem ser substituídas por
+    dublês de teste com `override`.
+    """
+
+    def __init__(self, factories=None):
+        self._factories = dict(DEFAULT_FACTORIES)
+        if factories:
+            self._factories.update(factories)
+        self._instances = {}
+        self._locks = {name: threading.Lock() for name in self._factories}
+        self._tasks = set()
+
+    def override(self, name, instance):
+        """
+        Substitui um serviço por uma instância pronta (ex.: dublê de teste)
+
+        Args:
+            name: Nome do serviço ("claude", "firestore", "neo4j", "vector", "storage", "jobs")
+            instance: Instância a ser usada no lugar da construída pela fábrica
+        """
+        self._locks.setdefault(name, threading.Lock())
+        self._instances[name] = instance
+
+    def get(self, name):
+        """
+        Retorna o serviço, construindo-o na primeira chamada
+
+        Args:
+            name: Nome do serviço
+
+        Returns:
+            object: Instância compartilhada do serviço
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        if name not in self._factories:
+            raise KeyError(f"Serviço desconhecido: {name}")
+
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                try:
+                    instance = self._factories[name]()
+                except Exception as e:
+                    raise ServiceUnavailableError(f"Serviço '{name}' indisponível: {e}") from e
+                self._instances[name] = instance
+                logger.info(f"Serviço '{name}' inicializado")
+        return instance
+
+    async def aget(self, name):
+        """Versão assíncrona de `get` que constrói o serviço fora do event loop"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await asyncio.to_thread(self.get, name)
+
+    async def startup(self):
+        """
+        Aquece todos os serviços; falhas são registradas e repetidas sob demanda
+
+        Serviços com um método assíncrono `startup` (ex.: esquema do Neo4j) o
+        executam aqui, uma vez por worker.
+        """
+        for name in self._factories:
+            try:
+                instance = await self.aget(name)
+            except ServiceUnavailableError as e:
+                logger.warning(f"{e} (nova tentativa na primeira requisição)")
+                continue
+            startup = getattr(instance, "startup", None)
+            if startup is None:
+                continue
+            try:
+                result = startup()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Erro na inicialização do serviço '{name}': {e}")
+
+    def spawn(self, coro):
+        """
+        Agenda uma corrotina em segundo plano vinculada à vida da aplicação
+
+        Args:
+            coro: Corrotina a ser executada
+
+        Returns:
+            asyncio.Task: Tarefa criada
+        """
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def shutdown(self):
+        """Conclui as tarefas pendentes e fecha os clientes na ordem inversa de construção"""
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"{len(pending)} tarefa(s) em segundo plano cancelada(s) no encerramento")
+
+        for name, instance in reversed(list(self._instances.items())):
+            close = getattr(instance, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Erro ao encerrar serviço '{name}': {e}")
+        self._instances.clear()
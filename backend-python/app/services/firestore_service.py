@@ -1,31 +1,54 @@
 from google.cloud import firestore
+import asyncio
+import copy
 import datetime
-import json
 import os
 
+from app.services.cache.document_cache import DocumentCache
+from app.services.local_document_store import LocalDocumentStore
+from app.services.serialization import analysis_serializer
+
+# Máximo de escritas por lote no Firestore
+FIRESTORE_BATCH_LIMIT = 500
+
+# Lotes de escrita enviados em paralelo nas gravações em massa
+FIRESTORE_WRITE_CONCURRENCY = int(os.getenv("FIRESTORE_WRITE_CONCURRENCY", "4"))
+
+# Campos lidos na listagem de pacientes (sem contato e metadados)
+PATIENT_LIST_FIELDS = ["nome", "data_nascimento", "data_criacao", "genero"]
+
 class FirestoreService:
     def __init__(self):
         # Verificar se estamos em modo de emulação (desenvolvimento)
         self.emulation_mode = os.getenv("FIRESTORE_EMULATOR_HOST") is not None
         
         if self.emulation_mode:
-            # Usar simulação em memória para desenvolvimento
+            # Usar banco SQLite local para desenvolvimento (compartilhado entre workers)
             self.client = None
-            self.memory_db = {
-                "pacientes": {},
-                "sessoes": {},
-                "analises_vintra": {}
-            }
+            self.local_db = LocalDocumentStore()
         else:
-            # Usar cliente Firestore real
-            self.client = firestore.Client()
+            # Usar cliente Firestore real (assíncrono: não bloqueia o event loop)
+            self.client = firestore.AsyncClient()
+        
+        # Cache de leitura de pacientes e sessões, invalidado nas gravações
+        self.patient_cache = DocumentCache("pacientes")
+        self.session_cache = DocumentCache("sessoes")
+    
+    async def close(self):
+        if self.emulation_mode:
+            self.local_db.close()
+        elif hasattr(self.client, "close"):
+            result = self.client.close()
+            if asyncio.iscoroutine(result):
+                await result
     
     async def create_patient(self, patient_data):
         """
         Cria um documento de paciente no Firestore
         
         Args:
-            patient_data: Dados do paciente
+            patient_data: Dados do paciente; recebe `data_criacao`, de modo que
+                o chamador pode montar a resposta sem reler o documento
             
         Returns:
             str: ID do paciente criado
@@ -34,19 +57,21 @@ class FirestoreService:
         patient_data["data_criacao"] = datetime.datetime.now()
         
         if self.emulation_mode:
-            # Modo de emulação - usar armazenamento em memória
-            patient_id = f"patient_{len(self.memory_db['pacientes']) + 1}"
-            self.memory_db["pacientes"][patient_id] = patient_data
-            return patient_id
+            # Modo de emulação - usar banco local
+            patient_id = await asyncio.to_thread(self.local_db.set, "pacientes", None, patient_data)
         else:
             # Modo real - usar Firestore
             doc_ref = self.client.collection("pacientes").document()
-            doc_ref.set(patient_data)
-            return doc_ref.id
+            await doc_ref.set(patient_data)
+            patient_id = doc_ref.id
+        
+        # O documento recém-gravado já é conhecido: vai direto para o cache
+        self.patient_cache.set(patient_id, patient_data)
+        return patient_id
     
     async def get_patient(self, patient_id):
         """
-        Recupera um paciente pelo ID
+        Recupera um paciente pelo ID (do cache de leitura quando possível)
         
         Args:
             patient_id: ID do paciente
@@ -54,18 +79,139 @@ class FirestoreService:
         Returns:
             dict: Dados do paciente
         """
+        return await self.patient_cache.get(patient_id, self._read_patient)
+    
+    async def _read_patient(self, patient_id):
         if self.emulation_mode:
             # Modo de emulação
-            return self.memory_db["pacientes"].get(patient_id)
+            return await asyncio.to_thread(self.local_db.get, "pacientes", patient_id)
         else:
             # Modo real
             doc_ref = self.client.collection("pacientes").document(patient_id)
-            doc = doc_ref.get()
+            doc = await doc_ref.get()
             
             if doc.exists:
                 return doc.to_dict()
             return None
     
+    async def get_patients(self, patient_ids):
+        """
+        Recupera vários pacientes numa única leitura
+        
+        Args:
+            patient_ids: IDs dos pacientes
+            
+        Returns:
+            list: Dados de cada paciente, na mesma ordem (None se não existir)
+        """
+        patient_ids = list(patient_ids)
+        cached = {}
+        for patient_id in dict.fromkeys(patient_ids):
+            value = self.patient_cache.peek(patient_id)
+            if value is not None:
+                cached[patient_id] = value
+        
+        missing = [patient_id for patient_id in dict.fromkeys(patient_ids) if patient_id not in cached]
+        for patient_id, patient_data in zip(missing, await self.get_many("pacientes", missing)):
+            if patient_data is not None:
+                self.patient_cache.set(patient_id, patient_data)
+                cached[patient_id] = patient_data
+        return [copy.deepcopy(cached.get(patient_id)) for patient_id in patient_ids]
+    
+    async def list_patients(self, page_size, cursor=None, fields=PATIENT_LIST_FIELDS):
+        """
+        Lista uma página de pacientes em ordem de ID
+        
+        Args:
+            page_size: Número máximo de pacientes na página
+            cursor: ID do último paciente da página anterior (None: primeira página)
+            fields: Campos lidos de cada documento (None: documento completo)
+            
+        Returns:
+            tuple: Lista de (ID, dados) e cursor da próxima página (None se for a última)
+        """
+        # Um documento a mais indica se existe próxima página
+        page = await self._list_documents("pacientes", page_size + 1, cursor, fields)
+        if len(page) > page_size:
+            page = page[:page_size]
+            return page, page[-1][0]
+        return page, None
+    
+    async def iter_patients(self, cursor=None, fields=PATIENT_LIST_FIELDS, page_size=FIRESTORE_BATCH_LIMIT):
+        """
+        Percorre todos os pacientes página a página (memória limitada a uma página)
+        
+        Yields:
+            tuple: (ID, dados) de cada paciente, em ordem de ID
+        """
+        while True:
+            page = await self._list_documents("pacientes", page_size, cursor, fields)
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                return
+            cursor = page[-1][0]
+    
+    async def list_patient_sessions(self, patient_id, page_size, cursor=None):
+        """
+        Lista uma página das sessões de um paciente
+        
+        Returns:
+            list: Tuplas (ID, dados) em ordem de ID
+        """
+        return await self._list_documents("sessoes", page_size, cursor, None, where=("paciente_id", patient_id))
+    
+    async def list_session_analyses(self, session_id, page_size, cursor=None):
+        """
+        Lista uma página das análises dimensionais de uma sessão
+        
+        Returns:
+            list: Tuplas (ID, dados) em ordem de ID
+        """
+        return await self._list_documents("analises_vintra", page_size, cursor, None, where=("sessao_id", session_id))
+    
+    async def _list_documents(self, collection, limit, cursor, fields, where=None):
+        if self.emulation_mode:
+            # Modo de emulação
+            return await asyncio.to_thread(self.local_db.list, collection, limit, cursor, fields, where)
+        
+        # Modo real - cursor pelo ID do documento (start_after), sem offset
+        collection_ref = self.client.collection(collection)
+        query = collection_ref
+        if where is not None:
+            query = query.where(where[0], "==", where[1])
+        query = query.order_by("__name__").limit(limit)
+        if fields is not None:
+            query = query.select(fields)
+        if cursor is not None:
+            query = query.start_after({"__name__": collection_ref.document(cursor)})
+        return [(doc.id, doc.to_dict()) async for doc in query.stream()]
+    
+    async def get_many(self, collection, document_ids):
+        """
+        Recupera vários documentos de uma coleção com uma chamada get_all por lote
+        
+        Args:
+            collection: Nome da coleção
+            document_ids: IDs dos documentos
+            
+        Returns:
+            list: Dados de cada documento, na mesma ordem de `document_ids` (None se não existir)
+        """
+        document_ids = list(document_ids)
+        if self.emulation_mode:
+            # Modo de emulação
+            return await asyncio.to_thread(self.local_db.get_many, collection, document_ids)
+        
+        # Modo real - get_all não garante a ordem das respostas
+        refs = [self.client.collection(collection).document(doc_id) for doc_id in dict.fromkeys(document_ids)]
+        found = {}
+        for start in range(0, len(refs), FIRESTORE_BATCH_LIMIT):
+            async for doc in self.client.get_all(refs[start:start + FIRESTORE_BATCH_LIMIT]):
+                if doc.exists:
+                    found[doc.id] = doc.to_dict()
+        return [found.get(doc_id) for doc_id in document_ids]
+    
     async def create_session(self, patient_id, session_data):
         """
         Cria uma sessão para um paciente
@@ -83,22 +229,52 @@ class FirestoreService:
         
         if self.emulation_mode:
             # Modo de emulação
-            session_id = f"session_{len(self.memory_db['sessoes']) + 1}"
-            self.memory_db["sessoes"][session_id] = session_data
-            return session_id
+            session_id = await asyncio.to_thread(self.local_db.set, "sessoes", None, session_data)
         else:
             # Modo real
             doc_ref = self.client.collection("sessoes").document()
-            doc_ref.set(session_data)
-            return doc_ref.id
+            await doc_ref.set(session_data)
+            session_id = doc_ref.id
+        
+        self.session_cache.set(session_id, session_data)
+        return session_id
+    
+    async def get_session(self, session_id):
+        """
+        Recupera uma sessão pelo ID (do cache de leitura quando possível)
+        
+        Args:
+            session_id: ID da sessão
+            
+        Returns:
+            dict: Dados da sessão, ou None se não existir
+        """
+        return await self.session_cache.get(session_id, self._read_session)
+    
+    async def _read_session(self, session_id):
+        if self.emulation_mode:
+            # Modo de emulação
+            return await asyncio.to_thread(self.local_db.get, "sessoes", session_id)
+        
+        # Modo real
+        doc = await self.client.collection("sessoes").document(session_id).get()
+        return doc.to_dict() if doc.exists else None
+    
+    def cache_stats(self):
+        """Estatísticas dos caches de leitura"""
+        return {
+            "pacientes": self.patient_cache.stats(),
+            "sessoes": self.session_cache.stats()
+        }
     
-    async def store_dimensional_analysis(self, session_id, analysis_data):
+    async def store_dimensional_analysis(self, session_id, analysis_data, analysis_id=None):
         """
         Armazena análise dimensional VINTRA
         
         Args:
             session_id: ID da sessão
             analysis_data: Dados da análise dimensional
+            analysis_id: ID do documento (substitui o existente); gerado se ausente
             
         Returns:
             str: ID da análise
@@ -113,41 +289,70 @@ class FirestoreService:
         analysis_data["sessao_id"] = session_id
         
         # Processar dados para armazenamento (lidar com valores não serializáveis)
-        clean_data = self._prepare_for_storage(analysis_data)
+        clean_data = analysis_serializer.to_storage(analysis_data)
         
         if self.emulation_mode:
             # Modo de emulação
-            analysis_id = f"analysis_{len(self.memory_db['analises_vintra']) + 1}"
-            self.memory_db["analises_vintra"][analysis_id] = clean_data
-            return analysis_id
+            return await asyncio.to_thread(self.local_db.set, "analises_vintra", analysis_id, clean_data)
         else:
             # Modo real
-            doc_ref = self.client.collection("analises_vintra").document()
-            doc_ref.set(clean_data)
+            doc_ref = self.client.collection("analises_vintra").document(analysis_id)
+            await doc_ref.set(clean_data)
             return doc_ref.id
     
-    def _prepare_for_storage(self, data):
-        """Prepara dados para armazenamento no Firestore"""
-        # Clone para não modificar o original
-        result = {}
-        
-        for key, value in data.items():
-            # Converter datetime para string ISO
-            if isinstance(value, datetime.datetime):
-                result[key] = value.isoformat()
-            # Converter objetos complexos para JSON
-            elif not isinstance(value, (str, int, float, bool, list, dict, type(None))):
-                result[key] = json.dumps(str(value))
-            # Processo recursivo para dicionários aninhados
-            elif isinstance(value, dict):
-                result[key] = self._prepare_for_storage(value)
-            # Processo recursivo para listas
-            elif isinstance(value, list):
-                result[key] = [
-                    self._prepare_for_storage(item) if isinstance(item, dict) else item
-                    for item in value
-                ]
-            else:
-                result[key] = value
-                
-        return result
\ No newline at end of file
+    async def store_dimensional_analyses(self, items):
+        """
+        Armazena várias análises dimensionais em lotes de escrita
+        
+        Args:
+            items: Lista de tuplas (session_id, analysis_data)
+            
+        Returns:
+            list: IDs das análises, na mesma ordem de `items`
+        """
+        now = datetime.datetime.now()
+        documents = []
+        for session_id, analysis_data in items:
+            if not isinstance(analysis_data.get("data_criacao"), datetime.datetime):
+                analysis_data["data_criacao"] = now
+            analysis_data["sessao_id"] = session_id
+            documents.append(analysis_serializer.to_storage(analysis_data))
+        
+        return await self.write_many("analises_vintra", documents)
+    
+    async def write_many(self, collection, documents, document_ids=None):
+        """
+        Grava vários documentos em lotes de escrita (até 500 por commit)
+        
+        Cada lote é atômico; lotes diferentes são enviados em paralelo
+        (FIRESTORE_WRITE_CONCURRENCY) e podem falhar independentemente.
+        
+        Args:
+            collection: Nome da coleção
+            documents: Dados já preparados para armazenamento
+            document_ids: IDs dos documentos (padrão: IDs gerados)
+            
+        Returns:
+            list: IDs dos documentos, na mesma ordem de `documents`
+        """
+        documents = list(documents)
+        if document_ids is None:
+            document_ids = [None] * len(documents)
+        
+        if self.emulation_mode:
+            # Modo de emulação - uma transação local
+            return await asyncio.to_thread(self.local_db.set_many, collection, list(zip(document_ids, documents)))
+        
+        # Modo real
+        refs = [self.client.collection(collection).document(doc_id) for doc_id in document_ids]
+        semaphore = asyncio.Semaphore(FIRESTORE_WRITE_CONCURRENCY)
+        
+        async def commit(start):
+            async with semaphore:
+                batch = self.client.batch()
+                for doc_ref, data in zip(refs[start:start + FIRESTORE_BATCH_LIMIT], documents[start:start + FIRESTORE_BATCH_LIMIT]):
+                    batch.set(doc_ref, data)
+                await batch.commit()
+        
+        await asyncio.gather(*[commit(start) for start in range(0, len(documents), FIRESTORE_BATCH_LIMIT)])
+        return [doc_ref.id for doc_ref in refs]
\ No newline at end of file
@@ -1,24 +1,287 @@
 import os
-from neo4j import GraphDatabase
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from neo4j import AsyncGraphDatabase
+from neo4j.exceptions import ClientError
+
+from app.services.graph import queries
+from app.services.graph.schema import MIGRATIONS, SCHEMA_LOCK_CONSTRAINT, SCHEMA_NAME
+from app.services.graph.state_index import DimensionalStateIndex, dimension_weights
+from app.services.graph.trajectory import TrajectoryEngine
+from app.services.graph.write_buffer import GraphWriteBuffer
+from app.services.structured_output import DIMENSION_FIELDS
+
+logger = logging.getLogger("vintra-backend.neo4j")
+
+# Operadores de plano que percorrem todos os nós (de um rótulo ou do grafo)
+SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
 
 class Neo4jService:
     def __init__(self):
         self.uri = os.getenv("NEO4J_URI")
         self.username = os.getenv("NEO4J_USERNAME")
         self.password = os.getenv("NEO4J_PASSWORD")
+        self.database = os.getenv("NEO4J_DATABASE") or None
+        
+        # Configuração do pool de conexões
+        self.max_pool_size = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+        self.acquisition_timeout = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
+        self.connection_timeout = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "15"))
+        self.max_retry_time = float(os.getenv("NEO4J_MAX_RETRY_TIME", "15"))
+        
         self.driver = self._create_driver()
         
+        # Aplicar o esquema (restrições e índices) na inicialização
+        self.schema_bootstrap = os.getenv("NEO4J_SCHEMA_BOOTSTRAP", "true").lower() == "true"
+        # Concessão das migrações: validade (renovada a cada comando) e espera máxima
+        self.schema_lock_ttl = float(os.getenv("NEO4J_SCHEMA_LOCK_TTL", "300"))
+        self.schema_lock_timeout = float(os.getenv("NEO4J_SCHEMA_LOCK_TIMEOUT", "600"))
+        
+        # Índice em memória para find_similar_states, carregado na primeira busca
+        # e atualizado com estados gravados por outros processos a cada busca
+        # (ou no máximo uma vez por intervalo, se REFRESH_SECONDS > 0)
+        self.state_index_enabled = os.getenv("NEO4J_STATE_INDEX_ENABLED", "true").lower() == "true"
+        self.state_index_refresh = float(os.getenv("NEO4J_STATE_INDEX_REFRESH_SECONDS", "0"))
+        self.state_index = DimensionalStateIndex()
+        self._state_index_loaded_at = None
+        self._state_index_watermark = None
+        self._state_index_lock = None
+        
+        # Trajetórias por paciente, em cache e atualizadas a cada estado gravado
+        self.trajectories = TrajectoryEngine(self._load_trajectory)
+        
+        # Linhas por transação nas gravações em massa (UNWIND)
+        self.bulk_batch_size = int(os.getenv("NEO4J_BULK_BATCH_SIZE", "500"))
+        
+        # Escritas individuais agrupadas por tamanho ou tempo (desativado: uma transação por escrita)
+        self.write_buffer = None
+        if os.getenv("NEO4J_WRITE_COALESCING", "true").lower() == "true":
+            self.write_buffer = GraphWriteBuffer(
+                self.ingest,
+                max_size=int(os.getenv("NEO4J_WRITE_BUFFER_SIZE", "200")),
+                max_wait_ms=float(os.getenv("NEO4J_WRITE_BUFFER_MAX_WAIT_MS", "20"))
+            )
+        
     def _create_driver(self):
         if not all([self.uri, self.username, self.password]):
             raise ValueError("Credenciais Neo4j não configuradas")
-        return GraphDatabase.driver(self.uri, auth=(self.username, self.password))
+        return AsyncGraphDatabase.driver(
+            self.uri,
+            auth=(self.username, self.password),
+            max_connection_pool_size=self.max_pool_size,
+            connection_acquisition_timeout=self.acquisition_timeout,
+            connection_timeout=self.connection_timeout,
+            max_transaction_retry_time=self.max_retry_time
+        )
+    
+    async def startup(self):
+        """Chamado pelo contêiner de serviços na inicialização da aplicação"""
+        if self.schema_bootstrap:
+            await self.ensure_schema()
+    
+    async def ensure_schema(self):
+        """
+        Aplica as migrações de esquema ainda não aplicadas (ver graph/schema.py)
+        
+        Vários processos podem iniciar juntos: as migrações só rodam sob a
+        concessão gravada no nó SchemaVersion, e a versão é relida depois de
+        obtida. Os demais aguardam a liberação (ou o vencimento, se o detentor
+        cair) e encontram o esquema já atualizado.
+        
+        Returns:
+            int: Versão do esquema após a aplicação
+        
+        Raises:
+            TimeoutError: Concessão não obtida em NEO4J_SCHEMA_LOCK_TIMEOUT segundos
+        """
+        latest = MIGRATIONS[-1][0]
+        current = await self._execute_read(self._schema_version_tx, name=SCHEMA_NAME) or 0
+        if current >= latest:
+            return current
+        
+        await self._run_schema_statement(SCHEMA_LOCK_CONSTRAINT)
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        ttl_ms = int(self.schema_lock_ttl * 1000)
+        deadline = time.monotonic() + self.schema_lock_timeout
+        while True:
+            acquired, current = await self._execute_write(
+                self._schema_lock_tx, name=SCHEMA_NAME, owner=owner, ttl_ms=ttl_ms
+            )
+            current = current or 0
+            if acquired or current >= latest:
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Migração do esquema do grafo em andamento em outro processo")
+            await asyncio.sleep(1)
+        if not acquired:
+            return current
+        
+        try:
+            for version, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    await self._run_schema_statement(statement)
+                    await self._renew_schema_lock(queries.SCHEMA_LOCK_RENEW, owner=owner, ttl_ms=ttl_ms)
+                await self._renew_schema_lock(
+                    queries.SCHEMA_VERSION_WRITE, owner=owner, ttl_ms=ttl_ms, version=version
+                )
+                logger.info(f"Esquema do grafo atualizado para a versão {version}")
+                current = version
+        finally:
+            await self._execute_write(self._release_schema_lock_tx, name=SCHEMA_NAME, owner=owner)
+        return current
+    
+    async def _run_schema_statement(self, statement):
+        """Comandos de esquema não podem dividir a transação com escritas de dados"""
+        try:
+            async with self.driver.session(database=self.database) as session:
+                result = await session.run(statement)
+                await result.consume()
+        except ClientError as e:
+            # Restrição criada ao mesmo tempo por outro processo (IF NOT EXISTS não cobre a corrida)
+            if not (e.code or "").endswith("AlreadyExists"):
+                raise
     
-    def close(self):
-        self.driver.close()
+    async def _renew_schema_lock(self, query, **params):
+        """Renova a concessão (e grava a versão); falha se outro processo a assumiu"""
+        renewed = await self._execute_write(self._schema_lock_write_tx, query=query, name=SCHEMA_NAME, **params)
+        if not renewed:
+            raise RuntimeError("Concessão da migração do esquema perdida (NEO4J_SCHEMA_LOCK_TTL curto demais?)")
+    
+    @staticmethod
+    async def _schema_version_tx(tx, name):
+        result = await tx.run(queries.SCHEMA_VERSION_READ, name=name)
+        record = await result.single()
+        return record["version"] if record else None
+    
+    @staticmethod
+    async def _schema_lock_tx(tx, name, owner, ttl_ms):
+        # O bloqueio do nó, tomado pela primeira consulta, vale até o fim da transação
+        await (await tx.run(queries.SCHEMA_LOCK_TAKE, name=name)).consume()
+        result = await tx.run(queries.SCHEMA_LOCK_ACQUIRE, name=name, owner=owner, ttl_ms=ttl_ms)
+        record = await result.single()
+        return record["acquired"], record["version"]
+    
+    @staticmethod
+    async def _schema_lock_write_tx(tx, query, **params):
+        result = await tx.run(query, **params)
+        record = await result.single()
+        return record["renewed"] if record else 0
+    
+    @staticmethod
+    async def _release_schema_lock_tx(tx, name, owner):
+        await tx.run(queries.SCHEMA_LOCK_RELEASE, name=name, owner=owner)
+    
+    async def check_query_plans(self):
+        """
+        Executa EXPLAIN em cada consulta do serviço (queries.PLAN_CHECKS)
+        
+        Returns:
+            dict: Consultas com varredura de rótulo inesperada -> operadores encontrados
+                (vazio se todos os planos usam índices)
+        """
+        failures = {}
+        for name, (query, params, full_scan) in queries.PLAN_CHECKS.items():
+            async with self.driver.session(database=self.database) as session:
+                result = await session.run("EXPLAIN " + query, **params)
+                summary = await result.consume()
+            scans = [op for op in _plan_operators(summary.plan) if op.startswith(SCAN_OPERATORS)]
+            if scans and not full_scan:
+                failures[name] = scans
+        return failures
+    
+    async def close(self):
+        if self.write_buffer is not None:
+            await self.write_buffer.flush()
+        await self.driver.close()
+    
+    async def _execute_write(self, work, **params):
+        """Executa uma função de transação de escrita (com retry do driver)"""
+        async with self.driver.session(database=self.database) as session:
+            return await session.execute_write(work, **params)
+    
+    async def _execute_read(self, work, **params):
+        """Executa uma função de transação de leitura (com retry do driver)"""
+        async with self.driver.session(database=self.database) as session:
+            return await session.execute_read(work, **params)
+    
+    async def _write_one(self, kind, row):
+        """Grava uma linha pelo buffer de escritas, ou numa transação própria se desativado"""
+        if self.write_buffer is not None:
+            return await self.write_buffer.submit(kind, row)
+        return (await self.ingest(**{kind: [row]}))[kind][0]
+    
+    async def ingest(self, patients=(), sessions=(), states=(), transitions=()):
+        """
+        Grava pacientes, sessões, estados e transições em massa
+        
+        Cada tipo é gravado com UNWIND em lotes de NEO4J_BULK_BATCH_SIZE linhas,
+        um lote por transação, na ordem de dependência (pacientes, sessões,
+        estados, transições).
+        
+        Args:
+            patients: Dicts com patient_id e metadata
+            sessions: Dicts com session_id, patient_id e metadata
+            states: Dicts com session_id, dim (valores v1-v10) e, opcionalmente,
+                state_id (o estado não é recriado se já existir)
+            transitions: Dicts com from_id, to_id (state_ids) e metadata
+            
+        Returns:
+            dict: Resultados por tipo, na ordem de entrada (ID do nó, state_id para
+                estados, ou None se o nó de origem não existir; True/False para transições)
+        """
+        results = {
+            "patients": await self._ingest_batches(self._create_patient_nodes_tx, patients),
+            "sessions": await self._ingest_batches(self._create_session_nodes_tx, sessions),
+        }
+        
+        records = await self._ingest_batches(self._create_dimensional_states_tx, states)
+        created = [
+            (row["session_id"], row["dim"], record)
+            for row, record in zip(states, records)
+            if record is not None and record["created"]
+        ]
+        await self._index_new_states(created)
+        self.trajectories.apply([{
+            "node_id": record["node_id"],
+            "session_id": session_id,
+            "patient_id": record["patient_id"],
+            "created_at": record["created_at"],
+            **{name: dim.get(name) for name in DIMENSION_FIELDS}
+        } for session_id, dim, record in created])
+        results["states"] = [record["node_id"] if record else None for record in records]
+        
+        found = await self._ingest_batches(self._create_state_transitions_tx, transitions)
+        results["transitions"] = [bool(node) for node in found]
+        return results
+    
+    async def _ingest_batches(self, work, rows):
+        """Executa `work` em lotes, cada um em sua transação; resultados na ordem das linhas"""
+        rows = list(rows)
+        results = []
+        for start in range(0, len(rows), self.bulk_batch_size):
+            batch = [
+                {**row, "index": index}
+                for index, row in enumerate(rows[start:start + self.bulk_batch_size])
+            ]
+            results.extend(await self._execute_write(work, rows=batch))
+        return results
+    
+    @staticmethod
+    async def _collect_by_index(result, size, key="node_id"):
+        """Ordena os registros de um UNWIND pelo índice da linha (None para linhas sem resultado)"""
+        values = [None] * size
+        async for record in result:
+            values[record["index"]] = record[key] if key else dict(record)
+        return values
     
     async def create_patient_node(self, patient_id, metadata):
         """
-        Cria nó do paciente no grafo
+        Cria nó do paciente no grafo (ou atualiza os metadados, se já existir)
         
         Args:
             patient_id: ID do paciente no Firestore
@@ -27,22 +290,16 @@ class Neo4jService:
         Returns:
             str: ID do nó criado
         """
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                CREATE (p:Patient {patient_id: $patient_id, created_at: datetime()})
-                SET p += $metadata
-                RETURN id(p) as node_id
-                """,
-                patient_id=patient_id,
-                metadata=metadata
-            )
-            record = result.single()
-            return record["node_id"] if record else None
+        return await self._write_one("patients", {"patient_id": patient_id, "metadata": metadata})
+    
+    @staticmethod
+    async def _create_patient_nodes_tx(tx, rows):
+        result = await tx.run(queries.CREATE_PATIENTS, rows=rows)
+        return await Neo4jService._collect_by_index(result, len(rows))
     
     async def create_session_node(self, session_id, patient_id, session_metadata):
         """
-        Cria nó de sessão e o conecta ao paciente
+        Cria nó de sessão e o conecta ao paciente (idempotente por session_id)
         
         Args:
             session_id: ID da sessão no Firestore
@@ -52,125 +309,312 @@ class Neo4jService:
         Returns:
             str: ID do nó de sessão criado
         """
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (p:Patient {patient_id: $patient_id})
-                CREATE (s:Session {session_id: $session_id, created_at: datetime()})
-                SET s += $metadata
-                CREATE (p)-[:HAS_SESSION]->(s)
-                RETURN id(s) as node_id
-                """,
-                patient_id=patient_id,
-                session_id=session_id,
-                metadata=session_metadata
-            )
-            record = result.single()
-            return record["node_id"] if record else None
+        return await self._write_one("sessions", {
+            "session_id": session_id,
+            "patient_id": patient_id,
+            "metadata": session_metadata
+        })
+    
+    @staticmethod
+    async def _create_session_nodes_tx(tx, rows):
+        result = await tx.run(queries.CREATE_SESSIONS, rows=rows)
+        return await Neo4jService._collect_by_index(result, len(rows))
     
-    async def create_dimensional_state(self, session_id, dimensional_data):
+    async def create_dimensional_state(self, session_id, dimensional_data, state_id=None):
         """
         Cria nó de estado dimensional e o conecta à sessão
         
+        Na mesma transação, o estado é encadeado ao último estado do paciente
+        por TRANSITIONS_TO (variação por dimensão e tempo decorrido) e passa a
+        ser o LATEST_STATE do paciente.
+        
         Args:
             session_id: ID da sessão
             dimensional_data: Dados dimensionais (valores v1-v10)
+            state_id: ID do estado (ex.: ID da análise); se já existir, a
+                gravação não cria outro estado (padrão: UUID novo)
             
         Returns:
-            str: ID do nó de estado dimensional
-        """
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (s:Session {session_id: $session_id})
-                CREATE (d:DimensionalState {
-                    created_at: datetime(),
-                    v1: $dim.v1,
-                    v2: $dim.v2,
-                    v3: $dim.v3,
-                    v4: $dim.v4,
-                    v5: $dim.v5,
-                    v6: $dim.v6,
-                    v7: $dim.v7,
-                    v8: $dim.v8,
-                    v9_past: $dim.v9_past,
-                    v9_present: $dim.v9_present,
-                    v9_future: $dim.v9_future,
-                    v10: $dim.v10
-                })
-                CREATE (s)-[:HAS_STATE]->(d)
-                RETURN id(d) as node_id
-                """,
-                session_id=session_id,
-                dim=dimensional_data
-            )
-            record = result.single()
-            return record["node_id"] if record else None
+            str: state_id do estado dimensional (UUID estável, ao contrário do id() interno)
+        """
+        return await self._write_one("states", {"session_id": session_id, "dim": dimensional_data, "state_id": state_id})
+    
+    async def create_dimensional_states(self, items, state_ids=None):
+        """
+        Cria vários estados dimensionais em massa (UNWIND)
+        
+        Args:
+            items: Lista de tuplas (session_id, dimensional_data)
+            state_ids: IDs dos estados, na mesma ordem (ver create_dimensional_state)
+            
+        Returns:
+            list: state_ids criados, na mesma ordem de `items` (None se a sessão não existir)
+        """
+        state_ids = state_ids or [None] * len(items)
+        result = await self.ingest(states=[
+            {"session_id": session_id, "dim": dim, "state_id": state_id}
+            for (session_id, dim), state_id in zip(items, state_ids)
+        ])
+        return result["states"]
+    
+    @staticmethod
+    async def _create_dimensional_states_tx(tx, rows):
+        result = await tx.run(queries.CREATE_STATES, rows=rows)
+        return await Neo4jService._collect_by_index(result, len(rows), key=None)
     
     async def create_state_transition(self, from_state_id, to_state_id, transition_metadata):
         """
         Cria relação de transição entre estados dimensionais
         
         Args:
-            from_state_id: ID do estado inicial
-            to_state_id: ID do estado final
+            from_state_id: state_id do estado inicial
+            to_state_id: state_id do estado final
             transition_metadata: Metadados sobre a transição
             
         Returns:
             bool: Sucesso da operação
         """
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (s1:DimensionalState), (s2:DimensionalState)
-                WHERE id(s1) = $from_id AND id(s2) = $to_id
-                CREATE (s1)-[t:TRANSITIONS_TO]->(s2)
-                SET t += $metadata
-                RETURN t
-                """,
-                from_id=from_state_id,
-                to_id=to_state_id,
-                metadata=transition_metadata
+        return await self._write_one("transitions", {
+            "from_id": from_state_id,
+            "to_id": to_state_id,
+            "metadata": transition_metadata
+        })
+    
+    @staticmethod
+    async def _create_state_transitions_tx(tx, rows):
+        result = await tx.run(queries.CREATE_TRANSITIONS, rows=rows)
+        return await Neo4jService._collect_by_index(result, len(rows), key="created")
+    
+    async def get_patient_trajectory(self, patient_id, limit=100):
+        """
+        Percorre a cadeia de estados do paciente a partir do LATEST_STATE
+        
+        Args:
+            patient_id: ID do paciente
+            limit: Número máximo de estados (os mais recentes)
+            
+        Returns:
+            list: Estados do mais antigo para o mais recente (node_id, session_id,
+                created_at em milissegundos e valores v1-v10)
+        """
+        return await self._execute_read(
+            self._patient_trajectory_tx,
+            patient_id=patient_id,
+            limit=max(1, min(limit, queries.TRAJECTORY_MAX_STATES))
+        )
+    
+    @staticmethod
+    async def _patient_trajectory_tx(tx, patient_id, limit):
+        result = await tx.run(queries.PATIENT_TRAJECTORY, patient_id=patient_id, limit=limit)
+        return [dict(record) async for record in result]
+    
+    async def _load_trajectory(self, patient_id):
+        return await self.get_patient_trajectory(patient_id, limit=queries.TRAJECTORY_MAX_STATES)
+    
+    async def get_trajectory_analysis(self, patient_id):
+        """
+        Métricas de trajetória do paciente (velocidade, aceleração, tendência,
+        volatilidade e pontos de mudança por dimensão), do cache quando possível
+        
+        Args:
+            patient_id: ID do paciente
+            
+        Returns:
+            Trajectory: Métricas por sessão (vazia se o paciente não tiver estados)
+        """
+        return await self.trajectories.get(patient_id)
+    
+    async def preview_trajectory(self, session_id, dimensional_values):
+        """
+        Resumo da trajetória do paciente da sessão incluindo um estado ainda não gravado
+        
+        Args:
+            session_id: ID da sessão
+            dimensional_values: Valores v1-v10 do novo estado
+            
+        Returns:
+            dict: Resumo para `DimensionalAnalysis.trajetoria`, ou None se a
+                sessão não estiver ligada a um paciente
+        """
+        patient_id = await self._execute_read(self._session_patient_tx, session_id=session_id)
+        if patient_id is None:
+            return None
+        return await self.trajectories.preview(patient_id, dimensional_values)
+    
+    async def preview_trajectories(self, items):
+        """
+        Resumos de trajetória de vários estados ainda não gravados (ex.: um lote)
+        
+        Estados do mesmo paciente são encadeados na ordem de `items`: cada um
+        considera os anteriores da lista.
+        
+        Args:
+            items: Lista de tuplas (session_id, dimensional_values)
+            
+        Returns:
+            list: Resumos, na mesma ordem (None se a sessão não estiver ligada a um paciente)
+        """
+        patients = {}
+        for session_id, _ in items:
+            if session_id not in patients:
+                patients[session_id] = await self._execute_read(self._session_patient_tx, session_id=session_id)
+        
+        positions = {}
+        for position, (session_id, _) in enumerate(items):
+            if patients[session_id] is not None:
+                positions.setdefault(patients[session_id], []).append(position)
+        
+        summaries = [None] * len(items)
+        for patient_id, patient_positions in positions.items():
+            previews = await self.trajectories.preview_many(
+                patient_id, [items[position][1] for position in patient_positions]
             )
-            return result.single() is not None
+            for position, summary in zip(patient_positions, previews):
+                summaries[position] = summary
+        return summaries
+    
+    @staticmethod
+    async def _session_patient_tx(tx, session_id):
+        result = await tx.run(queries.SESSION_PATIENT, session_id=session_id)
+        record = await result.single()
+        return record["patient_id"] if record else None
     
-    async def find_similar_states(self, dimensional_values, limit=5):
+    async def find_similar_states(self, dimensional_values, limit=5, weights=None,
+                                  patient_id=None, start=None, end=None):
         """
         Encontra estados dimensionais similares baseados em distância euclidiana
         
         Args:
             dimensional_values: Valores dimensionais atuais
             limit: Número máximo de resultados
+            weights: Peso opcional por dimensão (ex.: {"v1": 2.0}; ausentes valem 1)
+            patient_id: Restringe aos estados do paciente
+            start, end: Restringe pela data de criação do estado (datetime, inclusivo)
+            
+        Com o índice em memória ativo, cada busca antes lê do Neo4j os estados
+        criados desde a última leitura (faixa no índice de created_at). Com
+        NEO4J_STATE_INDEX_REFRESH_SECONDS > 0 essa leitura ocorre no máximo uma
+        vez por intervalo, e estados gravados por outros processos podem ficar
+        fora dos resultados durante esse tempo; os gravados por este processo
+        entram no índice na hora.
             
         Returns:
-            list: Estados similares
-        """
-        # Cypher para calcular distância euclidiana entre vetores dimensionais
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (d:DimensionalState)
-                WITH d, 
-                     sqrt(
-                        (d.v1 - $dim.v1)^2 + 
-                        (d.v2 - $dim.v2)^2 + 
-                        (d.v3 - $dim.v3)^2 + 
-                        (d.v4 - $dim.v4)^2 + 
-                        (d.v5 - $dim.v5)^2 + 
-                        (d.v6 - $dim.v6)^2 + 
-                        (d.v7 - $dim.v7)^2 + 
-                        (d.v8 - $dim.v8)^2 + 
-                        (d.v9_past - $dim.v9_past)^2 + 
-                        (d.v9_present - $dim.v9_present)^2 + 
-                        (d.v9_future - $dim.v9_future)^2 + 
-                        (d.v10 - $dim.v10)^2
-                     ) as distance
-                ORDER BY distance ASC
-                LIMIT $limit
-                MATCH (s:Session)-[:HAS_STATE]->(d)
-                RETURN d, distance, s.session_id as session_id
-                """,
-                dim=dimensional_values,
+            list: Estados similares (valores, node_id, distância e session_id)
+            
+        Raises:
+            ValueError: Se algum peso for negativo
+        """
+        w = dimension_weights(weights)
+        if self.state_index_enabled:
+            try:
+                await self._refresh_state_index()
+            except Exception as e:
+                logger.error(f"Erro ao carregar índice de estados, usando consulta Cypher: {e}")
+            else:
+                matches = await asyncio.to_thread(
+                    self.state_index.search,
+                    dimensional_values,
+                    limit,
+                    w,
+                    patient_id,
+                    start.timestamp() if start else None,
+                    end.timestamp() if end else None
+                )
+                return [{
+                    "d": values,
+                    "node_id": node_id,
+                    "distance": distance,
+                    "session_id": session_id
+                } for node_id, session_id, distance, values in matches]
+        
+        return await self._execute_read(
+            self._find_similar_states_tx,
+            dim=dimensional_values,
+            w=w,
+            patient_id=patient_id,
+            start=int(start.timestamp() * 1000) if start else None,
+            end=int(end.timestamp() * 1000) if end else None,
+            limit=limit
+        )
+    
+    @staticmethod
+    async def _find_similar_states_tx(tx, dim, w, patient_id, start, end, limit):
+        # Com paciente, a busca parte do nó do paciente em vez de percorrer todos os estados
+        if patient_id is None:
+            result = await tx.run(queries.FIND_SIMILAR_STATES, dim=dim, w=w, start=start, end=end, limit=limit)
+        else:
+            result = await tx.run(
+                queries.FIND_SIMILAR_PATIENT_STATES,
+                dim=dim,
+                w=w,
+                patient_id=patient_id,
+                start=start,
+                end=end,
                 limit=limit
             )
-            return [dict(record) for record in result]
\ No newline at end of file
+        return [dict(record) async for record in result]
+    
+    async def _refresh_state_index(self):
+        """
+        Carrega o índice de estados ou acrescenta os estados criados desde a última leitura
+        
+        Buscas simultâneas compartilham a leitura: quem espera pela trava não
+        repete uma leitura que começou depois da sua chamada.
+        """
+        now = time.monotonic()
+        if self._state_index_loaded_at is not None and now - self._state_index_loaded_at < self.state_index_refresh:
+            return
+        if self._state_index_lock is None:
+            self._state_index_lock = asyncio.Lock()
+        
+        async with self._state_index_lock:
+            if self._state_index_loaded_at is not None and (
+                self._state_index_loaded_at > now or now - self._state_index_loaded_at < self.state_index_refresh
+            ):
+                return
+            started = time.monotonic()
+            states = await self._execute_read(self._load_states_tx, since=self._state_index_watermark)
+            states = [state for state in states if all(state[name] is not None for name in DIMENSION_FIELDS)]
+            for state in states:
+                state["created_at"] = state["created_at"] / 1000 if state["created_at"] is not None else None
+            await asyncio.to_thread(self.state_index.add_many, states)
+            
+            created = [state["created_at"] for state in states if state["created_at"] is not None]
+            if created:
+                # Reler o último milissegundo: estados repetidos são ignorados pelo índice
+                latest = int(max(created) * 1000)
+                self._state_index_watermark = max(self._state_index_watermark or 0, latest)
+            self._state_index_loaded_at = started
+            if states:
+                logger.info(f"Índice de estados dimensionais: {len(states)} novos, {len(self.state_index)} no total")
+    
+    @staticmethod
+    async def _load_states_tx(tx, since):
+        if since is None:
+            result = await tx.run(queries.LOAD_STATES)
+        else:
+            result = await tx.run(queries.LOAD_STATES_SINCE, since=since)
+        return [dict(record) async for record in result]
+    
+    async def _index_new_states(self, created):
+        """Mantém o índice de estados em dia com os estados gravados por este processo"""
+        if not self.state_index_enabled or self._state_index_loaded_at is None or not created:
+            return
+        states = [{
+            "node_id": record["node_id"],
+            "session_id": session_id,
+            "patient_id": record["patient_id"],
+            "created_at": record["created_at"] / 1000 if record["created_at"] is not None else None,
+            **{name: dim.get(name) for name in DIMENSION_FIELDS}
+        } for session_id, dim, record in created]
+        states = [state for state in states if all(state[name] is not None for name in DIMENSION_FIELDS)]
+        await asyncio.to_thread(self.state_index.add_many, states)
+
+def _plan_operators(plan):
+    """Tipos de operador de um plano EXPLAIN (dict do driver), incluindo os filhos"""
+    if not plan:
+        return []
+    operators = [plan.get("operatorType", "")]
+    for child in plan.get("children", []):
+        operators.extend(_plan_operators(child))
+    return operators
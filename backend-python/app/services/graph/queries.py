@@ -0,0 +1,239 @@
+from app.services.structured_output import DIMENSION_FIELDS
+
+# Consultas Cypher de Neo4jService, reunidas para que check_query_plans
+# possa verificar o plano de execução de cada uma
+
+# Projeção dos valores dimensionais de um estado
+STATE_VALUES = ", ".join(f"d.{name} as {name}" for name in DIMENSION_FIELDS)
+
+# Distância euclidiana (ponderada) entre o estado `d` e os valores $dim
+STATE_DISTANCE = "sqrt(" + " + ".join(
+    f"$w.{name} * (d.{name} - $dim.{name})^2" for name in DIMENSION_FIELDS
+) + ")"
+
+def transition_properties(prev, curr):
+    """Propriedades de TRANSITIONS_TO: variação por dimensão e tempo decorrido entre dois estados"""
+    deltas = ", ".join(f"delta_{name}: {curr}.{name} - {prev}.{name}" for name in DIMENSION_FIELDS)
+    return (
+        f"{{{deltas}, "
+        f"elapsed_seconds: duration.inSeconds({prev}.created_at, {curr}.created_at).milliseconds / 1000.0, "
+        f"created_at: datetime(), automatic: true}}"
+    )
+
+CREATE_PATIENTS = """
+UNWIND $rows AS row
+MERGE (p:Patient {patient_id: row.patient_id})
+ON CREATE SET p.created_at = datetime()
+SET p += row.metadata
+RETURN row.index as index, id(p) as node_id
+"""
+
+CREATE_SESSIONS = """
+UNWIND $rows AS row
+MATCH (p:Patient {patient_id: row.patient_id})
+MERGE (s:Session {session_id: row.session_id})
+ON CREATE SET s.created_at = datetime()
+SET s += row.metadata
+MERGE (p)-[:HAS_SESSION]->(s)
+RETURN row.index as index, id(s) as node_id
+"""
+
+# Cada estado é encadeado ao último estado do paciente (ponteiro LATEST_STATE),
+# na mesma transação. O CALL por linha garante que estados do mesmo paciente
+# no mesmo lote vejam o ponteiro já atualizado pela linha anterior, e a escrita
+# em `p` antes da leitura do ponteiro bloqueia o paciente contra transações
+# concorrentes que encadeariam a partir do mesmo estado.
+#
+# Com row.state_id (ID da análise no Firestore) a gravação é idempotente: um
+# estado já existente é devolvido sem ser recriado nem encadeado de novo, de
+# modo que a repetição de uma análise não acrescenta um passo à trajetória.
+# A restrição de unicidade de state_id cobre gravações simultâneas.
+CREATE_STATES = f"""
+UNWIND $rows AS row
+CALL {{
+    WITH row
+    MATCH (d:DimensionalState {{state_id: row.state_id}})
+    OPTIONAL MATCH (p:Patient)-[:HAS_SESSION]->(:Session)-[:HAS_STATE]->(d)
+    RETURN p, d, null as prev, false as created
+  UNION
+    WITH row
+    MATCH (s:Session {{session_id: row.session_id}})
+    WHERE row.state_id IS NULL
+       OR NOT EXISTS {{ MATCH (:DimensionalState {{state_id: row.state_id}}) }}
+    OPTIONAL MATCH (p:Patient)-[:HAS_SESSION]->(s)
+    CREATE (d:DimensionalState {{
+        state_id: coalesce(row.state_id, randomUUID()),
+        created_at: datetime(),
+        v1: row.dim.v1,
+        v2: row.dim.v2,
+        v3: row.dim.v3,
+        v4: row.dim.v4,
+        v5: row.dim.v5,
+        v6: row.dim.v6,
+        v7: row.dim.v7,
+        v8: row.dim.v8,
+        v9_past: row.dim.v9_past,
+        v9_present: row.dim.v9_present,
+        v9_future: row.dim.v9_future,
+        v10: row.dim.v10
+    }})
+    CREATE (s)-[:HAS_STATE]->(d)
+    SET p.latest_state_at = d.created_at
+    WITH p, d
+    OPTIONAL MATCH (p)-[latest:LATEST_STATE]->(prev:DimensionalState)
+    FOREACH (_ IN CASE WHEN prev IS NULL THEN [] ELSE [1] END |
+        CREATE (prev)-[:TRANSITIONS_TO {transition_properties("prev", "d")}]->(d)
+    )
+    DELETE latest
+    FOREACH (_ IN CASE WHEN p IS NULL THEN [] ELSE [1] END |
+        CREATE (p)-[:LATEST_STATE]->(d)
+    )
+    RETURN p, d, prev, true as created
+}}
+RETURN row.index as index, d.state_id as node_id, prev.state_id as previous_id,
+       p.patient_id as patient_id, d.created_at.epochMillis as created_at, created
+"""
+
+CREATE_TRANSITIONS = """
+UNWIND $rows AS row
+MATCH (s1:DimensionalState {state_id: row.from_id})
+MATCH (s2:DimensionalState {state_id: row.to_id})
+CREATE (s1)-[t:TRANSITIONS_TO]->(s2)
+SET t += row.metadata
+RETURN row.index as index, true as created
+"""
+
+_SIMILAR_STATES_RANKING = f"""
+WITH d, s, {STATE_DISTANCE} as distance
+ORDER BY distance ASC
+LIMIT $limit
+RETURN d {{.v1, .v2, .v3, .v4, .v5, .v6, .v7, .v8, .v9_past, .v9_present, .v9_future, .v10}} as d,
+       d.state_id as node_id, distance, s.session_id as session_id
+"""
+
+# Compara com todos os estados do grafo (varredura completa por definição)
+FIND_SIMILAR_STATES = """
+MATCH (s:Session)-[:HAS_STATE]->(d:DimensionalState)
+WHERE ($start IS NULL OR d.created_at >= datetime({epochMillis: $start}))
+  AND ($end IS NULL OR d.created_at <= datetime({epochMillis: $end}))
+""" + _SIMILAR_STATES_RANKING
+
+# Parte do paciente (índice de patient_id) e percorre apenas os seus estados
+FIND_SIMILAR_PATIENT_STATES = """
+MATCH (:Patient {patient_id: $patient_id})-[:HAS_SESSION]->(s:Session)-[:HAS_STATE]->(d:DimensionalState)
+WHERE ($start IS NULL OR d.created_at >= datetime({epochMillis: $start}))
+  AND ($end IS NULL OR d.created_at <= datetime({epochMillis: $end}))
+""" + _SIMILAR_STATES_RANKING
+
+# Maior trajetória percorrida por consulta (limite do caminho de tamanho variável)
+TRAJECTORY_MAX_STATES = 1000
+
+# Trajetória do paciente: caminho de TRANSITIONS_TO a partir do último estado,
+# do mais antigo para o mais recente (no máximo $limit estados)
+PATIENT_TRAJECTORY = f"""
+MATCH (:Patient {{patient_id: $patient_id}})-[:LATEST_STATE]->(last:DimensionalState)
+MATCH path = (last)<-[:TRANSITIONS_TO*0..{TRAJECTORY_MAX_STATES - 1}]-(d:DimensionalState)
+WHERE length(path) < $limit
+  AND all(t IN relationships(path) WHERE t.automatic)
+MATCH (s:Session)-[:HAS_STATE]->(d)
+WITH d, s, length(path) as steps
+ORDER BY steps DESC
+RETURN d.state_id as node_id, s.session_id as session_id,
+       d.created_at.epochMillis as created_at, {STATE_VALUES}
+"""
+
+SESSION_PATIENT = """
+MATCH (p:Patient)-[:HAS_SESSION]->(:Session {session_id: $session_id})
+RETURN p.patient_id as patient_id
+"""
+
+_STATE_ROWS = f"""
+MATCH (s:Session)-[:HAS_STATE]->(d)
+OPTIONAL MATCH (p:Patient)-[:HAS_SESSION]->(s)
+RETURN d.state_id as node_id, s.session_id as session_id, p.patient_id as patient_id,
+       d.created_at.epochMillis as created_at, {STATE_VALUES}
+"""
+
+# Carga inicial do índice de estados (varredura completa por definição)
+LOAD_STATES = """
+MATCH (d:DimensionalState)
+""" + _STATE_ROWS
+
+# Estados criados desde a última leitura (faixa no índice de created_at)
+LOAD_STATES_SINCE = """
+MATCH (d:DimensionalState)
+WHERE d.created_at >= datetime({epochMillis: $since})
+""" + _STATE_ROWS
+
+SCHEMA_VERSION_READ = """
+OPTIONAL MATCH (v:SchemaVersion {name: $name})
+RETURN v.version as version
+"""
+
+# Concessão (lease) das migrações no próprio nó SchemaVersion. O primeiro SET
+# toma o bloqueio de escrita do nó; a concessão é lida e gravada em seguida, na
+# mesma transação, de modo que dois processos nunca a obtêm ao mesmo tempo.
+SCHEMA_LOCK_TAKE = """
+MERGE (v:SchemaVersion {name: $name})
+SET v.lock_checked_at = timestamp()
+"""
+
+SCHEMA_LOCK_ACQUIRE = """
+MATCH (v:SchemaVersion {name: $name})
+WITH v, coalesce(v.locked_until, 0) < timestamp() OR v.locked_by = $owner as free
+SET v.locked_until = CASE WHEN free THEN timestamp() + $ttl_ms ELSE v.locked_until END,
+    v.locked_by = CASE WHEN free THEN $owner ELSE v.locked_by END
+RETURN free as acquired, v.version as version
+"""
+
+SCHEMA_LOCK_RENEW = """
+MATCH (v:SchemaVersion {name: $name})
+WHERE v.locked_by = $owner
+SET v.locked_until = timestamp() + $ttl_ms
+RETURN count(v) as renewed
+"""
+
+SCHEMA_LOCK_RELEASE = """
+MATCH (v:SchemaVersion {name: $name})
+WHERE v.locked_by = $owner
+REMOVE v.locked_until, v.locked_by
+"""
+
+SCHEMA_VERSION_WRITE = """
+MATCH (v:SchemaVersion {name: $name})
+WHERE v.locked_by = $owner
+SET v.version = $version, v.applied_at = datetime(), v.locked_until = timestamp() + $ttl_ms
+RETURN count(v) as renewed
+"""
+
+_SAMPLE_DIM = {name: 5.0 for name in DIMENSION_FIELDS}
+
+# Consultas verificadas por check_query_plans: nome -> (consulta, parâmetros de
+# exemplo, varredura de rótulo esperada). Uma consulta nova precisa entrar aqui.
+PLAN_CHECKS = {
+    "create_patients": (CREATE_PATIENTS, {"rows": [{"index": 0, "patient_id": "p", "metadata": {}}]}, False),
+    "create_sessions": (CREATE_SESSIONS, {"rows": [{"index": 0, "session_id": "s", "patient_id": "p", "metadata": {}}]}, False),
+    "create_states": (CREATE_STATES, {"rows": [{"index": 0, "session_id": "s", "state_id": "a", "dim": _SAMPLE_DIM}]}, False),
+    "create_transitions": (CREATE_TRANSITIONS, {"rows": [{"index": 0, "from_id": "a", "to_id": "b", "metadata": {}}]}, False),
+    "find_similar_states": (
+        FIND_SIMILAR_STATES,
+        {"dim": _SAMPLE_DIM, "w": {name: 1.0 for name in DIMENSION_FIELDS}, "start": None, "end": None, "limit": 5},
+        True
+    ),
+    "find_similar_patient_states": (
+        FIND_SIMILAR_PATIENT_STATES,
+        {"dim": _SAMPLE_DIM, "w": {name: 1.0 for name in DIMENSION_FIELDS}, "patient_id": "p",
+         "start": None, "end": None, "limit": 5},
+        False
+    ),
+    "patient_trajectory": (PATIENT_TRAJECTORY, {"patient_id": "p", "limit": 100}, False),
+    "session_patient": (SESSION_PATIENT, {"session_id": "s"}, False),
+    "load_states": (LOAD_STATES, {}, True),
+    "load_states_since": (LOAD_STATES_SINCE, {"since": 0}, False),
+    "schema_version_read": (SCHEMA_VERSION_READ, {"name": "vintra"}, False),
+    "schema_version_write": (SCHEMA_VERSION_WRITE, {"name": "vintra", "owner": "o", "version": 0, "ttl_ms": 0}, False),
+    "schema_lock_take": (SCHEMA_LOCK_TAKE, {"name": "vintra"}, False),
+    "schema_lock_acquire": (SCHEMA_LOCK_ACQUIRE, {"name": "vintra", "owner": "o", "ttl_ms": 0}, False),
+    "schema_lock_renew": (SCHEMA_LOCK_RENEW, {"name": "vintra", "owner": "o", "ttl_ms": 0}, False),
+    "schema_lock_release": (SCHEMA_LOCK_RELEASE, {"name": "vintra", "owner": "o"}, False),
+}
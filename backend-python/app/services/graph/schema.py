@@ -0,0 +1,53 @@
+# Esquema do grafo, aplicado na inicialização por Neo4jService.ensure_schema.
+# Cada migração é aplicada uma única vez, em ordem, por um processo de cada vez
+# (concessão no nó SchemaVersion); a versão aplicada fica no
+# nó (:SchemaVersion {name: SCHEMA_NAME}). Para alterar o esquema, acrescente
+# uma nova versão em vez de editar as anteriores. Uma migração interrompida é
+# refeita por inteiro, então cada comando precisa poder ser repetido
+# (IF NOT EXISTS, filtros WHERE sobre o que já foi migrado).
+
+from app.services.graph.queries import transition_properties
+
+SCHEMA_NAME = "vintra"
+
+# Criada antes da concessão das migrações, que depende de um único nó por nome
+SCHEMA_LOCK_CONSTRAINT = (
+    "CREATE CONSTRAINT schema_version_name IF NOT EXISTS "
+    "FOR (v:SchemaVersion) REQUIRE v.name IS UNIQUE"
+)
+
+MIGRATIONS = [
+    (1, [
+        SCHEMA_LOCK_CONSTRAINT,
+        "CREATE CONSTRAINT patient_id_unique IF NOT EXISTS "
+        "FOR (p:Patient) REQUIRE p.patient_id IS UNIQUE",
+        "CREATE CONSTRAINT session_id_unique IF NOT EXISTS "
+        "FOR (s:Session) REQUIRE s.session_id IS UNIQUE",
+        "CREATE CONSTRAINT dimensional_state_id_unique IF NOT EXISTS "
+        "FOR (d:DimensionalState) REQUIRE d.state_id IS UNIQUE",
+        "CREATE INDEX dimensional_state_created_at IF NOT EXISTS "
+        "FOR (d:DimensionalState) ON (d.created_at)",
+        # Estados anteriores ao state_id recebem um identificador estável
+        "MATCH (d:DimensionalState) WHERE d.state_id IS NULL "
+        "CALL { WITH d SET d.state_id = randomUUID() } IN TRANSACTIONS OF 10000 ROWS",
+    ]),
+    (2, [
+        # Encadeia os estados já existentes de cada paciente em ordem de criação
+        # e aponta LATEST_STATE para o mais recente
+        "MATCH (p:Patient) WHERE NOT (p)-[:LATEST_STATE]->() "
+        "CALL { "
+        "WITH p "
+        "MATCH (p)-[:HAS_SESSION]->(:Session)-[:HAS_STATE]->(d:DimensionalState) "
+        "WITH p, d ORDER BY d.created_at "
+        "WITH p, collect(d) AS states "
+        "FOREACH (i IN range(1, size(states) - 1) | "
+        "FOREACH (prev IN [states[i - 1]] | FOREACH (d IN [states[i]] | "
+        f"CREATE (prev)-[:TRANSITIONS_TO {transition_properties('prev', 'd')}]->(d)))) "
+        "WITH p, states[-1] AS last "
+        "CREATE (p)-[:LATEST_STATE]->(last) "
+        "SET p.latest_state_at = last.created_at "
+        "} IN TRANSACTIONS OF 100 ROWS",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
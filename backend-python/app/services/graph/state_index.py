@@ -0,0 +1,209 @@
+import heapq
+import threading
+
+import numpy as np
+
+from app.services.structured_output import DIMENSION_FIELDS
+
+# Pontos por folha da KD-tree
+LEAF_SIZE = 256
+
+# Com filtros seletivos (ex.: um paciente) a comparação direta é mais rápida que a árvore
+BRUTE_FORCE_MAX = 4096
+
+class DimensionalStateIndex:
+    """
+    Índice em memória dos estados dimensionais para busca de vizinhos próximos
+
+    Os 12 valores de cada estado ficam numa matriz NumPy coberta por uma
+    KD-tree; estados inseridos depois da última construção são comparados
+    diretamente até a árvore ser reconstruída. A distância é euclidiana, com
+    pesos opcionais por dimensão, e a busca aceita filtros por paciente e por
+    data de criação.
+    """
+
+    def __init__(self):
+        self._points = np.empty((1024, len(DIMENSION_FIELDS)), dtype=np.float64)
+        self._created_at = np.empty(1024, dtype=np.float64)
+        self._patients = np.empty(1024, dtype=object)
+        self._node_ids = []
+        self._session_ids = []
+        self._known = set()
+        self.count = 0
+
+        self._tree = None
+        self._tree_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, node_id):
+        return node_id in self._known
+
+    def add_many(self, states):
+        """
+        Insere estados (ignorando os já conhecidos)
+
+        Args:
+            states: Lista de dicts com node_id, session_id, patient_id,
+                created_at (segundos desde a época) e os valores v1-v10
+        """
+        with self._lock:
+            for state in states:
+                if state["node_id"] in self._known:
+                    continue
+                if self.count == len(self._points):
+                    self._grow()
+                self._points[self.count] = [state[name] for name in DIMENSION_FIELDS]
+                self._created_at[self.count] = state.get("created_at") or 0.0
+                self._patients[self.count] = state.get("patient_id")
+                self._node_ids.append(state["node_id"])
+                self._session_ids.append(state.get("session_id"))
+                self._known.add(state["node_id"])
+                self.count += 1
+
+            # Reconstruir quando os pontos fora da árvore passarem de 10% do total
+            pending = self.count - self._tree_size
+            if pending > max(BRUTE_FORCE_MAX, self._tree_size // 10):
+                self._rebuild()
+
+    def _grow(self):
+        capacity = len(self._points) * 2
+        self._points = np.resize(self._points, (capacity, self._points.shape[1]))
+        self._created_at = np.resize(self._created_at, capacity)
+        patients = np.empty(capacity, dtype=object)
+        patients[:self.count] = self._patients[:self.count]
+        self._patients = patients
+
+    def _rebuild(self):
+        self._tree_size = self.count
+        self._tree = _build(self._points, np.arange(self.count)) if self.count else None
+
+    def search(self, values, k=5, weights=None, patient_id=None, start=None, end=None):
+        """
+        Busca os estados mais próximos
+
+        Args:
+            values: Valores dimensionais de referência
+            k: Número de resultados
+            weights: Peso por dimensão (padrão 1; pesos ausentes valem 1)
+            patient_id: Restringe aos estados do paciente
+            start, end: Restringe por data de criação (segundos desde a época, inclusivo)
+
+        Returns:
+            list: Tuplas (node_id, session_id, distância, valores) em ordem crescente de distância
+
+        Raises:
+            ValueError: Se algum peso for negativo
+        """
+        query = np.array([values[name] for name in DIMENSION_FIELDS], dtype=np.float64)
+        w = np.array(list(dimension_weights(weights).values()), dtype=np.float64)
+
+        with self._lock:
+            if not self.count or k <= 0:
+                return []
+
+            allowed = None
+            if patient_id is not None or start is not None or end is not None:
+                allowed = np.ones(self.count, dtype=bool)
+                if patient_id is not None:
+                    allowed &= self._patients[:self.count] == patient_id
+                if start is not None:
+                    allowed &= self._created_at[:self.count] >= start
+                if end is not None:
+                    allowed &= self._created_at[:self.count] <= end
+
+            if self._tree is None or (allowed is not None and allowed.sum() <= BRUTE_FORCE_MAX):
+                rows = np.arange(self.count) if allowed is None else np.flatnonzero(allowed)
+                best = self._brute_force(rows, query, w, k)
+            else:
+                best = self._tree_search(query, w, k, allowed)
+                pending = np.arange(self._tree_size, self.count)
+                if allowed is not None:
+                    pending = pending[allowed[pending]]
+                best = sorted(best + self._brute_force(pending, query, w, k))[:k]
+
+            return [
+                (
+                    self._node_ids[row],
+                    self._session_ids[row],
+                    float(np.sqrt(squared)),
+                    dict(zip(DIMENSION_FIELDS, self._points[row].tolist()))
+                )
+                for squared, row in best
+            ]
+
+    def _brute_force(self, rows, query, w, k):
+        if not len(rows):
+            return []
+        squared = ((self._points[rows] - query) ** 2) @ w
+        take = min(k, len(rows))
+        part = np.argpartition(squared, take - 1)[:take]
+        return sorted(zip(squared[part].tolist(), rows[part].tolist()))
+
+    def _tree_search(self, query, w, k, allowed):
+        """Busca em profundidade, visitando primeiro o lado da consulta e podando pelo plano de corte"""
+        heap = []  # max-heap de (-distância², linha)
+        stack = [(self._tree, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(heap) == k and bound >= -heap[0][0]:
+                continue
+            if node[0] == "leaf":
+                rows = node[1]
+                if allowed is not None:
+                    rows = rows[allowed[rows]]
+                if not len(rows):
+                    continue
+                squared = ((self._points[rows] - query) ** 2) @ w
+                for value, row in zip(squared.tolist(), rows.tolist()):
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-value, row))
+                    elif value < -heap[0][0]:
+                        heapq.heapreplace(heap, (-value, row))
+                continue
+
+            _, axis, split, left, right = node
+            diff = query[axis] - split
+            near, far = (left, right) if diff <= 0 else (right, left)
+            # O lado distante fica na pilha primeiro, para ser visitado depois do próximo
+            stack.append((far, max(bound, w[axis] * diff * diff)))
+            stack.append((near, bound))
+        return sorted((-value, row) for value, row in heap)
+
+def dimension_weights(weights=None):
+    """
+    Peso de cada dimensão, na ordem de DIMENSION_FIELDS (ausentes valem 1)
+
+    Pesos negativos são recusados: tornariam a "distância" negativa e
+    invalidariam a poda da KD-tree.
+
+    Raises:
+        ValueError: Se algum peso for negativo
+    """
+    resolved = {name: float((weights or {}).get(name, 1.0)) for name in DIMENSION_FIELDS}
+    negative = sorted(name for name, value in resolved.items() if value < 0)
+    if negative:
+        raise ValueError(f"Pesos negativos não são permitidos: {', '.join(negative)}")
+    return resolved
+
+def _build(points, rows):
+    """Constrói a KD-tree dividindo pela mediana da dimensão de maior amplitude"""
+    if len(rows) <= LEAF_SIZE:
+        return ("leaf", rows)
+    subset = points[rows]
+    spread = subset.max(axis=0) - subset.min(axis=0)
+    axis = int(np.argmax(spread))
+    if spread[axis] == 0:
+        return ("leaf", rows)
+    middle = len(rows) // 2
+    order = np.argpartition(subset[:, axis], middle)
+    split = float(subset[order[middle], axis])
+    return (
+        "node",
+        axis,
+        split,
+        _build(points, rows[order[:middle]]),
+        _build(points, rows[order[middle:]])
+    )
@@ -0,0 +1,317 @@
+import os
+import copy
+import asyncio
+
+import numpy as np
+
+from app.services.cache.ttl_cache import TTLCache
+from app.services.structured_output import DIMENSION_FIELDS
+
+# Variações anteriores exigidas antes de marcar pontos de mudança
+CHANGE_POINT_MIN_HISTORY = 3
+
+class Trajectory:
+    """
+    Métricas de trajetória de um paciente (sessões × 12 dimensões)
+
+    Por sessão e dimensão:
+    - velocidade: variação em relação à sessão anterior
+    - aceleração: variação da velocidade
+    - tendência: média exponencial (EWMA) das velocidades
+    - volatilidade: desvio-padrão exponencial das velocidades em torno da tendência
+    - mudança: velocidade que se afasta da tendência anterior por mais de
+      `threshold` volatilidades (ponto de mudança)
+
+    `from_history` calcula a série completa de uma vez; `append` acrescenta uma
+    sessão a partir da última linha, com o mesmo resultado.
+    """
+
+    def __init__(self, alpha, threshold):
+        self.alpha = alpha
+        self.threshold = threshold
+        dims = len(DIMENSION_FIELDS)
+        self.node_ids = []
+        # Estados já na série, para ignorar os recebidos mais de uma vez
+        self._node_set = set()
+        self.session_ids = []
+        self.created_at = []
+        self.values = np.empty((0, dims))
+        self.velocity = np.empty((0, dims))
+        self.acceleration = np.empty((0, dims))
+        self.trend = np.empty((0, dims))
+        self.variance = np.empty((0, dims))
+        self.change_points = np.empty((0, dims), dtype=bool)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @classmethod
+    def from_history(cls, states, alpha=0.3, threshold=3.0):
+        """
+        Calcula as métricas de toda a série
+
+        Args:
+            states: Estados do mais antigo para o mais recente (dicts com
+                node_id, session_id, created_at e os valores v1-v10)
+            alpha: Fator de suavização exponencial (0-1)
+            threshold: Volatilidades que caracterizam um ponto de mudança
+
+        Returns:
+            Trajectory: Métricas por sessão
+        """
+        trajectory = cls(alpha, threshold)
+        states = [state for state in states if all(state.get(name) is not None for name in DIMENSION_FIELDS)]
+        if not states:
+            return trajectory
+
+        trajectory.node_ids = [state["node_id"] for state in states]
+        trajectory._node_set = set(trajectory.node_ids)
+        trajectory.session_ids = [state.get("session_id") for state in states]
+        trajectory.created_at = [state.get("created_at") for state in states]
+        values = np.array([[state[name] for name in DIMENSION_FIELDS] for state in states], dtype=np.float64)
+        trajectory.values = values
+
+        velocity = np.zeros_like(values)
+        velocity[1:] = np.diff(values, axis=0)
+        acceleration = np.zeros_like(values)
+        acceleration[2:] = np.diff(velocity[1:], axis=0)
+        trajectory.velocity = velocity
+        trajectory.acceleration = acceleration
+
+        trend = np.zeros_like(values)
+        variance = np.zeros_like(values)
+        changes = np.zeros(values.shape, dtype=bool)
+        if len(values) > 1:
+            # Recorrências EWMA em forma fechada sobre as velocidades d[0..m-1]:
+            #   e[t] = a·d[t] + (1-a)·e[t-1],                   e[-1] = d[0]
+            #   s[t] = (1-a)·(s[t-1] + a·(d[t] - e[t-1])²),     s[-1] = 0
+            d = velocity[1:]
+            m = len(d)
+            steps = np.subtract.outer(np.arange(m), np.arange(m))
+            decay = np.where(steps >= 0, (1 - alpha) ** np.maximum(steps, 0), 0.0)
+            e = alpha * (decay @ d) + ((1 - alpha) ** (np.arange(m) + 1))[:, None] * d[0]
+            previous = np.vstack([d[:1], e[:-1]])
+            deviation = d - previous
+            s = (1 - alpha) * (decay @ (alpha * deviation ** 2))
+            previous_s = np.vstack([np.zeros((1, d.shape[1])), s[:-1]])
+
+            trend[1:] = e
+            variance[1:] = s
+            changes[1:] = _change_points(deviation, previous_s, np.arange(m), threshold)
+        trajectory.trend = trend
+        trajectory.variance = variance
+        trajectory.change_points = changes
+        return trajectory
+
+    def step(self, values):
+        """
+        Métricas de uma nova sessão a partir da última linha (sem alterar a série)
+
+        Args:
+            values: Valores dimensionais da nova sessão
+
+        Returns:
+            tuple: Linhas (valores, velocidade, aceleração, tendência, variância, mudança)
+        """
+        row = np.array([values[name] for name in DIMENSION_FIELDS], dtype=np.float64)
+        zeros = np.zeros_like(row)
+        count = len(self)
+        if count == 0:
+            return row, zeros, zeros, zeros, zeros, zeros.astype(bool)
+
+        velocity = row - self.values[-1]
+        acceleration = velocity - self.velocity[-1] if count >= 2 else zeros
+        # Na primeira velocidade a tendência anterior é a própria velocidade
+        previous_trend = self.trend[-1] if count >= 2 else velocity
+        previous_variance = self.variance[-1]
+        deviation = velocity - previous_trend
+        trend = self.alpha * velocity + (1 - self.alpha) * previous_trend
+        variance = (1 - self.alpha) * (previous_variance + self.alpha * deviation ** 2)
+        change = _change_points(deviation, previous_variance, count - 1, self.threshold)
+        return row, velocity, acceleration, trend, variance, change
+
+    def append(self, state):
+        """Acrescenta uma sessão (dict como em `from_history`); estados já presentes são ignorados"""
+        if state["node_id"] in self._node_set or any(state.get(name) is None for name in DIMENSION_FIELDS):
+            return
+        row, velocity, acceleration, trend, variance, change = self.step(state)
+        self.node_ids.append(state["node_id"])
+        self._node_set.add(state["node_id"])
+        self.session_ids.append(state.get("session_id"))
+        self.created_at.append(state.get("created_at"))
+        self.values = np.vstack([self.values, row])
+        self.velocity = np.vstack([self.velocity, velocity])
+        self.acceleration = np.vstack([self.acceleration, acceleration])
+        self.trend = np.vstack([self.trend, trend])
+        self.variance = np.vstack([self.variance, variance])
+        self.change_points = np.vstack([self.change_points, change])
+
+    def copy(self):
+        """Cópia que pode receber `append` sem alterar a original (as séries numpy são substituídas, não alteradas)"""
+        other = copy.copy(self)
+        other.node_ids = list(self.node_ids)
+        other._node_set = set(self._node_set)
+        other.session_ids = list(self.session_ids)
+        other.created_at = list(self.created_at)
+        return other
+
+    def summary(self, rows=None):
+        """
+        Resumo da última sessão no formato de `DimensionalAnalysis.trajetoria`
+
+        Args:
+            rows: Linhas de `step` a resumir no lugar da última sessão da série
+
+        Returns:
+            dict: Valores por dimensão (velocidade_v1, tendencia_v1, ...) e totais
+        """
+        if rows is None:
+            if not len(self):
+                return {}
+            rows = (
+                self.values[-1], self.velocity[-1], self.acceleration[-1],
+                self.trend[-1], self.variance[-1], self.change_points[-1]
+            )
+            sessions = len(self)
+        else:
+            sessions = len(self) + 1
+        _, velocity, acceleration, trend, variance, change = rows
+
+        result = {"sessoes": float(sessions)}
+        for label, series in (
+            ("velocidade", velocity),
+            ("aceleracao", acceleration),
+            ("tendencia", trend),
+            ("volatilidade", np.sqrt(variance)),
+            ("mudanca", change.astype(np.float64))
+        ):
+            result.update({f"{label}_{name}": round(float(value), 4) for name, value in zip(DIMENSION_FIELDS, series)})
+        result["velocidade"] = round(float(np.linalg.norm(velocity)), 4)
+        result["mudancas"] = float(change.sum())
+        return result
+
+    def to_dict(self, limit=None):
+        """Série completa (ou as últimas `limit` sessões) para a API"""
+        start = max(0, len(self) - limit) if limit else 0
+
+        def by_dimension(matrix, row):
+            return {name: round(float(value), 4) for name, value in zip(DIMENSION_FIELDS, matrix[row])}
+
+        return [{
+            "node_id": self.node_ids[row],
+            "sessao_id": self.session_ids[row],
+            "data_criacao": self.created_at[row],
+            "valores": by_dimension(self.values, row),
+            "velocidade": by_dimension(self.velocity, row),
+            "aceleracao": by_dimension(self.acceleration, row),
+            "tendencia": by_dimension(self.trend, row),
+            "volatilidade": by_dimension(np.sqrt(self.variance), row),
+            "mudancas": [name for name, flag in zip(DIMENSION_FIELDS, self.change_points[row]) if flag]
+        } for row in range(start, len(self))]
+
+def _change_points(deviation, previous_variance, position, threshold):
+    """Desvio da tendência maior que `threshold` volatilidades, após histórico mínimo"""
+    enough = np.asarray(position) >= CHANGE_POINT_MIN_HISTORY
+    if np.ndim(enough):
+        enough = enough[:, None]
+    return enough & (previous_variance > 0) & (deviation ** 2 > threshold ** 2 * previous_variance)
+
+class TrajectoryEngine:
+    """
+    Trajetórias por paciente, em cache e atualizadas a cada novo estado
+
+    Na primeira consulta a série do paciente é carregada e calculada por
+    completo; estados criados depois são acrescentados à série em cache com
+    `apply`, sem recálculo. A expiração limita a defasagem em relação a estados
+    gravados por outros processos.
+    """
+
+    def __init__(self, loader):
+        """
+        Args:
+            loader: Corrotina loader(patient_id) -> estados do mais antigo para o mais recente
+        """
+        self.loader = loader
+        self.alpha = float(os.getenv("TRAJECTORY_EWMA_ALPHA", "0.3"))
+        self.threshold = float(os.getenv("TRAJECTORY_CHANGE_THRESHOLD", "3.0"))
+        self.cache = TTLCache(
+            max_entries=int(os.getenv("TRAJECTORY_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("TRAJECTORY_CACHE_TTL_SECONDS", "600"))
+        )
+        # Estados recebidos enquanto a série do paciente está sendo carregada
+        self._loading = {}
+
+    async def get(self, patient_id):
+        """
+        Trajetória do paciente (do cache ou carregada)
+
+        Returns:
+            Trajectory: Métricas por sessão (vazia se o paciente não tiver estados)
+        """
+        trajectory = self.cache.get(patient_id)
+        if trajectory is not None:
+            return trajectory
+
+        # Consultas simultâneas do mesmo paciente compartilham uma única carga
+        if patient_id not in self._loading:
+            self._loading[patient_id] = (asyncio.ensure_future(self._load(patient_id)), [])
+        return await asyncio.shield(self._loading[patient_id][0])
+
+    async def _load(self, patient_id):
+        try:
+            states = await self.loader(patient_id)
+            trajectory = await asyncio.to_thread(Trajectory.from_history, states, self.alpha, self.threshold)
+            for state in self._loading[patient_id][1]:
+                trajectory.append(state)
+            self.cache.set(patient_id, trajectory)
+            return trajectory
+        finally:
+            self._loading.pop(patient_id, None)
+
+    def apply(self, states):
+        """
+        Acrescenta estados recém-criados às trajetórias em cache
+
+        Args:
+            states: Dicts com patient_id, node_id, session_id, created_at e valores v1-v10
+        """
+        for state in states:
+            patient_id = state.get("patient_id")
+            if patient_id is None:
+                continue
+            if patient_id in self._loading:
+                self._loading[patient_id][1].append(state)
+                continue
+            trajectory = self.cache.get(patient_id)
+            if trajectory is not None:
+                trajectory.append(state)
+
+    async def preview(self, patient_id, values):
+        """
+        Resumo da trajetória se uma sessão com `values` fosse acrescentada agora
+
+        Returns:
+            dict: Resumo no formato de `DimensionalAnalysis.trajetoria`
+        """
+        trajectory = await self.get(patient_id)
+        return trajectory.summary(trajectory.step(values))
+
+    async def preview_many(self, patient_id, values_list):
+        """
+        Resumos de várias sessões novas do mesmo paciente, acrescentadas em ordem
+
+        Cada resumo considera as sessões anteriores da lista, como se já
+        tivessem sido gravadas; a série em cache não é alterada.
+
+        Returns:
+            list: Resumos, na mesma ordem de `values_list`
+        """
+        trajectory = (await self.get(patient_id)).copy()
+        summaries = []
+        for position, values in enumerate(values_list):
+            summaries.append(trajectory.summary(trajectory.step(values)))
+            trajectory.append({"node_id": ("preview", position), **values})
+        return summaries
+
+    def stats(self):
+        return self.cache.stats()
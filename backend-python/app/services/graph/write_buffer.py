@@ -0,0 +1,122 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("vintra-backend.neo4j")
+
+# Ordem de gravação: cada tipo depende dos anteriores
+WRITE_KINDS = ("patients", "sessions", "states", "transitions")
+
+class GraphWriteBuffer:
+    """
+    Agrupa escritas individuais no grafo em gravações em massa
+
+    As escritas recebidas esperam até `max_wait_ms` (ou até somar `max_size`)
+    e são gravadas juntas por `ingest`, um tipo por vez na ordem de
+    dependência (pacientes, sessões, estados, transições). Uma gravação só
+    começa depois que a anterior terminar, de modo que uma escrita nunca é
+    aplicada antes de outra enviada antes dela. Uma escrita inválida não
+    derruba as demais do lote: o lote é dividido até isolá-la.
+    """
+
+    def __init__(self, ingest, max_size=200, max_wait_ms=20):
+        """
+        Args:
+            ingest: Corrotina ingest(**{tipo: linhas}) -> {tipo: resultados}
+            max_size: Escritas acumuladas que disparam a gravação imediata
+            max_wait_ms: Espera máxima de uma escrita no buffer
+        """
+        self.ingest = ingest
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait_ms / 1000
+
+        self._pending = {kind: [] for kind in WRITE_KINDS}
+        self._size = 0
+        # Criados sob demanda, dentro do event loop que os utiliza
+        self._timer = None
+        self._drain_task = None
+
+        self.flushes = 0
+        self.writes = 0
+
+    async def submit(self, kind, row):
+        """
+        Enfileira uma escrita e aguarda sua gravação
+
+        Args:
+            kind: "patients", "sessions", "states" ou "transitions"
+            row: Linha no formato aceito por `ingest`
+
+        Returns:
+            Resultado da linha (ID do nó criado ou sucesso da transição)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[kind].append((row, future))
+        self._size += 1
+
+        if self._size >= self.max_size:
+            self._start_drain()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._start_drain)
+        return await future
+
+    async def flush(self):
+        """Grava imediatamente tudo o que estiver pendente"""
+        self._start_drain()
+        if self._drain_task is not None:
+            await asyncio.shield(self._drain_task)
+
+    def _start_drain(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._size and (self._drain_task is None or self._drain_task.done()):
+            self._drain_task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        # Escritas que chegam durante uma gravação seguem na próxima volta
+        while self._size:
+            batch, self._pending = self._pending, {kind: [] for kind in WRITE_KINDS}
+            self._size = 0
+            await self._write(batch)
+
+    async def _write(self, batch):
+        self.flushes += 1
+        for kind in WRITE_KINDS:
+            entries = batch[kind]
+            if not entries:
+                continue
+            self.writes += len(entries)
+            await self._ingest(kind, entries)
+
+    async def _ingest(self, kind, entries):
+        """
+        Grava as escritas de um tipo; se o lote falhar, divide-o ao meio até
+        isolar as escritas com erro, de modo que só elas recebam a exceção
+        """
+        try:
+            results = (await self.ingest(**{kind: [row for row, _ in entries]}))[kind]
+        except Exception as e:
+            if len(entries) > 1:
+                logger.warning(f"Erro na gravação em massa de {len(entries)} {kind}, dividindo o lote: {e}")
+                middle = len(entries) // 2
+                await self._ingest(kind, entries[:middle])
+                await self._ingest(kind, entries[middle:])
+                return
+            logger.error(f"Erro na gravação de {kind}: {e}")
+            _, future = entries[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(entries, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        """Gravações realizadas e escritas por gravação"""
+        return {
+            "gravacoes": self.flushes,
+            "escritas": self.writes,
+            "media_por_gravacao": round(self.writes / self.flushes, 2) if self.flushes else 0.0,
+            "pendentes": self._size
+        }
@@ -0,0 +1 @@
+# VINTRA Job Services
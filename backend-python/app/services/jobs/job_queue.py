@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import tempfile
+import threading
+
+# Estados possíveis de um job
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class JobQueue:
+    """
+    Fila persistente de jobs em SQLite
+
+    Jobs reservados por um worker ficam invisíveis até o fim do prazo de
+    visibilidade; se o worker morrer, o job volta para a fila. Falhas são
+    reagendadas com backoff exponencial até `max_attempts`. O progresso
+    gravado com `save_checkpoint` é entregue às tentativas seguintes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(
+            "JOB_QUEUE_PATH",
+            os.path.join(tempfile.gettempdir(), "vintra-jobs.db")
+        )
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.visibility_timeout = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+        self.retry_base_delay = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+        self.retry_max_delay = float(os.getenv("JOB_RETRY_MAX_DELAY", "300"))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Uma conexão por processo; o arquivo pode ser compartilhado entre workers
+        self._conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    available_at REAL NOT NULL,
+                    lease_expires_at REAL,
+                    worker_id TEXT,
+                    result TEXT,
+                    error TEXT,
+                    checkpoint TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            # Filas criadas antes do checkpoint por job
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "checkpoint" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN checkpoint TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at)"
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, kind, payload, max_attempts=None):
+        """
+        Adiciona um job à fila
+
+        Args:
+            kind: Tipo do job (ex.: "analise")
+            payload: Dados serializáveis em JSON
+            max_attempts: Número máximo de tentativas (padrão: JOB_MAX_ATTEMPTS)
+
+        Returns:
+            str: ID do job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO jobs (id, kind, payload, status, max_attempts, available_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (job_id, kind, json.dumps(payload), QUEUED,
+                 max_attempts or self.max_attempts, now, now, now)
+            )
+        return job_id
+
+    def claim(self, worker_id):
+        """
+        Reserva o próximo job disponível para um worker
+
+        Args:
+            worker_id: Identificador do worker
+
+        Returns:
+            dict: Job reservado, ou None se a fila estiver vazia
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._release_expired(now)
+                row = self._conn.execute(
+                    """
+                    SELECT * FROM jobs
+                    WHERE status = ? AND available_at <= ?
+                    ORDER BY available_at
+                    LIMIT 1
+                    """,
+                    (QUEUED, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    """
+                    UPDATE jobs
+                    SET status = ?, attempts = attempts + 1, lease_expires_at = ?,
+                        worker_id = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (RUNNING, now + self.visibility_timeout, worker_id, now, row["id"])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        job = self._row_to_dict(row)
+        job["status"] = RUNNING
+        job["attempts"] += 1
+        return job
+
+    def _release_expired(self, now):
+        """Devolve à fila jobs cujo worker não respondeu dentro do prazo de visibilidade"""
+        self._conn.execute(
+            """
+            UPDATE jobs
+            SET status = ?, error = 'Prazo de visibilidade expirado', worker_id = NULL, updated_at = ?
+            WHERE status = ? AND lease_expires_at <= ? AND attempts >= max_attempts
+            """,
+            (FAILED, now, RUNNING, now)
+        )
+        self._conn.execute(
+            """
+            UPDATE jobs
+            SET status = ?, available_at = ?, worker_id = NULL, updated_at = ?
+            WHERE status = ? AND lease_expires_at <= ?
+            """,
+            (QUEUED, now, now, RUNNING, now)
+        )
+
+    def extend_lease(self, job_id, worker_id):
+        """Renova o prazo de visibilidade de um job em execução"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+                WHERE id = ? AND worker_id = ? AND status = ?
+                """,
+                (now + self.visibility_timeout, now, job_id, worker_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def save_checkpoint(self, job_id, worker_id, checkpoint):
+        """
+        Grava o progresso de um job em execução (entregue às próximas tentativas)
+
+        Args:
+            checkpoint: Dados serializáveis em JSON; substituem os anteriores
+
+        Returns:
+            bool: Se o worker ainda detinha o job
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET checkpoint = ?, updated_at = ?
+                WHERE id = ? AND worker_id = ? AND status = ?
+                """,
+                (json.dumps(checkpoint), now, job_id, worker_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        """Marca o job como concluído e armazena o resultado"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, result = ?, error = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE id = ? AND worker_id = ? AND status = ?
+                """,
+                (SUCCEEDED, json.dumps(result), now, job_id, worker_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        """
+        Registra uma falha; o job é reagendado com backoff ou marcado como falho
+
+        Returns:
+            str: Novo estado do job
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ? AND status = ?",
+                (job_id, worker_id, RUNNING)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row["attempts"] >= row["max_attempts"]:
+                status, available_at = FAILED, now
+            else:
+                # Backoff exponencial com jitter
+                delay = min(
+                    self.retry_max_delay,
+                    self.retry_base_delay * (2 ** (row["attempts"] - 1))
+                )
+                status, available_at = QUEUED, now + delay * random.uniform(0.8, 1.2)
+
+            self._conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, error = ?, available_at = ?, lease_expires_at = NULL,
+                    worker_id = NULL, updated_at = ?
+                WHERE id = ?
+                """,
+                (status, str(error), available_at, now, job_id)
+            )
+        return status
+
+    def get(self, job_id):
+        """Recupera um job pelo ID"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def metrics(self):
+        """
+        Métricas da fila
+
+        Returns:
+            dict: Profundidade por estado, jobs prontos e idade do job mais antigo
+        """
+        now = time.time()
+        with self._lock:
+            counts = {
+                row["status"]: row["total"]
+                for row in self._conn.execute(
+                    "SELECT status, COUNT(*) AS total FROM jobs GROUP BY status"
+                )
+            }
+            ready = self._conn.execute(
+                "SELECT COUNT(*), MIN(available_at) FROM jobs WHERE status = ? AND available_at <= ?",
+                (QUEUED, now)
+            ).fetchone()
+
+        return {
+            "depth": {state: counts.get(state, 0) for state in (QUEUED, RUNNING, SUCCEEDED, FAILED)},
+            "ready": ready[0],
+            "oldest_ready_age_seconds": round(now - ready[1], 3) if ready[1] else 0.0
+        }
+
+    def _row_to_dict(self, row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["checkpoint"] = json.loads(job["checkpoint"]) if job["checkpoint"] else {}
+        return job
+
+    # Versões assíncronas (SQLite é executado fora do event loop)
+
+    async def aenqueue(self, kind, payload, max_attempts=None):
+        return await asyncio.to_thread(self.enqueue, kind, payload, max_attempts)
+
+    async def aclaim(self, worker_id):
+        return await asyncio.to_thread(self.claim, worker_id)
+
+    async def aextend_lease(self, job_id, worker_id):
+        return await asyncio.to_thread(self.extend_lease, job_id, worker_id)
+
+    async def asave_checkpoint(self, job_id, worker_id, checkpoint):
+        return await asyncio.to_thread(self.save_checkpoint, job_id, worker_id, checkpoint)
+
+    async def acomplete(self, job_id, worker_id, result):
+        return await asyncio.to_thread(self.complete, job_id, worker_id, result)
+
+    async def afail(self, job_id, worker_id, error):
+        return await asyncio.to_thread(self.fail, job_id, worker_id, error)
+
+    async def aget(self, job_id):
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def ametrics(self):
+        return await asyncio.to_thread(self.metrics)
@@ -0,0 +1,154 @@
+import os
+import uuid
+import socket
+import asyncio
+import logging
+
+logger = logging.getLogger("vintra-backend.jobs")
+
+class LeaseLost(Exception):
+    """O prazo de visibilidade expirou e o job pode estar com outro worker"""
+
+class JobContext:
+    """
+    Tentativa em andamento de um job, entregue ao handler
+
+    `checkpoint` traz o progresso gravado pelas tentativas anteriores; etapas
+    caras ou com efeitos externos gravam o seu resultado com `save`, para que
+    uma nova tentativa não as repita.
+    """
+
+    def __init__(self, queue, job, worker_id):
+        self.queue = queue
+        self.job_id = job["id"]
+        self.attempt = job["attempts"]
+        self.worker_id = worker_id
+        self.checkpoint = dict(job.get("checkpoint") or {})
+        self.lease_lost = False
+
+    async def save(self, **values):
+        """
+        Acrescenta valores ao checkpoint do job
+
+        Raises:
+            LeaseLost: O worker não detém mais o job
+        """
+        self.checkpoint.update(values)
+        if not await self.queue.asave_checkpoint(self.job_id, self.worker_id, self.checkpoint):
+            self.lease_lost = True
+            raise LeaseLost(f"Job {self.job_id} não pertence mais a {self.worker_id}")
+
+class JobWorkerPool:
+    """
+    Pool de workers assíncronos que consome a fila de jobs
+
+    Cada worker reserva um job, executa o handler registrado para o seu tipo e
+    renova o prazo de visibilidade enquanto o handler estiver em execução. Se
+    a renovação mostrar que o job passou a outro worker (prazo expirado), o
+    handler é interrompido e o resultado da tentativa, descartado.
+    """
+
+    def __init__(self, queue, handlers, concurrency=None, poll_interval=None):
+        """
+        Args:
+            queue: JobQueue compartilhada
+            handlers: Dicionário {tipo do job: corrotina(payload, JobContext) -> resultado}
+            concurrency: Número de workers (padrão: JOB_WORKERS)
+            poll_interval: Intervalo entre consultas à fila vazia, em segundos
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency if concurrency is not None else int(os.getenv("JOB_WORKERS", "4"))
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+        self._prefix = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks = []
+        self._stopping = None
+
+    async def start(self):
+        """Inicia os workers no event loop atual"""
+        self._stopping = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._run(f"{self._prefix}-{i}"))
+            for i in range(self.concurrency)
+        ]
+        if self._tasks:
+            logger.info(f"{len(self._tasks)} worker(s) de jobs iniciados")
+
+    async def stop(self, timeout=30):
+        """Para de reservar novos jobs e aguarda os jobs em andamento"""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            # Jobs interrompidos voltam à fila ao fim do prazo de visibilidade
+            task.cancel()
+        self._tasks = []
+
+    async def _run(self, worker_id):
+        while not self._stopping.is_set():
+            try:
+                job = await self.queue.aclaim(worker_id)
+                if job is not None:
+                    await self._process(worker_id, job)
+                    continue
+            except Exception as e:
+                # Um erro inesperado não pode encerrar o worker
+                logger.exception(f"Erro no worker de jobs ({worker_id}): {e}")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, worker_id, job):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await self.queue.afail(job["id"], worker_id, f"Tipo de job desconhecido: {job['kind']}")
+            return
+
+        context = JobContext(self.queue, job, worker_id)
+        task = asyncio.ensure_future(handler(job["payload"], context))
+        heartbeat = asyncio.ensure_future(self._heartbeat(context, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if not context.lease_lost:
+                raise
+            logger.warning(f"Job {job['id']} interrompido: prazo de visibilidade perdido")
+        except Exception as e:
+            if context.lease_lost:
+                logger.warning(f"Job {job['id']} interrompido: prazo de visibilidade perdido ({e})")
+                return
+            status = await self.queue.afail(job["id"], worker_id, e)
+            logger.error(
+                f"Job {job['id']} falhou na tentativa {job['attempts']}/{job['max_attempts']}: {e} "
+                f"(novo estado: {status})"
+            )
+        else:
+            if await self.queue.acomplete(job["id"], worker_id, result):
+                logger.info(f"Job {job['id']} concluído na tentativa {job['attempts']}")
+            else:
+                logger.warning(f"Job {job['id']} concluído após perder o prazo de visibilidade; resultado descartado")
+        finally:
+            heartbeat.cancel()
+            task.cancel()
+
+    async def _heartbeat(self, context, task):
+        """
+        Renova o prazo de visibilidade na metade de cada período
+
+        Erros na renovação são registrados e a renovação segue no período
+        seguinte; se o job não pertence mais ao worker, o handler é cancelado.
+        """
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 2)
+            try:
+                renewed = await self.queue.aextend_lease(context.job_id, context.worker_id)
+            except Exception as e:
+                logger.warning(f"Erro ao renovar o prazo do job {context.job_id}: {e}")
+                continue
+            if not renewed:
+                context.lease_lost = True
+                task.cancel()
+                return
@@ -0,0 +1,198 @@
+import os
+import json
+import uuid
+import sqlite3
+import datetime
+import tempfile
+import threading
+
+# Campos de referência copiados para colunas indexadas
+INDEXED_FIELDS = ("paciente_id", "sessao_id")
+
+class LocalDocumentStore:
+    """
+    Armazenamento de documentos em SQLite para o modo de emulação do Firestore
+
+    Cada documento é uma linha (coleção, ID, JSON) e os campos paciente_id e
+    sessao_id ficam também em colunas indexadas. O arquivo usa WAL, então
+    vários workers podem ler e gravar o mesmo banco; cada thread tem sua
+    própria conexão. Datas e datetimes voltam com o tipo original, como no
+    Firestore. IDs gerados são UUIDs, sem colisão entre processos.
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: Arquivo SQLite (padrão: FIRESTORE_EMULATOR_DB)
+        """
+        self.path = path or os.getenv(
+            "FIRESTORE_EMULATOR_DB",
+            os.path.join(tempfile.gettempdir(), "vintra-firestore.db")
+        )
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                paciente_id TEXT,
+                sessao_id TEXT,
+                PRIMARY KEY (collection, id)
+            ) WITHOUT ROWID
+            """
+        )
+        for field in INDEXED_FIELDS:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documents_{field} ON documents (collection, {field}, id)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def set_many(self, collection, documents):
+        """
+        Grava (ou substitui) documentos numa única transação
+
+        Args:
+            collection: Nome da coleção
+            documents: Lista de (ID ou None, dados)
+
+        Returns:
+            list: IDs gravados, na mesma ordem
+        """
+        rows = []
+        for doc_id, data in documents:
+            rows.append((
+                collection,
+                doc_id or self.new_id(),
+                json.dumps(data, default=_encode, ensure_ascii=False),
+                *[_as_key(data.get(field)) for field in INDEXED_FIELDS]
+            ))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (collection, id, data, paciente_id, sessao_id) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [row[1] for row in rows]
+
+    def set(self, collection, doc_id, data):
+        return self.set_many(collection, [(doc_id, data)])[0]
+
+    def get_many(self, collection, doc_ids):
+        """
+        Recupera documentos pelo ID
+
+        Returns:
+            list: Dados de cada documento, na mesma ordem (None se não existir)
+        """
+        doc_ids = list(doc_ids)
+        found = {}
+        unique = list(dict.fromkeys(doc_ids))
+        # Limite de parâmetros por consulta do SQLite
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for doc_id, data in self._conn().execute(
+                f"SELECT id, data FROM documents WHERE collection = ? AND id IN ({placeholders})",
+                (collection, *chunk)
+            ):
+                found[doc_id] = _loads(data)
+        return [found.get(doc_id) for doc_id in doc_ids]
+
+    def get(self, collection, doc_id):
+        return self.get_many(collection, [doc_id])[0]
+
+    def list(self, collection, limit, cursor=None, fields=None, where=None):
+        """
+        Lista documentos em ordem de ID, a partir de um cursor
+
+        Args:
+            collection: Nome da coleção
+            limit: Número máximo de documentos
+            cursor: Listar somente IDs maiores que este
+            fields: Campos retornados de cada documento (None: todos)
+            where: Filtro de igualdade (campo indexado, valor)
+
+        Returns:
+            list: Tuplas (ID, dados)
+        """
+        sql = "SELECT id, data FROM documents WHERE collection = ?"
+        params = [collection]
+        if where is not None:
+            field, value = where
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"Filtro não suportado: {field}")
+            # Sem o INDEXED BY o planejador prefere a chave primária (pela
+            # ordenação por ID) e percorre a coleção inteira
+            sql = f"SELECT id, data FROM documents INDEXED BY idx_documents_{field} WHERE collection = ? AND {field} = ?"
+            params.append(_as_key(value))
+        if cursor is not None:
+            sql += " AND id > ?"
+            params.append(cursor)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit)
+
+        result = []
+        for doc_id, data in self._conn().execute(sql, params):
+            data = _loads(data)
+            if fields is not None:
+                data = {key: value for key, value in data.items() if key in fields}
+            result.append((doc_id, data))
+        return result
+
+    def count(self, collection):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM documents WHERE collection = ?", (collection,)
+        ).fetchone()[0]
+
+def _as_key(value):
+    return None if value is None else str(value)
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+def _decode(obj):
+    if len(obj) == 1:
+        if "__datetime__" in obj:
+            return datetime.datetime.fromisoformat(obj["__datetime__"])
+        if "__date__" in obj:
+            return datetime.date.fromisoformat(obj["__date__"])
+    return obj
+
+def _loads(data):
+    return json.loads(data, object_hook=_decode)
@@ -0,0 +1,189 @@
+import re
+import unicodedata
+
+# Dimensões escalares e componentes temporais de v9
+DIMENSION_KEYS = ["v1", "v2", "v3", "v4", "v5", "v6", "v7", "v8", "v10"]
+TEMPORAL_KEYS = {"passado": "v9_past", "presente": "v9_present", "futuro": "v9_future"}
+
+# Seções textuais da resposta (título normalizado -> chave do resultado)
+SECTION_KEYS = {
+    "analise dimensional": None,
+    "sintese narrativa": "sintese_narrativa",
+    "formulacao integrativa": "formulacao_integrativa",
+    "recomendacoes": "recomendacoes",
+}
+
+# Dígitos subscritos usados pelo prompt (v₁...v₁₀)
+_SUBSCRIPTS = str.maketrans("₀₁₂₃₄₅₆₇₈₉", "0123456789")
+
+# Padrões pré-compilados, sem IGNORECASE para permitir busca rápida por prefixo
+_NUMBER = r"([+-]?\d+(?:[.,]\d+)?)"
+_HEADER_RE = re.compile(r"^\s*#{1,6}\s*(.+?)\s*#*\s*$")
+_BOLD_HEADER_RE = re.compile(r"^\s*\*\*([^*\n]+?):?\*\*:?\s*$")
+_LABEL_RE = re.compile(r"[vV]([0-9₀-₉]{1,2})(?![0-9₀-₉])")
+_VALUE_RE = re.compile(r"[^\n\d]{0,80}?[:=]\s*\**\s*" + _NUMBER)
+_TEMPORAL_RE = re.compile(
+    r"([Pp]assado|PASSADO|[Pp]resente|PRESENTE|[Ff]uturo|FUTURO)[^\n\d]{0,30}?[:=]?\s*\**\s*" + _NUMBER
+)
+_LIST_ITEM_RE = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+(.*)$")
+_TITLE_NUMBER_RE = re.compile(r"^\d+[.)]\s*")
+
+def normalize_title(title):
+    """Normaliza um título de seção (sem acentos, minúsculo, sem marcação)"""
+    title = unicodedata.normalize("NFKD", title.strip("*_ :").lower())
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    return _TITLE_NUMBER_RE.sub("", title)
+
+def _section_for(title):
+    """Identifica a seção conhecida de um título (aceita sufixos, ex.: "Recomendações Clínicas")"""
+    for known, key in SECTION_KEYS.items():
+        if title == known or title.startswith(known + " "):
+            return True, key
+    return False, None
+
+def split_recommendations(text):
+    """
+    Divide o texto de recomendações em itens
+
+    Cada linha iniciada por marcador (numeração, '-', '*', '•') abre um item;
+    linhas seguintes sem marcador são anexadas ao item atual.
+    """
+    items = []
+    for line in text.splitlines():
+        match = _LIST_ITEM_RE.match(line)
+        if match:
+            items.append(match.group(1).strip())
+        elif line.strip() and items:
+            items[-1] = f"{items[-1]} {line.strip()}"
+    items = [item for item in items if item]
+
+    # Sem marcadores de lista, usar o texto completo
+    if not items and text.strip():
+        return [text.strip()]
+    return items
+
+def parse_response(text):
+    """
+    Extrai dimensões, seções e recomendações numa única varredura linear
+
+    Args:
+        text: Resposta completa do modelo
+
+    Returns:
+        dict: Valores dimensionais encontrados (chaves ausentes quando não
+            identificadas), "sintese_narrativa", "formulacao_integrativa" e
+            "recomendacoes"
+    """
+    parser = IncrementalResponseParser()
+    result = {"sintese_narrativa": "", "formulacao_integrativa": "", "recomendacoes": []}
+    for name, data in parser.feed(text) + parser.finish():
+        if name == "secao":
+            result[data["nome"]] = data["conteudo"]
+    result.update(parser.values)
+    return result
+
+class IncrementalResponseParser:
+    """
+    Parser incremental da resposta do modelo
+
+    Recebe pedaços de texto conforme são gerados e devolve eventos assim que
+    uma linha de dimensão é concluída ou uma seção textual termina.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._values = {}
+        self._in_v9 = False
+        self._section = None
+        self._section_lines = []
+
+    def feed(self, chunk):
+        """
+        Processa um novo pedaço de texto
+
+        Args:
+            chunk: Texto recebido do modelo
+
+        Returns:
+            list: Eventos (nome, dados) produzidos pelas linhas completas
+        """
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        events = []
+        for line in lines:
+            events.extend(self._process_line(line))
+        return events
+
+    def finish(self):
+        """Processa o restante do texto e fecha a última seção"""
+        events = []
+        if self._buffer:
+            events.extend(self._process_line(self._buffer))
+            self._buffer = ""
+        events.extend(self._close_section())
+        return events
+
+    @property
+    def values(self):
+        """Valores dimensionais encontrados até o momento"""
+        return dict(self._values)
+
+    def _process_line(self, line):
+        header = _HEADER_RE.match(line) or _BOLD_HEADER_RE.match(line)
+        if header:
+            known, key = _section_for(normalize_title(header.group(1)))
+            if known:
+                events = self._close_section()
+                self._section = key
+                self._in_v9 = False
+                return events
+
+        if self._section is not None:
+            self._section_lines.append(line)
+            return []
+
+        return self._parse_dimension_line(line)
+
+    def _parse_dimension_line(self, line):
+        found = []
+        
+        # Primeiro rótulo de dimensão da linha (v1, v₁, V10...)
+        label = None
+        for match in _LABEL_RE.finditer(line):
+            start = match.start()
+            if start == 0 or not line[start - 1].isalnum():
+                label = match
+                break
+
+        if label is not None:
+            index = int(label.group(1).translate(_SUBSCRIPTS))
+            self._in_v9 = index == 9
+            if not self._in_v9:
+                value = _VALUE_RE.match(line, label.end())
+                key = f"v{index}"
+                if value and key in DIMENSION_KEYS:
+                    found.append((key, value.group(1)))
+
+        if self._in_v9:
+            start = label.end() if label is not None else 0
+            for match in _TEMPORAL_RE.finditer(line, start):
+                found.append((TEMPORAL_KEYS[match.group(1).lower()], match.group(2)))
+
+        events = []
+        for key, raw in found:
+            if key in self._values:
+                continue
+            self._values[key] = float(raw.replace(",", "."))
+            events.append(("dimensao", {"chave": key, "valor": self._values[key]}))
+        return events
+
+    def _close_section(self):
+        if self._section is None:
+            return []
+        content = "\n".join(self._section_lines).strip()
+        key = self._section
+        self._section = None
+        self._section_lines = []
+        if key == "recomendacoes":
+            return [("secao", {"nome": key, "conteudo": split_recommendations(content)})]
+        return [("secao", {"nome": key, "conteudo": content})]
@@ -0,0 +1,149 @@
+import json
+import datetime
+
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+from app.models.dimensional_analysis import DimensionalAnalysis
+from app.models.patient import Patient
+from app.models.session import Session
+
+# Campos omitidos das respostas, salvo quando pedidos em ?fields=
+DEFAULT_EXCLUDED = ("raw_response",)
+
+# Campos sempre presentes numa seleção
+ALWAYS_INCLUDED = ("id",)
+
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def dumps(data):
+    """JSON (bytes) de qualquer valor da API; tipos desconhecidos passam por jsonable_encoder"""
+    return orjson.dumps(data, default=jsonable_encoder, option=JSON_OPTIONS)
+
+class ModelSerializer:
+    """
+    Serialização de documentos de um modelo pydantic, compilada uma única vez
+
+    A partir dos campos do modelo são montados o conversor de armazenamento de
+    cada campo (equivalente ao percurso genérico de `prepare_for_storage`, mas
+    sem testar todos os tipos em todos os valores) e a projeção padrão das
+    respostas, sem os campos de DEFAULT_EXCLUDED. O JSON é gerado por orjson.
+
+    Com `extra`, chaves fora do modelo (ID, status de persistência, cache) são
+    mantidas nas respostas; sem ele, a resposta tem exatamente os campos do
+    modelo, como faria o response_model do FastAPI.
+    """
+
+    def __init__(self, model, extra=False):
+        self.model = model
+        self.extra = extra
+        self.fields = tuple(model.__fields__)
+        self.excluded = frozenset(name for name in DEFAULT_EXCLUDED if name in model.__fields__)
+        self.defaults = {name: field.default for name, field in model.__fields__.items() if not field.required}
+        self._storage = {name: _storage_converter(field.outer_type_) for name, field in model.__fields__.items()}
+
+    def to_storage(self, data):
+        """Prepara um documento para o Firestore (datas em ISO, objetos desconhecidos como texto JSON)"""
+        converters = self._storage
+        return {key: converters.get(key, prepare_value)(value) for key, value in data.items()}
+
+    def parse_fields(self, value):
+        """
+        Interpreta o parâmetro ?fields= (lista separada por vírgulas)
+
+        Returns:
+            frozenset: Campos pedidos (None: projeção padrão; "*": todos os campos)
+
+        Raises:
+            ValueError: Campos que o modelo não tem
+        """
+        if value is None or not value.strip():
+            return None
+        names = frozenset(name.strip() for name in value.split(",") if name.strip())
+        if "*" in names:
+            return frozenset(("*",))
+        if not self.extra:
+            unknown = sorted(names - set(self.fields))
+            if unknown:
+                raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}")
+        return names
+
+    def select(self, data, fields=None):
+        """
+        Projeta um documento nos campos pedidos
+
+        Args:
+            data: Documento (dict)
+            fields: Resultado de `parse_fields`
+        """
+        if self.extra:
+            if fields is None:
+                return {key: value for key, value in data.items() if key not in self.excluded}
+            if "*" in fields:
+                return data
+            return {key: value for key, value in data.items() if key in fields or key in ALWAYS_INCLUDED}
+
+        if fields is None:
+            names = [name for name in self.fields if name not in self.excluded]
+        elif "*" in fields:
+            names = self.fields
+        else:
+            names = [name for name in self.fields if name in fields or name in ALWAYS_INCLUDED]
+        defaults = self.defaults
+        return {name: data[name] if name in data else defaults.get(name) for name in names}
+
+    def dumps(self, data, fields=None):
+        return dumps(self.select(data, fields))
+
+    def dumps_many(self, documents, fields=None):
+        return dumps([self.select(data, fields) for data in documents])
+
+    def response(self, data, fields=None, headers=None):
+        """Resposta JSON já serializada (dispensa a validação do response_model)"""
+        return Response(self.dumps(data, fields), media_type="application/json", headers=headers)
+
+def prepare_value(value):
+    """Conversão genérica de um valor para o Firestore"""
+    # Converter datetime para string ISO
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    # Converter objetos complexos para JSON
+    if not isinstance(value, (str, int, float, bool, list, dict, type(None))):
+        return json.dumps(str(value))
+    # Processo recursivo para dicionários aninhados
+    if isinstance(value, dict):
+        return prepare_for_storage(value)
+    # Processo recursivo para listas
+    if isinstance(value, list):
+        return [prepare_for_storage(item) if isinstance(item, dict) else item for item in value]
+    return value
+
+def prepare_for_storage(data):
+    """Prepara um dicionário qualquer para o Firestore (percurso genérico)"""
+    return {key: prepare_value(value) for key, value in data.items()}
+
+def _storage_converter(annotation):
+    """Conversor de um campo pelo tipo declarado; valores de outro tipo seguem o caminho genérico"""
+    scalar = (float, int, str, bool)
+    origin = getattr(annotation, "__origin__", None)
+    if isinstance(annotation, type) and issubclass(annotation, scalar):
+        def convert(value):
+            return value if value is None or type(value) in scalar else prepare_value(value)
+    elif annotation is datetime.datetime:
+        def convert(value):
+            return value.isoformat() if type(value) is datetime.datetime else prepare_value(value)
+    elif origin is list and annotation.__args__[0] in scalar:
+        def convert(value):
+            return value if type(value) is list else prepare_value(value)
+    elif origin is dict and annotation.__args__[1] in scalar:
+        def convert(value):
+            return dict(value) if type(value) is dict else prepare_value(value)
+    else:
+        convert = prepare_value
+    return convert
+
+# Serializadores compilados na importação, um por modelo
+analysis_serializer = ModelSerializer(DimensionalAnalysis, extra=True)
+patient_serializer = ModelSerializer(Patient)
+session_serializer = ModelSerializer(Session)
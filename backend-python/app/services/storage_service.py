@@ -1,11 +1,33 @@
 import os
+import re
+import json
+import uuid
+import asyncio
+import mimetypes
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
 import tempfile
+try:
+    import fcntl
+except ImportError:
+    # Sem flock (Windows): cada upload deve receber partes de um único processo
+    fcntl = None
+
+# Tamanho dos blocos lidos e gravados (o GCS exige múltiplos de 256 KiB nos uploads retomáveis)
+UPLOAD_GRANULARITY = 256 * 1024
+STORAGE_CHUNK_SIZE = max(1, -(-int(os.getenv("STORAGE_CHUNK_SIZE", str(1024 * 1024))) // UPLOAD_GRANULARITY)) * UPLOAD_GRANULARITY
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Tempo máximo de cada requisição à sessão retomável (segundos)
+STORAGE_UPLOAD_TIMEOUT = float(os.getenv("STORAGE_UPLOAD_TIMEOUT", "120"))
 
 class StorageService:
     def __init__(self):
         # Verificar se estamos em modo de emulação (desenvolvimento)
         self.emulation_mode = os.getenv("LOCAL_DEVELOPMENT") == "true"
+        self.chunk_size = STORAGE_CHUNK_SIZE
         
         if not self.emulation_mode:
             # Modo real - usar Google Cloud Storage
@@ -13,10 +35,20 @@ class StorageService:
             self.bucket_name = os.getenv("STORAGE_BUCKET_NAME", "vintra-storage")
             self.client = storage.Client(project=self.project_id)
             self.bucket = self.client.bucket(self.bucket_name)
+            # Transporte público para as partes de `append_upload`, com as
+            # mesmas credenciais padrão usadas pelo cliente
+            credentials, _ = google.auth.default(scopes=storage.Client.SCOPE)
+            self.upload_session = AuthorizedSession(credentials)
         else:
             # Modo emulação - criar diretório temporário
             self.temp_dir = os.path.join(tempfile.gettempdir(), "vintra-storage")
             os.makedirs(self.temp_dir, exist_ok=True)
+        
+        # Estado dos uploads retomáveis (compartilhado pelos workers do mesmo host)
+        self.upload_dir = os.getenv("STORAGE_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "vintra-uploads"))
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # Partes em andamento por upload_id: {upload_id: [asyncio.Lock, usuários]}
+        self._upload_locks = {}
     
     async def upload_file(self, file_content, destination_blob_name):
         """
@@ -29,51 +61,380 @@ class StorageService:
         Returns:
             str: The public URL of the uploaded file
         """
-        if self.emulation_mode:
-            # Modo emulação - salvar em diretório temporário
-            file_path = os.path.join(self.temp_dir, destination_blob_name)
-            
-            # Criar diretório se não existir
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Salvar arquivo
-            with open(file_path, "wb") as f:
-                if isinstance(file_content, str):
-                    f.write(file_content.encode("utf-8"))
-                else:
-                    f.write(file_content)
-            
-            return f"file://{file_path}"
-        else:
-            # Modo real - usar Google Cloud Storage
-            blob = self.bucket.blob(destination_blob_name)
-            
-            if isinstance(file_content, str):
-                blob.upload_from_string(file_content)
-            else:
-                blob.upload_from_string(file_content, content_type="application/octet-stream")
-            
-            return blob.public_url
+        if isinstance(file_content, str):
+            file_content = file_content.encode("utf-8")
+        
+        async def chunks():
+            for start in range(0, len(file_content), self.chunk_size):
+                yield file_content[start:start + self.chunk_size]
+        
+        return await self.upload_stream(chunks(), destination_blob_name)
     
     async def download_file(self, source_blob_name):
         """
         Downloads a file from the storage bucket
         
+        For large blobs prefer `download_stream`, which keeps one chunk in memory.
+        
         Args:
             source_blob_name: The name of the file in the bucket
             
         Returns:
             bytes: The file content
         """
+        return b"".join([chunk async for chunk in self.download_stream(source_blob_name)])
+    
+    async def upload_stream(self, chunks, destination_blob_name, content_type=None):
+        """
+        Uploads a stream of chunks without holding the whole file in memory
+        
+        In GCS the chunks go through a resumable upload session, one
+        STORAGE_CHUNK_SIZE request at a time. Locally they are written to a
+        temporary file that replaces the destination only when complete.
+        
+        Args:
+            chunks: Async iterator of bytes
+            destination_blob_name: The name to give the file in the bucket
+            content_type: MIME type (default: guessed from the name)
+        
+        Returns:
+            str: The public URL of the uploaded file
+        """
+        content_type = content_type or _guess_type(destination_blob_name)
+        
+        if self.emulation_mode:
+            # Modo emulação - gravar em arquivo parcial e renomear ao final
+            file_path = self._local_path(destination_blob_name)
+            partial_path = f"{file_path}.{uuid.uuid4().hex}.part"
+            await asyncio.to_thread(os.makedirs, os.path.dirname(file_path), exist_ok=True)
+            f = await asyncio.to_thread(open, partial_path, "wb")
+            try:
+                async for chunk in chunks:
+                    await asyncio.to_thread(f.write, chunk)
+                await asyncio.to_thread(f.close)
+                await asyncio.to_thread(os.replace, partial_path, file_path)
+            except BaseException:
+                f.close()
+                await asyncio.to_thread(_remove, partial_path)
+                raise
+            return f"file://{file_path}"
+        
+        # Modo real - BlobWriter envia um bloco por requisição da sessão retomável
+        blob = self.bucket.blob(destination_blob_name)
+        writer = await asyncio.to_thread(
+            blob.open, "wb", chunk_size=self.chunk_size, content_type=content_type, ignore_flush=True
+        )
+        async for chunk in chunks:
+            await asyncio.to_thread(writer.write, chunk)
+        await asyncio.to_thread(writer.close)
+        return blob.public_url
+    
+    async def stat(self, blob_name):
+        """
+        Size and content type of a stored file
+        
+        Returns:
+            dict: {"size": bytes, "content_type": MIME type}
+        
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        if self.emulation_mode:
+            file_path = self._local_path(blob_name)
+            try:
+                size = (await asyncio.to_thread(os.stat, file_path)).st_size
+            except (FileNotFoundError, NotADirectoryError):
+                raise FileNotFoundError(f"File {blob_name} not found in local storage")
+            return {"size": size, "content_type": _guess_type(blob_name)}
+        
+        blob = await asyncio.to_thread(self.bucket.get_blob, blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"File {blob_name} not found in bucket {self.bucket_name}")
+        return {"size": blob.size, "content_type": blob.content_type or _guess_type(blob_name)}
+    
+    async def download_stream(self, source_blob_name, start=0, end=None):
+        """
+        Reads a file (or a byte range of it) in STORAGE_CHUNK_SIZE chunks
+        
+        Args:
+            source_blob_name: The name of the file in the bucket
+            start: First byte
+            end: Last byte, inclusive (default: end of the file)
+        
+        Yields:
+            bytes: Consecutive chunks of the range
+        
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
         if self.emulation_mode:
             # Modo emulação - ler do diretório temporário
-            file_path = os.path.join(self.temp_dir, source_blob_name)
-            if not os.path.exists(file_path):
+            file_path = self._local_path(source_blob_name)
+            if not await asyncio.to_thread(os.path.isfile, file_path):
                 raise FileNotFoundError(f"File {source_blob_name} not found in local storage")
-                
-            with open(file_path, "rb") as f:
-                return f.read()
+            
+            f = await asyncio.to_thread(open, file_path, "rb")
+            try:
+                await asyncio.to_thread(f.seek, start)
+                remaining = None if end is None else end - start + 1
+                while remaining is None or remaining > 0:
+                    size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                    chunk = await asyncio.to_thread(f.read, size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+            finally:
+                f.close()
+            return
+        
+        # Modo real - uma leitura por faixa de bytes do blob
+        if end is None:
+            end = (await self.stat(source_blob_name))["size"] - 1
+        blob = self.bucket.blob(source_blob_name)
+        position = start
+        while position <= end:
+            last = min(position + self.chunk_size, end + 1) - 1
+            yield await asyncio.to_thread(blob.download_as_bytes, start=position, end=last, raw_download=True)
+            position = last + 1
+    
+    async def start_upload(self, destination_blob_name, content_type=None, size=None):
+        """
+        Starts a resumable upload, sent in parts by `append_upload`
+        
+        Args:
+            destination_blob_name: The name to give the file in the bucket
+            content_type: MIME type (default: guessed from the name)
+            size: Total size in bytes, if known
+        
+        Returns:
+            dict: Upload status (see `upload_status`)
+        """
+        content_type = content_type or _guess_type(destination_blob_name)
+        state = {
+            "upload_id": uuid.uuid4().hex,
+            "destination": destination_blob_name,
+            "content_type": content_type,
+            "size": size,
+            "committed": 0,
+            "complete": False,
+            "url": None
+        }
+        
+        if self.emulation_mode:
+            self._local_path(destination_blob_name)
         else:
-            # Modo real - usar Google Cloud Storage
-            blob = self.bucket.blob(source_blob_name)
-            return blob.download_as_bytes()
\ No newline at end of file
+            blob = self.bucket.blob(destination_blob_name)
+            state["session_url"] = await asyncio.to_thread(
+                blob.create_resumable_upload_session, content_type=content_type, size=size
+            )
+        
+        await asyncio.to_thread(self._save_upload, state)
+        return _public_status(state, 0)
+    
+    async def upload_status(self, upload_id):
+        """
+        Status of a resumable upload
+        
+        Returns:
+            dict: upload_id, destination, size, offset (bytes received so
+            far, where the next part must start), complete and url
+        
+        Raises:
+            FileNotFoundError: If the upload does not exist
+        """
+        state = await asyncio.to_thread(self._load_upload, upload_id)
+        return _public_status(state, await asyncio.to_thread(self._upload_offset, state))
+    
+    async def append_upload(self, upload_id, offset, chunks, final=False):
+        """
+        Appends a part to a resumable upload
+        
+        The part must start exactly at the current offset; a part that fails
+        midway can be resent from the offset reported by `upload_status`.
+        
+        Args:
+            upload_id: ID returned by `start_upload`
+            offset: Position of the first byte of the part
+            chunks: Async iterator of bytes
+            final: Whether this is the last part (completes the file)
+        
+        Returns:
+            dict: Updated upload status
+        
+        Raises:
+            FileNotFoundError: If the upload does not exist
+            ValueError: If the offset is not the current one, the upload is
+                complete, or another process is receiving a part of it
+        """
+        # Partes concorrentes do mesmo upload esperam a anterior terminar e
+        # então validam o offset contra o estado já atualizado por ela
+        entry = self._upload_locks.setdefault(upload_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                lock_file = await asyncio.to_thread(self._lock_upload, upload_id)
+                try:
+                    return await self._append_upload(upload_id, offset, chunks, final)
+                finally:
+                    await asyncio.to_thread(lock_file.close)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._upload_locks[upload_id]
+    
+    async def _append_upload(self, upload_id, offset, chunks, final):
+        state = await asyncio.to_thread(self._load_upload, upload_id)
+        current = await asyncio.to_thread(self._upload_offset, state)
+        if state["complete"]:
+            raise ValueError("Upload already complete")
+        if offset != current:
+            raise ValueError(f"Offset {offset} does not match the upload offset {current}")
+        
+        part_path = self._upload_path(upload_id, "part")
+        f = await asyncio.to_thread(open, part_path, "ab")
+        try:
+            if self.emulation_mode:
+                # Modo emulação - o arquivo parcial guarda todo o conteúdo recebido
+                async for chunk in chunks:
+                    await asyncio.to_thread(f.write, chunk)
+            else:
+                # Modo real - blocos completos vão para a sessão; o resto fica no
+                # arquivo parcial até a próxima parte (ou até a parte final).
+                # Se a parte falhar, o offset volta ao que o GCS confirmou.
+                buffer = bytearray(await asyncio.to_thread(_read_file, part_path))
+                await asyncio.to_thread(f.truncate, 0)
+                async for chunk in chunks:
+                    buffer += chunk
+                    while len(buffer) >= self.chunk_size:
+                        sent = await asyncio.to_thread(self._send_part, state, bytes(buffer[:self.chunk_size]), None)
+                        del buffer[:sent]
+                        state["committed"] += sent
+                        await asyncio.to_thread(self._save_upload, state)
+                if final:
+                    total = state["committed"] + len(buffer)
+                    _check_size(state, total)
+                    await asyncio.to_thread(self._send_part, state, bytes(buffer), total)
+                    state["committed"] = total
+                else:
+                    await asyncio.to_thread(f.write, bytes(buffer))
+        finally:
+            await asyncio.to_thread(f.close)
+        
+        if final:
+            if self.emulation_mode:
+                total = await asyncio.to_thread(os.path.getsize, part_path)
+                _check_size(state, total)
+                state["committed"] = total
+                file_path = self._local_path(state["destination"])
+                await asyncio.to_thread(os.makedirs, os.path.dirname(file_path), exist_ok=True)
+                await asyncio.to_thread(os.replace, part_path, file_path)
+                state["url"] = f"file://{file_path}"
+            else:
+                await asyncio.to_thread(_remove, part_path)
+                state["url"] = self.bucket.blob(state["destination"]).public_url
+            state["complete"] = True
+            # Partes posteriores falham pelo estado concluído, sem precisar da trava
+            await asyncio.to_thread(_remove, self._upload_path(upload_id, "lock"))
+        await asyncio.to_thread(self._save_upload, state)
+        return _public_status(state, await asyncio.to_thread(self._upload_offset, state))
+    
+    def _send_part(self, state, data, total):
+        """
+        Envia uma faixa à sessão retomável do GCS (total=None: não é a última)
+        
+        Returns:
+            int: Bytes da faixa confirmados pelo GCS
+        """
+        start = state["committed"]
+        if data:
+            content_range = f"bytes {start}-{start + len(data) - 1}/{'*' if total is None else total}"
+        else:
+            content_range = f"bytes */{total}"
+        response = self.upload_session.put(
+            state["session_url"], data=data, headers={"Content-Range": content_range},
+            timeout=STORAGE_UPLOAD_TIMEOUT
+        )
+        # 200/201: upload concluído; 308: incompleto, com o total recebido em Range
+        if response.status_code in (200, 201):
+            return len(data)
+        if response.status_code != 308:
+            raise IOError(f"Resumable upload failed with status {response.status_code}: {response.text}")
+        received = response.headers.get("Range")
+        persisted = int(received.rsplit("-", 1)[1]) + 1 if received else 0
+        return max(0, persisted - start)
+    
+    def _lock_upload(self, upload_id):
+        """Trava o upload entre processos; falha se outro processo já recebe uma parte"""
+        if not os.path.exists(self._upload_path(upload_id, "json")):
+            raise FileNotFoundError(f"Upload {upload_id} not found")
+        lock_file = open(self._upload_path(upload_id, "lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise ValueError(f"Upload {upload_id} is already receiving a part")
+        return lock_file
+    
+    def _upload_offset(self, state):
+        if state["complete"]:
+            return state["committed"]
+        part_path = self._upload_path(state["upload_id"], "part")
+        pending = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        return (0 if self.emulation_mode else state["committed"]) + pending
+    
+    def _upload_path(self, upload_id, extension):
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise FileNotFoundError(f"Upload {upload_id} not found")
+        return os.path.join(self.upload_dir, f"{upload_id}.{extension}")
+    
+    def _load_upload(self, upload_id):
+        try:
+            with open(self._upload_path(upload_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Upload {upload_id} not found")
+    
+    def _save_upload(self, state):
+        path = self._upload_path(state["upload_id"], "json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+    
+    def _local_path(self, blob_name):
+        """Caminho local do blob, sem permitir sair do diretório de armazenamento"""
+        file_path = os.path.normpath(os.path.join(self.temp_dir, blob_name))
+        if not file_path.startswith(os.path.join(self.temp_dir, "")):
+            raise ValueError(f"Invalid blob name: {blob_name}")
+        return file_path
+
+def _public_status(state, offset):
+    return {
+        "upload_id": state["upload_id"],
+        "destination": state["destination"],
+        "size": state["size"],
+        "offset": offset,
+        "complete": state["complete"],
+        "url": state["url"]
+    }
+
+def _check_size(state, total):
+    if state["size"] is not None and total != state["size"]:
+        raise ValueError(f"Upload has {total} bytes, expected {state['size']}")
+
+def _guess_type(name):
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+def _read_file(path):
+    if not os.path.exists(path):
+        return b""
+    with open(path, "rb") as f:
+        return f.read()
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
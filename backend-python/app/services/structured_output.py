@@ -0,0 +1,117 @@
+import re
+import json
+import threading
+from collections import Counter
+
+from app.models.dimensional_analysis import DimensionalAnalysis
+
+# Campos que o modelo deve produzir, na ordem do schema
+DIMENSION_FIELDS = [
+    "v1", "v2", "v3", "v4", "v5", "v6", "v7", "v8",
+    "v9_past", "v9_present", "v9_future", "v10"
+]
+TEXT_FIELDS = ["sintese_narrativa", "formulacao_integrativa", "recomendacoes"]
+OUTPUT_FIELDS = DIMENSION_FIELDS + TEXT_FIELDS
+
+# Valores usados quando nem a nova pergunta recupera o campo
+DEFAULTS = {
+    **{name: 5.0 for name in DIMENSION_FIELDS},
+    "sintese_narrativa": "",
+    "formulacao_integrativa": "",
+    "recomendacoes": [],
+}
+
+_TEXT_DESCRIPTIONS = {
+    "sintese_narrativa": "texto com a síntese narrativa (ipsissima) da fala do paciente",
+    "formulacao_integrativa": "texto com a formulação integrativa do caso",
+    "recomendacoes": "lista de 3 a 5 recomendações (strings)",
+}
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+def describe_field(name):
+    """Descrição de um campo a partir do modelo DimensionalAnalysis (escala e significado)"""
+    if name in _TEXT_DESCRIPTIONS:
+        return _TEXT_DESCRIPTIONS[name]
+    info = DimensionalAnalysis.__fields__[name].field_info
+    return f"número entre {info.ge} e {info.le} ({info.description})"
+
+def schema_description(fields=OUTPUT_FIELDS):
+    """Linhas do schema JSON esperado, geradas a partir do modelo"""
+    return "\n".join(f'- "{name}": {describe_field(name)}' for name in fields)
+
+def extract_json_object(text):
+    """
+    Extrai o primeiro objeto JSON da resposta (com ou sem bloco ```json)
+
+    Returns:
+        dict: Objeto decodificado, ou None se não houver JSON válido
+    """
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def validate_fields(data, fields=OUTPUT_FIELDS):
+    """
+    Valida campos diretamente contra o schema de DimensionalAnalysis
+
+    Args:
+        data: Valores candidatos
+        fields: Campos a validar
+
+    Returns:
+        tuple: (valores válidos, lista de campos ausentes ou inválidos)
+    """
+    valid, invalid = {}, []
+    for name in fields:
+        raw = data.get(name)
+        if raw is None or raw == "" or raw == []:
+            invalid.append(name)
+            continue
+        if name == "recomendacoes" and isinstance(raw, str):
+            raw = [raw]
+        value, errors = DimensionalAnalysis.__fields__[name].validate(raw, {}, loc=name)
+        if errors:
+            invalid.append(name)
+        else:
+            valid[name] = value
+    return valid, invalid
+
+class ExtractionMetrics:
+    """Contadores de qual caminho de extração cada análise percorreu"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._missing = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, path, missing=()):
+        """
+        Registra o desfecho de uma análise
+
+        Args:
+            path: "completa", "recuperada", "padrao" ou "json_invalido"
+            missing: Campos ausentes/inválidos na primeira resposta
+        """
+        with self._lock:
+            self._counts[path] += 1
+            self._missing.update(missing)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "caminhos": dict(self._counts),
+                "campos_ausentes": dict(self._missing)
+            }
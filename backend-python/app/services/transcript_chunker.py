@@ -0,0 +1,102 @@
+import re
+from collections import namedtuple
+
+# Trecho da transcrição: posição no texto original e peso na combinação
+# (número de caracteres novos, sem contar a sobreposição com o trecho anterior)
+Chunk = namedtuple("Chunk", ["text", "start", "end", "weight"])
+
+# Linha iniciada por rótulo de falante ("Paciente:", "T:", "[00:12] Terapeuta:")
+_SPEAKER_RE = re.compile(
+    r"^[^\S\n]*(?:\[[^\]\n]{1,20}\][^\S\n]*)?[A-Za-zÀ-ÿ][\wÀ-ÿ .'-]{0,30}:",
+    re.MULTILINE
+)
+_BLANK_LINE_RE = re.compile(r"\n[^\S\n]*\n")
+_SENTENCE_END_RE = re.compile(r"[.!?…]+[\"')\]]*\s+")
+
+def split_turns(text):
+    """
+    Divide a transcrição em turnos de fala
+
+    Um turno começa numa linha com rótulo de falante ou após uma linha em
+    branco.
+
+    Returns:
+        list: Intervalos (início, fim) de cada turno não vazio
+    """
+    boundaries = {0, len(text)}
+    boundaries.update(match.start() for match in _SPEAKER_RE.finditer(text))
+    boundaries.update(match.end() for match in _BLANK_LINE_RE.finditer(text))
+    points = sorted(boundaries)
+    return [
+        (start, end) for start, end in zip(points, points[1:])
+        if text[start:end].strip()
+    ]
+
+def _split_long_span(text, start, end, max_chars):
+    """Divide um turno maior que `max_chars` em fins de frase (ou no limite)"""
+    spans = []
+    while end - start > max_chars:
+        cut = None
+        for match in _SENTENCE_END_RE.finditer(text, start, start + max_chars):
+            cut = match.end()
+        if cut is None or cut <= start:
+            # Sem fim de frase: cortar no último espaço antes do limite
+            space = text.rfind(" ", start + 1, start + max_chars)
+            cut = space if space > start else start + max_chars
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, end))
+    return spans
+
+def chunk_transcript(text, max_chars, overlap_chars=0):
+    """
+    Divide uma transcrição longa em trechos sobrepostos sem quebrar turnos
+
+    Args:
+        text: Transcrição completa
+        max_chars: Tamanho máximo de cada trecho, incluindo a sobreposição
+        overlap_chars: Caracteres do trecho anterior repetidos no início do
+            seguinte (turnos inteiros sempre que possível)
+
+    Returns:
+        list: Trechos (Chunk) em ordem
+    """
+    overlap_chars = max(0, min(overlap_chars, max_chars // 2))
+    budget = max_chars - overlap_chars
+
+    spans = []
+    for start, end in split_turns(text):
+        spans.extend(_split_long_span(text, start, end, budget))
+    if not spans:
+        return []
+
+    # Agrupar turnos consecutivos até o orçamento do trecho
+    groups = [[spans[0]]]
+    for span in spans[1:]:
+        if span[1] - groups[-1][0][0] > budget:
+            groups.append([span])
+        else:
+            groups[-1].append(span)
+
+    chunks = []
+    for index, group in enumerate(groups):
+        start, end = group[0][0], group[-1][1]
+        context_start = start
+        if index > 0 and overlap_chars:
+            context_start = _overlap_start(text, groups[index - 1], overlap_chars)
+        chunks.append(Chunk(text[context_start:end], context_start, end, end - start))
+    return chunks
+
+def _overlap_start(text, previous_group, overlap_chars):
+    """Início da sobreposição: últimos turnos do grupo anterior que cabem no limite"""
+    group_end = previous_group[-1][1]
+    start = group_end
+    for span_start, _ in reversed(previous_group):
+        if group_end - span_start > overlap_chars:
+            break
+        start = span_start
+    if start == group_end:
+        # Último turno maior que a sobreposição: usar o final dele a partir de um espaço
+        space = text.find(" ", group_end - overlap_chars, group_end)
+        start = space + 1 if space != -1 else group_end - overlap_chars
+    return start
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class EmbeddingBatcher:
+    """
+    Agrupa pedidos de embedding de análises concorrentes em uma única chamada
+
+    Os textos recebidos esperam até `max_wait_ms` (ou até completar
+    `max_batch_size`) e são enviados juntos ao modelo; cada chamador recebe
+    o seu vetor de volta.
+    """
+
+    def __init__(self, embed_fn, max_batch_size=5, max_wait_ms=10, max_concurrency=4):
+        """
+        Args:
+            embed_fn: Função síncrona lista de textos -> lista de vetores
+            max_batch_size: Textos por chamada ao modelo
+            max_wait_ms: Espera máxima para completar um lote
+            max_concurrency: Chamadas simultâneas ao modelo
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+
+        # Executor dedicado ao cliente síncrono, fora do event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="embedding"
+        )
+        # Criados sob demanda, dentro do event loop que os utiliza
+        self._semaphore = None
+        self._timer = None
+        self._pending = []
+        self._tasks = set()
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+
+    def close(self):
+        """Libera as threads do executor"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def embed(self, text):
+        """
+        Obtém o embedding de um texto, agrupado com pedidos concorrentes
+
+        Returns:
+            list: Vetor do texto
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def embed_many(self, texts):
+        """
+        Obtém embeddings em massa (ex.: reprocessamento), sem esperar o temporizador
+
+        Returns:
+            list: Vetores, na mesma ordem de `texts`
+        """
+        texts = list(texts)
+        batches = await asyncio.gather(*[
+            self._run(texts[start:start + self.max_batch_size])
+            for start in range(0, len(texts), self.max_batch_size)
+        ])
+        return [vector for batch in batches for vector in batch]
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        """Envia um lote e entrega cada vetor (ou o erro) ao seu chamador"""
+        try:
+            vectors = await self._run([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def _run(self, texts):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self._executor, self.embed_fn, texts)
+
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        return vectors
+
+    def stats(self):
+        """Chamadas ao modelo e tamanho médio dos lotes"""
+        with self._lock:
+            return {
+                "chamadas": self.calls,
+                "textos": self.texts,
+                "media_por_chamada": round(self.texts / self.calls, 2) if self.calls else 0.0,
+                "max_lote": self.max_batch_size,
+                "espera_ms": self.max_wait * 1000
+            }
@@ -0,0 +1,482 @@
+import os
+import json
+import threading
+import contextlib
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Sem flock (Windows): o diretório do índice deve ter um único processo
+    fcntl = None
+
+# Linhas processadas por bloco na busca exata (limita a memória temporária)
+SEARCH_BLOCK_ROWS = 65536
+
+class VectorIndex:
+    """
+    Índice vetorial local com busca por produto interno
+
+    Os vetores são normalizados e guardados como float32 num arquivo mapeado
+    em memória (`vectors.f32`); um log de metadados (`meta.jsonl`) registra o
+    ID e os valores dimensionais de cada linha e as remoções. Reinserir um ID
+    marca a linha anterior como removida. A busca é exata por padrão; no modo
+    "ivf" os vetores são agrupados por k-means e só os grupos mais próximos
+    da consulta são examinados.
+
+    Vários processos podem abrir o mesmo diretório: cada operação toma um
+    bloqueio de arquivo (exclusivo nas gravações, compartilhado nas buscas) e
+    antes aplica o que os outros processos acrescentaram ao log.
+    """
+
+    def __init__(self, path, mode="exact", nlist=256, nprobe=8, ivf_min_rows=20000):
+        """
+        Args:
+            path: Diretório do índice
+            mode: "exact" ou "ivf" (aproximado)
+            nlist: Número de grupos do modo ivf
+            nprobe: Grupos examinados por consulta no modo ivf
+            ivf_min_rows: Abaixo deste tamanho a busca é sempre exata
+        """
+        self.path = path
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._meta_file = None
+        self._reset()
+
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, "lock"), "a")
+        self._lock_depth = 0
+        self._load()
+
+    def _reset(self):
+        """Descarta o estado em memória (antes de reler o log)"""
+        self.dim = None
+        self.count = 0
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._matrix = None
+        self._ids = []
+        self._metadata = []
+        self._rows = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._deleted = 0
+
+        # Estado do modo ivf (reconstruído sob demanda)
+        self._centroids = None
+        self._lists = None
+        self._trained_rows = 0
+
+        # Geração do arquivo de vetores (incrementada a cada compactação) e
+        # posição até onde o log já foi lido
+        self._generation = 0
+        if self._meta_file is not None:
+            self._meta_file.close()
+        self._meta_file = None
+        self._meta_inode = None
+        self._meta_offset = 0
+
+    def _generation_path(self, generation):
+        name = f"vectors.{generation}.f32" if generation else "vectors.f32"
+        return os.path.join(self.path, name)
+
+    @property
+    def _vectors_path(self):
+        return self._generation_path(self._generation)
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.jsonl")
+
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive):
+        """Bloqueio entre processos; chamadas aninhadas reaproveitam o da chamada externa"""
+        if self._lock_depth == 0 and fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0 and fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        """Reproduz o log de metadados e mapeia os vetores gravados"""
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync(writer=True)
+            # Arquivos de vetores de compactações interrompidas antes da troca do log
+            current = os.path.basename(self._vectors_path)
+            for name in os.listdir(self.path):
+                if name.startswith("vectors.") and name.endswith(".f32") and name != current:
+                    os.remove(os.path.join(self.path, name))
+
+            if self.count and self._deleted > self.count // 2:
+                self.compact()
+
+    def _sync(self, writer=False):
+        """
+        Aplica as linhas do log gravadas desde a última leitura (por este ou outros processos)
+
+        Deve ser chamado com o bloqueio de arquivo. Se o log foi substituído
+        por uma compactação, o índice é relido por inteiro.
+
+        Args:
+            writer: Com o bloqueio exclusivo, descarta a última linha incompleta
+                deixada por uma gravação interrompida
+        """
+        try:
+            stat = os.stat(self._meta_path)
+        except FileNotFoundError:
+            return
+        if self._meta_inode is not None and stat.st_ino != self._meta_inode:
+            self._reset()
+        self._meta_inode = stat.st_ino
+        if stat.st_size == self._meta_offset:
+            return
+
+        with open(self._meta_path, "rb") as f:
+            f.seek(self._meta_offset)
+            data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if writer and complete < len(data):
+            with open(self._meta_path, "r+b") as f:
+                f.truncate(self._meta_offset + complete)
+        self._meta_offset += complete
+
+        records = []
+        for line in data[:complete].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+        header = next((r for r in records if "dim" in r), None)
+        if header is not None:
+            self.dim = header["dim"]
+            self._generation = header.get("generation", 0)
+        if self.dim is None:
+            return
+
+        # Vetores acrescentados por outros processos aumentam o arquivo mapeado
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = max(size // (4 * self.dim), 1)
+        if self._matrix is None or capacity > self._matrix.shape[0]:
+            self._open_matrix(capacity)
+
+        first_row = self.count
+        for record in records:
+            if "id" in record:
+                self._register(record["id"], record.get("dimensional_values"))
+            elif "delete" in record:
+                self._tombstone(record["delete"])
+        if self._centroids is not None and self.count > first_row:
+            self._assign_ivf(first_row, np.asarray(self._matrix[first_row:self.count]))
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            if self._meta_file is not None:
+                self._meta_file.close()
+                self._meta_file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def __len__(self):
+        return self.count - self._deleted
+
+    def _open_matrix(self, capacity):
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        # O arquivo só cresce: pode ter sido ampliado por outro processo
+        size = capacity * self.dim * 4
+        if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(size)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive[:capacity]
+        self._alive = alive
+
+    def _append_meta(self, record):
+        if self._meta_file is None:
+            self._meta_file = open(self._meta_path, "a", encoding="utf-8")
+        self._meta_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._meta_file.flush()
+        # Linhas deste processo não precisam ser relidas em _sync
+        self._meta_offset = self._meta_file.tell()
+        self._meta_inode = os.fstat(self._meta_file.fileno()).st_ino
+
+    def _register(self, item_id, metadata):
+        row = self.count
+        previous = self._rows.get(item_id)
+        if previous is not None:
+            self._alive[previous] = False
+            self._deleted += 1
+        self._ids.append(item_id)
+        self._metadata.append(metadata)
+        self._rows[item_id] = row
+        self._alive[row] = True
+        self.count += 1
+        return row
+
+    def _tombstone(self, item_id):
+        row = self._rows.pop(item_id, None)
+        if row is not None:
+            self._alive[row] = False
+            self._deleted += 1
+        return row is not None
+
+    def add(self, item_id, vector, metadata=None):
+        """
+        Insere (ou substitui) o vetor de um item
+
+        Args:
+            item_id: ID do item (ex.: ID da sessão)
+            vector: Vetor do item (normalizado aqui)
+            metadata: Dados devolvidos junto com os resultados da busca
+        """
+        self.add_many([(item_id, vector, metadata)])
+
+    def add_many(self, items):
+        """Insere vários itens de uma vez (lista de (item_id, vector, metadata))"""
+        if not items:
+            return
+        vectors = _normalize(np.asarray([vector for _, vector, _ in items], dtype=np.float32))
+
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync(writer=True)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._append_meta({"dim": self.dim})
+                self._open_matrix(1024)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Dimensão do vetor ({vectors.shape[1]}) difere do índice ({self.dim})")
+
+            needed = self.count + len(items)
+            if needed > self._matrix.shape[0]:
+                capacity = self._matrix.shape[0]
+                while capacity < needed:
+                    capacity *= 2
+                self._open_matrix(capacity)
+
+            # O vetor é gravado antes do metadado: a linha só existe após o registro no log
+            self._matrix[self.count:needed] = vectors
+            for item_id, _, metadata in items:
+                self._register(item_id, metadata)
+                self._append_meta({"id": item_id, "dimensional_values": metadata})
+            if self._centroids is not None:
+                self._assign_ivf(needed - len(items), vectors)
+
+    def delete(self, item_id):
+        """
+        Remove um item (marcação; o espaço é recuperado em compact)
+
+        Returns:
+            bool: Se o item existia
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync(writer=True)
+            if not self._tombstone(item_id):
+                return False
+            self._append_meta({"delete": item_id})
+            return True
+
+    def get(self, item_id):
+        """
+        Returns:
+            np.ndarray: Vetor normalizado do item, ou None
+        """
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            row = self._rows.get(item_id)
+            return None if row is None else np.array(self._matrix[row])
+
+    def search(self, query, k=5, exclude=None):
+        """
+        Busca os itens mais similares (similaridade de cosseno)
+
+        Args:
+            query: Vetor de consulta
+            k: Número de resultados
+            exclude: IDs a ignorar (ex.: a própria sessão)
+
+        Returns:
+            list: Tuplas (item_id, score, metadata) em ordem decrescente de score
+        """
+        return self.search_many([query], k, exclude)[0]
+
+    def search_many(self, queries, k=5, exclude=None):
+        """Busca em lote: uma multiplicação de matrizes para todas as consultas"""
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        excluded = set(exclude or ())
+
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            if not len(self):
+                return [[] for _ in queries]
+
+            # Itens excluídos contam no k pedido e são descartados depois
+            want = min(k + len(excluded), len(self))
+            if self._use_ivf():
+                candidates = self._ivf_candidates(queries)
+            else:
+                candidates = None
+
+            if candidates is None:
+                tops = self._top_rows_exact(queries, want)
+            else:
+                tops = [self._top_rows(query, want, rows) for query, rows in zip(queries, candidates)]
+
+            results = []
+            for top in tops:
+                found = [
+                    (self._ids[row], float(score), self._metadata[row])
+                    for row, score in top
+                    if self._ids[row] not in excluded
+                ]
+                results.append(found[:k])
+            return results
+
+    def _top_rows_exact(self, queries, k):
+        """Maiores produtos internos de cada consulta entre todas as linhas vivas"""
+        best_rows = [[] for _ in queries]
+        best_scores = [[] for _ in queries]
+        # Blocos contíguos: leitura sequencial do arquivo mapeado, uma multiplicação por bloco
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, self.count)
+            scores = self._matrix[start:end] @ queries.T
+            scores[~self._alive[start:end]] = -np.inf
+            rows = np.arange(start, end)
+            for index in range(len(queries)):
+                self._collect(scores[:, index], rows, k, best_rows[index], best_scores[index])
+        return [self._merge(r, s, k) for r, s in zip(best_rows, best_scores)]
+
+    def _top_rows(self, query, k, rows):
+        """Maiores produtos internos entre as linhas vivas de `rows`"""
+        rows = rows[self._alive[rows]]
+        if not len(rows):
+            return []
+        best_rows, best_scores = [], []
+        self._collect(self._matrix[rows] @ query, rows, k, best_rows, best_scores)
+        return self._merge(best_rows, best_scores, k)
+
+    @staticmethod
+    def _merge(best_rows, best_scores, k):
+        rows_all = np.concatenate(best_rows)
+        scores_all = np.concatenate(best_scores)
+        order = np.argsort(-scores_all)[:k]
+        return [
+            (row, score)
+            for row, score in zip(rows_all[order].tolist(), scores_all[order].tolist())
+            if score != -np.inf
+        ]
+
+    @staticmethod
+    def _collect(scores, rows, k, best_rows, best_scores):
+        take = min(k, len(scores))
+        part = np.argpartition(-scores, take - 1)[:take]
+        best_rows.append(rows[part])
+        best_scores.append(scores[part])
+
+    def _use_ivf(self):
+        if self.mode != "ivf" or len(self) < self.ivf_min_rows:
+            return False
+        # Treinar na primeira busca e novamente quando o índice dobrar de tamanho
+        if self._centroids is None or self.count >= 2 * self._trained_rows:
+            self._train_ivf()
+        return True
+
+    def _train_ivf(self, iterations=8, points_per_list=40):
+        """Agrupa os vetores por k-means esférico (centroides normalizados)"""
+        alive_rows = np.flatnonzero(self._alive[:self.count])
+        rng = np.random.default_rng(0)
+        sample = rng.choice(alive_rows, min(self.nlist * points_per_list, len(alive_rows)), replace=False)
+        data = np.asarray(self._matrix[np.sort(sample)])
+        nlist = min(self.nlist, len(data))
+
+        centroids = data[rng.choice(len(data), nlist, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            present, starts = np.unique(labels[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(data[order], starts, axis=0)
+            empty = ~np.bincount(labels, minlength=nlist).astype(bool)
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        assignments = np.empty(self.count, dtype=np.int64)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            block = np.asarray(self._matrix[start:start + SEARCH_BLOCK_ROWS][:self.count - start])
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        # Listas invertidas: linhas de cada grupo, em ordem crescente
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self._centroids = centroids
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        self._trained_rows = self.count
+
+    def _assign_ivf(self, first_row, vectors):
+        """Novas linhas entram no grupo mais próximo até o próximo treino"""
+        labels = np.argmax(vectors @ self._centroids.T, axis=1)
+        for label in np.unique(labels):
+            rows = first_row + np.flatnonzero(labels == label)
+            self._lists[label] = np.concatenate([self._lists[label], rows])
+
+    def _ivf_candidates(self, queries):
+        """Linhas dos `nprobe` grupos mais próximos de cada consulta"""
+        nprobe = min(self.nprobe, len(self._centroids))
+        probes = np.argpartition(-(queries @ self._centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        return [np.sort(np.concatenate([self._lists[label] for label in probe])) for probe in probes]
+
+    def compact(self):
+        """
+        Regrava o índice sem as linhas removidas
+
+        Os vetores vão para o arquivo da geração seguinte e só então o log
+        novo, que aponta para ele, substitui o anterior (os.replace). Uma
+        interrupção deixa o índice antigo ou o novo, nunca os dois misturados.
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync(writer=True)
+            if self.dim is None:
+                return
+            alive_rows = np.flatnonzero(self._alive[:self.count])
+            generation = self._generation + 1
+            vectors_path = self._generation_path(generation)
+            with open(vectors_path, "wb") as f:
+                for start in range(0, len(alive_rows), SEARCH_BLOCK_ROWS):
+                    f.write(np.asarray(self._matrix[alive_rows[start:start + SEARCH_BLOCK_ROWS]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            tmp_meta = self._meta_path + ".tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"dim": self.dim, "generation": generation}) + "\n")
+                for row in alive_rows:
+                    record = {"id": self._ids[row], "dimensional_values": self._metadata[row]}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            previous = self._vectors_path
+            os.replace(tmp_meta, self._meta_path)
+            self._reset()
+            os.remove(previous)
+            self._sync(writer=True)
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
@@ -1,9 +1,22 @@
 import os
+import asyncio
+import datetime
+import tempfile
 import vertexai
 import numpy as np
-from google.cloud import aiplatform
 from vertexai.preview.language_models import TextEmbeddingModel
 
+from app.services.vector.embedding_batcher import EmbeddingBatcher
+from app.services.vector.vector_index import VectorIndex
+from app.services.cache.embedding_cache import EmbeddingCache
+from app.services.structured_output import DIMENSION_FIELDS
+
+# Modelo de embedding (parte da chave do cache de vetores)
+EMBEDDING_MODEL_ID = "textembedding-gecko@001"
+
+# Textos por chamada a get_embeddings (limite do textembedding-gecko@001)
+EMBEDDING_BATCH_SIZE = int(os.getenv("VERTEX_EMBEDDING_BATCH_SIZE", "5"))
+
 class VertexVectorService:
     def __init__(self):
         # Inicializar VertexAI
@@ -11,7 +24,59 @@ class VertexVectorService:
         location = os.getenv('GCP_REGION', 'us-central1')
         
         vertexai.init(project=project_id, location=location)
-        self.embedding_model = TextEmbeddingModel.from_pretrained("textembedding-gecko@001")
+        self.embedding_model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL_ID)
+        
+        # Pedidos concorrentes são agrupados em uma única chamada ao modelo
+        self.batcher = EmbeddingBatcher(
+            self._embed_texts,
+            max_batch_size=EMBEDDING_BATCH_SIZE,
+            max_wait_ms=float(os.getenv("VERTEX_EMBEDDING_MAX_WAIT_MS", "10")),
+            max_concurrency=int(os.getenv("VERTEX_EMBEDDING_MAX_CONCURRENCY", "4"))
+        )
+        
+        # Vetores já calculados, por texto de entrada e modelo
+        self.cache = EmbeddingCache(EMBEDDING_MODEL_ID)
+        
+        # Índice vetorial local (arquivo mapeado em memória)
+        self.index = VectorIndex(
+            os.getenv("VECTOR_INDEX_PATH", os.path.join(tempfile.gettempdir(), "vintra-vector-index")),
+            mode=os.getenv("VECTOR_INDEX_MODE", "exact").lower(),
+            nlist=int(os.getenv("VECTOR_INDEX_IVF_LISTS", "256")),
+            nprobe=int(os.getenv("VECTOR_INDEX_IVF_PROBES", "8")),
+            ivf_min_rows=int(os.getenv("VECTOR_INDEX_IVF_MIN_ROWS", "20000"))
+        )
+    
+    def close(self):
+        """Libera as threads do agrupador de embeddings, o cache e o índice em disco"""
+        self.batcher.close()
+        self.cache.close()
+        self.index.close()
+    
+    async def _get_embeddings(self, texts):
+        """
+        Obtém os vetores de vários textos, consultando o modelo só para os ausentes do cache
+        
+        Returns:
+            list: Vetores, na mesma ordem de `texts`
+        """
+        vectors = await self.cache.get_many(texts)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[index] for index in missing]
+            if len(missing_texts) == 1:
+                fetched = [await self.batcher.embed(missing_texts[0])]
+            else:
+                fetched = await self.batcher.embed_many(missing_texts)
+            # Mesma precisão do cache, para que acertos e falhas gerem vetores idênticos
+            fetched = [np.asarray(vector, dtype=np.float32) for vector in fetched]
+            await self.cache.set_many(missing_texts, fetched)
+            for index, vector in zip(missing, fetched):
+                vectors[index] = vector
+        return vectors
+    
+    def _embed_texts(self, texts):
+        """Chamada síncrona ao modelo para uma lista de textos"""
+        return [embedding.values for embedding in self.embedding_model.get_embeddings(texts)]
         
     async def create_dimensional_embedding(self, dimensional_analysis, session_text):
         """
@@ -25,6 +90,31 @@ class VertexVectorService:
             dict: Embedding criado e metadados
         """
         # Criar texto combinado com valores dimensionais
+        dim_text = self._build_embedding_text(dimensional_analysis, session_text)
+        
+        # Obter embedding do texto (cache ou lote com pedidos concorrentes)
+        embedding = (await self._get_embeddings([dim_text]))[0]
+        
+        return self._embedding_result(embedding, dimensional_analysis)
+    
+    async def create_dimensional_embeddings(self, items):
+        """
+        Cria embeddings para várias análises com o mínimo de chamadas ao modelo
+        
+        Args:
+            items: Lista de tuplas (dimensional_analysis, session_text)
+            
+        Returns:
+            list: Embeddings criados, na mesma ordem de `items`
+        """
+        texts = [self._build_embedding_text(analysis, text) for analysis, text in items]
+        embeddings = await self._get_embeddings(texts)
+        return [
+            self._embedding_result(embedding, analysis)
+            for embedding, (analysis, _) in zip(embeddings, items)
+        ]
+    
+    def _build_embedding_text(self, dimensional_analysis, session_text):
         dim_text = f"""
         Análise dimensional VINTRA:
         - Valência Emocional (v1): {dimensional_analysis.get('v1', 0)}
@@ -42,10 +132,9 @@ class VertexVectorService:
         
         Resumo da sessão: {session_text[:1000]}  # Limitado a 1000 caracteres
         """
-        
-        # Obter embedding do texto
-        embedding = self.embedding_model.get_embeddings([dim_text])[0].values
-        
+        return dim_text
+    
+    def _embedding_result(self, embedding, dimensional_analysis):
         # Normalizar embedding
         norm = np.linalg.norm(embedding)
         if norm > 0:
@@ -56,7 +145,8 @@ class VertexVectorService:
         return {
             "embedding": normalized_embedding,
             "dimensions": len(normalized_embedding),
-            "created_at": aiplatform.utils.timestamp_pb2.Timestamp().GetCurrentTime().ToJsonString()
+            "dimensional_values": {name: dimensional_analysis.get(name) for name in DIMENSION_FIELDS},
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
         }
     
     async def search_similar_sessions(self, dimensional_values, limit=5):
@@ -70,19 +160,38 @@ class VertexVectorService:
         Returns:
             list: Sessões similares
         """
-        # Implementação básica - num cenário real usaria Vertex Vector Search
-        # Este é um placeholder para demonstração
+        # Consulta no mesmo espaço dos embeddings armazenados, sem texto de sessão
+        query = (await self._get_embeddings([self._build_embedding_text(dimensional_values, "")]))[0]
+        matches = await asyncio.to_thread(self.index.search, query, limit)
+        return self._format_matches(matches)
+    
+    async def search_similar_to_session(self, session_id, limit=5):
+        """
+        Busca sessões similares a partir do vetor armazenado de uma sessão
         
-        # Simular resultados de busca
+        Args:
+            session_id: ID da sessão de referência
+            limit: Número máximo de resultados
+            
+        Returns:
+            list: Sessões similares, ou None se a sessão não estiver no índice
+        """
+        query = await asyncio.to_thread(self.index.get, session_id)
+        if query is None:
+            return None
+        matches = await asyncio.to_thread(self.index.search, query, limit, [session_id])
+        return self._format_matches(matches)
+    
+    def _format_matches(self, matches):
         return [{
-            "similarity_score": 0.95 - (i * 0.1),
-            "session_id": f"session_{i+1}",
+            "similarity_score": round(score, 4),
+            "session_id": session_id,
             "dimensions": dimensional_values
-        } for i in range(min(3, limit))]
+        } for session_id, score, dimensional_values in matches]
     
     async def store_embedding(self, session_id, embedding_data):
         """
-        Armazena embedding no índice vetorial (mock para MVP)
+        Armazena embedding no índice vetorial
         
         Args:
             session_id: ID da sessão
@@ -91,9 +200,33 @@ class VertexVectorService:
         Returns:
             dict: Status da operação
         """
-        # No MVP real, usaria Vertex AI Vector Search
-        return {
+        return (await self.store_embeddings([(session_id, embedding_data)]))[0]
+    
+    async def store_embeddings(self, items):
+        """
+        Armazena vários embeddings no índice vetorial numa única gravação
+        
+        Args:
+            items: Lista de tuplas (session_id, embedding_data)
+            
+        Returns:
+            list: Status de cada operação
+        """
+        await asyncio.to_thread(self.index.add_many, [
+            (session_id, data["embedding"], data.get("dimensional_values"))
+            for session_id, data in items
+        ])
+        return [{
             "success": True,
             "session_id": session_id,
-            "embedding_id": f"emb_{session_id}_{int(embedding_data['dimensions'])}"
-        }
\ No newline at end of file
+            "embedding_id": f"emb_{session_id}_{int(data['dimensions'])}"
+        } for session_id, data in items]
+    
+    async def delete_embedding(self, session_id):
+        """
+        Remove o embedding de uma sessão do índice
+        
+        Returns:
+            bool: Se a sessão estava no índice
+        """
+        return await asyncio.to_thread(self.index.delete, session_id)
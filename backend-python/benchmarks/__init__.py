@@ -0,0 +1 @@
+# VINTRA Benchmarks
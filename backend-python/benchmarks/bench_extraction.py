@@ -0,0 +1,84 @@
+"""
+Benchmark da extração de respostas do modelo
+
+Compara o parser de passagem única (`app.services.response_parser`) com a
+extração original por regex (`legacy_extractor`) no corpus gravado em
+`benchmarks/corpus`, incluindo variantes muito grandes geradas a partir dele.
+
+Uso (a partir de backend-python/):
+    python -m benchmarks.bench_extraction [--repeat N]
+"""
+import os
+import json
+import time
+import argparse
+
+from app.services.response_parser import parse_response
+from benchmarks import legacy_extractor
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+
+# Parágrafo de justificativa usado para inflar as respostas
+FILLER = (
+    "Justificativa: o paciente descreve o episódio com riqueza de detalhes, "
+    "retomando eventos do passado e relacionando-os ao momento presente; "
+    "observa-se variação de tom ao longo do relato. "
+)
+
+def load_corpus():
+    with open(os.path.join(CORPUS_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+
+    corpus = []
+    for name, spec in expected.items():
+        with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+            corpus.append((name, f.read(), spec))
+
+    # Variantes grandes: resposta completa (~8k tokens) e resposta patológica (~2 MB)
+    base_name, base_text, base_spec = corpus[0]
+    corpus.append((f"{base_name} (8k tokens)", _inflate(base_text, 32_000), base_spec))
+    corpus.append((f"{base_name} (2 MB)", _inflate(base_text, 2_000_000), base_spec))
+    return corpus
+
+def _inflate(text, size):
+    """Insere justificativas longas após cada linha de dimensão até atingir `size` caracteres"""
+    lines = text.split("\n")
+    targets = sum(1 for line in lines if line.startswith("v"))
+    per_line = max(1, (size - len(text)) // (len(FILLER) * targets))
+    return "\n".join(line + "\n" + FILLER * per_line if line.startswith("v") else line for line in lines)
+
+def score(parsed, spec):
+    """Fração dos campos esperados extraídos corretamente"""
+    checks = [abs(parsed.get(key, float("nan")) - value) < 1e-9 for key, value in spec["values"].items()]
+    checks += [bool(parsed.get(section)) for section in spec["sections"]]
+    checks.append(len(parsed.get("recomendacoes") or []) == spec["recommendations"])
+    return sum(checks) / len(checks)
+
+def run(repeat):
+    corpus = load_corpus()
+    print(f"{'resposta':<34} {'tamanho':>10} {'impl':<8} {'acurácia':>9} {'ms/resp':>10} {'MB/s':>8}")
+    totals = {"legado": [0.0, 0.0], "novo": [0.0, 0.0]}
+
+    for name, text, spec in corpus:
+        n = 1 if len(text) > 1_000_000 else repeat
+        for impl, parse in (("legado", legacy_extractor.parse_response), ("novo", parse_response)):
+            start = time.perf_counter()
+            for _ in range(n):
+                parsed = parse(text)
+            elapsed = (time.perf_counter() - start) / n
+            accuracy = score(parsed, spec)
+            totals[impl][0] += accuracy
+            totals[impl][1] += elapsed
+            print(
+                f"{name:<34} {len(text):>10} {impl:<8} {accuracy:>9.0%} "
+                f"{elapsed * 1000:>10.3f} {len(text) / elapsed / 1e6:>8.1f}"
+            )
+
+    print()
+    for impl, (accuracy, elapsed) in totals.items():
+        print(f"{impl:<8} acurácia média {accuracy / len(corpus):.0%}, tempo total {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200, help="repetições por resposta")
+    run(parser.parse_args().repeat)
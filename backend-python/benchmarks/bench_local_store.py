@@ -0,0 +1,61 @@
+"""
+Benchmark do armazenamento local do modo de emulação do Firestore
+
+Mede, para volumes crescentes, a gravação em massa, a listagem paginada por
+cursor, a leitura por ID e a consulta das sessões de um paciente (coluna
+indexada) em `LocalDocumentStore`, num banco temporário.
+
+Uso (a partir de backend-python/):
+    python -m benchmarks.bench_local_store [--sizes 1000,10000,100000] [--queries Q]
+"""
+import os
+import time
+import random
+import argparse
+import datetime
+import tempfile
+
+from app.services.local_document_store import LocalDocumentStore
+
+def run(sizes, queries, page_size=100):
+    rng = random.Random(0)
+    print(f"{'sessões':>10} {'gravação s':>11} {'página ms':>10} {'get ms':>8} {'consulta ms':>12}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = LocalDocumentStore(os.path.join(directory, "bench.db"))
+            patients = [store.new_id() for _ in range(max(1, size // 20))]
+            now = datetime.datetime.now()
+
+            start = time.perf_counter()
+            ids = store.set_many("sessoes", [
+                (None, {"paciente_id": rng.choice(patients), "data": now, "transcricao": "x" * 200})
+                for _ in range(size)
+            ])
+            write = time.perf_counter() - start
+
+            start = time.perf_counter()
+            cursor = None
+            for _ in range(queries):
+                page = store.list("sessoes", page_size, cursor, fields=("paciente_id", "data"))
+                cursor = page[-1][0] if len(page) == page_size else None
+            page_ms = (time.perf_counter() - start) * 1000 / queries
+
+            start = time.perf_counter()
+            for _ in range(queries):
+                store.get("sessoes", rng.choice(ids))
+            get_ms = (time.perf_counter() - start) * 1000 / queries
+
+            start = time.perf_counter()
+            for _ in range(queries):
+                store.list("sessoes", page_size, where=("paciente_id", rng.choice(patients)))
+            query_ms = (time.perf_counter() - start) * 1000 / queries
+
+            store.close()
+            print(f"{size:>10} {write:>11.2f} {page_ms:>10.2f} {get_ms:>8.3f} {query_ms:>12.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="sessões gravadas")
+    parser.add_argument("--queries", type=int, default=200, help="operações medidas por tamanho")
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.queries)
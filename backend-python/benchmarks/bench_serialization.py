@@ -0,0 +1,102 @@
+"""
+Benchmark da serialização de análises dimensionais e pacientes
+
+Compara o caminho anterior (percurso genérico para o Firestore; resposta por
+jsonable_encoder + json.dumps, com validação do response_model nos pacientes)
+com os serializadores compilados por modelo (`app.services.serialization`),
+e mostra o tamanho da resposta completa, sem raw_response e comprimida.
+
+Uso (a partir de backend-python/):
+    python -m benchmarks.bench_serialization [--repeat N]
+"""
+import os
+import gzip
+import json
+import time
+import datetime
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.patient import Patient
+from app.services.serialization import analysis_serializer, patient_serializer, prepare_for_storage
+from app.services.structured_output import DIMENSION_FIELDS
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+
+def sample_analysis():
+    """Análise persistida típica, com a resposta bruta do modelo do corpus"""
+    with open(os.path.join(CORPUS_DIR, "cabecalhos_negrito.txt"), encoding="utf-8") as f:
+        raw_response = f.read() * 4
+    analysis = {name: 5.0 for name in DIMENSION_FIELDS}
+    analysis.update({
+        "id": "a" * 32,
+        "sessao_id": "s" * 32,
+        "trajetoria": {f"{label}_{name}": 0.1234 for label in ("velocidade", "tendencia", "volatilidade") for name in DIMENSION_FIELDS},
+        "sintese_narrativa": "O paciente relata melhora do sono e maior disposição. " * 6,
+        "formulacao_integrativa": "Observa-se reorganização da perspectiva temporal. " * 6,
+        "recomendacoes": ["Manter a frequência semanal das sessões."] * 5,
+        "data_criacao": datetime.datetime.now(),
+        "raw_response": raw_response,
+        "persistencia": {"firestore": "ok", "neo4j": "ok", "vector": "ok"},
+        "cache": "miss"
+    })
+    return analysis
+
+def sample_patient():
+    return {
+        "id": "p" * 32,
+        "nome": "Ana Souza",
+        "data_nascimento": datetime.date(1990, 1, 1),
+        "data_criacao": datetime.datetime.now(),
+        "genero": "F",
+        "contato": {"telefone": "0000-0000", "email": "ana@example.com"},
+        "metadata": None
+    }
+
+def legacy_json(data):
+    """Resposta padrão do FastAPI: jsonable_encoder e JSONResponse"""
+    return json.dumps(
+        jsonable_encoder(data), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+def timed(function, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(data)
+    return (time.perf_counter() - start) * 1e6 / repeat
+
+def run(repeat):
+    analysis = sample_analysis()
+    patient = sample_patient()
+    patients = [dict(patient, id=f"{index:032d}") for index in range(100)]
+
+    cases = [
+        ("análise → Firestore", analysis,
+         prepare_for_storage, analysis_serializer.to_storage),
+        ("análise → JSON", analysis,
+         legacy_json, lambda data: analysis_serializer.dumps(data, frozenset(("*",)))),
+        ("análise → JSON sem raw_response", analysis,
+         legacy_json, analysis_serializer.dumps),
+        ("paciente → JSON (response_model)", patient,
+         lambda data: legacy_json(Patient(**data)), patient_serializer.dumps),
+        ("100 pacientes → JSON (response_model)", patients,
+         lambda rows: legacy_json([Patient(**data) for data in rows]), patient_serializer.dumps_many),
+    ]
+
+    print(f"{'caso':<40} {'anterior µs':>12} {'novo µs':>10} {'ganho':>7}")
+    for name, data, legacy, compiled in cases:
+        before = timed(legacy, data, repeat)
+        after = timed(compiled, data, repeat)
+        print(f"{name:<40} {before:>12.1f} {after:>10.1f} {before / after:>6.1f}x")
+
+    full = analysis_serializer.dumps(analysis, frozenset(("*",)))
+    default = analysis_serializer.dumps(analysis)
+    print()
+    print(f"resposta da análise: completa {len(full)} B, sem raw_response {len(default)} B, "
+          f"gzip {len(gzip.compress(default, 6))} B")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2000, help="repetições por caso")
+    run(parser.parse_args().repeat)
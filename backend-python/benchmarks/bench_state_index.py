@@ -0,0 +1,64 @@
+"""
+Benchmark da busca de estados dimensionais similares
+
+Compara a varredura completa (equivalente em NumPy à consulta Cypher antiga:
+distância de todos os estados, ordenação e LIMIT) com `DimensionalStateIndex`
+para tamanhos crescentes do grafo, e confere se os resultados coincidem.
+
+Uso (a partir de backend-python/):
+    python -m benchmarks.bench_state_index [--sizes 1000,10000,100000] [--queries Q]
+"""
+import time
+import argparse
+
+import numpy as np
+
+from app.services.graph.state_index import DimensionalStateIndex
+from app.services.structured_output import DIMENSION_FIELDS
+
+def synthetic_states(rng, size):
+    """Estados em torno de perfis clínicos recorrentes, nas escalas do modelo"""
+    profiles = rng.uniform(0, 10, (200, len(DIMENSION_FIELDS)))
+    points = profiles[rng.integers(0, len(profiles), size)] + rng.normal(0, 0.7, (size, len(DIMENSION_FIELDS)))
+    return np.clip(points, 0, 10)
+
+def full_scan(points, query, k):
+    distances = np.sqrt(((points - query) ** 2).sum(axis=1))
+    return np.argsort(distances, kind="stable")[:k].tolist()
+
+def run(sizes, queries, k=10):
+    rng = np.random.default_rng(0)
+    print(f"{'estados':>10} {'construção s':>13} {'varredura ms':>13} {'índice ms':>10} {'idênticos':>10}")
+    for size in sizes:
+        points = synthetic_states(rng, size)
+        index = DimensionalStateIndex()
+
+        start = time.perf_counter()
+        index.add_many([
+            {"node_id": row, **dict(zip(DIMENSION_FIELDS, point))}
+            for row, point in enumerate(points.tolist())
+        ])
+        build = time.perf_counter() - start
+
+        sample = points[rng.integers(0, size, queries)] + rng.normal(0, 0.3, (queries, len(DIMENSION_FIELDS)))
+
+        start = time.perf_counter()
+        expected = [full_scan(points, query, k) for query in sample]
+        scan_ms = (time.perf_counter() - start) * 1000 / queries
+
+        start = time.perf_counter()
+        found = [index.search(dict(zip(DIMENSION_FIELDS, query)), k) for query in sample]
+        index_ms = (time.perf_counter() - start) * 1000 / queries
+
+        same = sum(
+            [node_id for node_id, _, _, _ in result] == rows
+            for result, rows in zip(found, expected)
+        )
+        print(f"{size:>10} {build:>13.2f} {scan_ms:>13.2f} {index_ms:>10.2f} {same:>6}/{queries}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="tamanhos do grafo")
+    parser.add_argument("--queries", type=int, default=100, help="consultas por tamanho")
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.queries)
@@ -0,0 +1,73 @@
+"""
+Benchmark do índice vetorial local
+
+Mede inserção, busca exata e busca aproximada (ivf) de `VectorIndex` com
+vetores sintéticos agrupados na dimensão do textembedding-gecko (768), e a
+revocação do modo ivf em relação à busca exata.
+
+Uso (a partir de backend-python/):
+    python -m benchmarks.bench_vector_index [--rows N] [--queries Q]
+"""
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from app.services.vector.vector_index import VectorIndex
+
+DIM = 768
+
+def synthetic_vectors(rng, rows, centers=1000):
+    """Vetores em torno de `centers` centros, como sessões de perfis parecidos"""
+    base = rng.normal(size=(centers, DIM)).astype(np.float32)
+    labels = rng.integers(0, centers, rows)
+    return base[labels] + 0.3 * rng.normal(size=(rows, DIM)).astype(np.float32)
+
+def run(rows, queries, k=10):
+    rng = np.random.default_rng(0)
+    path = tempfile.mkdtemp(prefix="vintra-bench-index-")
+    try:
+        index = VectorIndex(path, mode="ivf", nlist=512, nprobe=16)
+
+        start = time.perf_counter()
+        for offset in range(0, rows, 20000):
+            vectors = synthetic_vectors(rng, min(20000, rows - offset))
+            index.add_many([(f"s{offset + i}", vector, None) for i, vector in enumerate(vectors)])
+        print(f"inserção: {rows} vetores em {time.perf_counter() - start:.2f}s")
+
+        sample = [index.get(f"s{i}") + 0.05 * rng.normal(size=DIM).astype(np.float32)
+                  for i in rng.integers(0, rows, queries)]
+
+        start = time.perf_counter()
+        index.search(sample[0], k)
+        print(f"treino ivf (primeira busca): {time.perf_counter() - start:.2f}s")
+
+        results = {}
+        for mode in ("exact", "ivf"):
+            index.mode = mode
+            start = time.perf_counter()
+            results[mode] = [index.search(query, k) for query in sample]
+            elapsed = (time.perf_counter() - start) * 1000 / len(sample)
+
+            start = time.perf_counter()
+            index.search_many(sample, k)
+            batched = (time.perf_counter() - start) * 1000 / len(sample)
+            print(f"{mode:<6} {elapsed:8.2f} ms/consulta  {batched:8.2f} ms/consulta em lote")
+
+        recall = np.mean([
+            len({item for item, _, _ in approx} & {item for item, _, _ in exact}) / k
+            for approx, exact in zip(results["ivf"], results["exact"])
+        ])
+        print(f"revocação ivf@{k}: {recall:.3f}")
+        index.close()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000, help="vetores no índice")
+    parser.add_argument("--queries", type=int, default=50, help="consultas medidas")
+    args = parser.parse_args()
+    run(args.rows, args.queries)
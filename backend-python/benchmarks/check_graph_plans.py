@@ -0,0 +1,38 @@
+"""
+Verificação dos planos de execução das consultas do grafo
+
+Aplica o esquema e executa EXPLAIN em cada consulta de Neo4jService
+(app/services/graph/queries.py). Termina com código 1 se algum plano contiver
+varredura de rótulo (NodeByLabelScan/AllNodesScan) não prevista, o que indica
+consulta sem índice ou restrição correspondente.
+
+Uso (a partir de backend-python/, com NEO4J_URI/NEO4J_USERNAME/NEO4J_PASSWORD):
+    python -m benchmarks.check_graph_plans
+"""
+import sys
+import asyncio
+import argparse
+
+from app.services.graph.neo4j_service import Neo4jService
+from app.services.graph.queries import PLAN_CHECKS
+
+async def run():
+    service = Neo4jService()
+    try:
+        version = await service.ensure_schema()
+        print(f"esquema na versão {version}")
+        failures = await service.check_query_plans()
+    finally:
+        await service.close()
+
+    for name, (_, _, full_scan) in PLAN_CHECKS.items():
+        if name in failures:
+            status = "FALHA: " + ", ".join(failures[name])
+        else:
+            status = "ok (varredura completa prevista)" if full_scan else "ok"
+        print(f"{name:<30} {status}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__.splitlines()[1]).parse_args()
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,70 @@
+"""
+Extração original (regex por dimensão), mantida apenas como referência de
+desempenho e acurácia para `bench_extraction.py`.
+"""
+import re
+
+def extract_dimensional_values(response_text):
+    values = {}
+
+    for i in range(1, 9):
+        pattern = rf"v[₁-₁₀]?{i}\s*[:=]\s*([+-]?\d+(\.\d+)?)"
+        match = re.search(pattern, response_text, re.IGNORECASE)
+        if match:
+            values[f"v{i}"] = float(match.group(1))
+
+    pattern = r"v[₁₀]?10\s*[:=]\s*([+-]?\d+(\.\d+)?)"
+    match = re.search(pattern, response_text, re.IGNORECASE)
+    if match:
+        values["v10"] = float(match.group(1))
+
+    past_pattern = r"v[₉]?9.*passado\s*[:=]\s*([+-]?\d+(\.\d+)?)"
+    present_pattern = r"v[₉]?9.*presente\s*[:=]\s*([+-]?\d+(\.\d+)?)"
+    future_pattern = r"v[₉]?9.*futuro\s*[:=]\s*([+-]?\d+(\.\d+)?)"
+
+    past_match = re.search(past_pattern, response_text, re.IGNORECASE)
+    present_match = re.search(present_pattern, response_text, re.IGNORECASE)
+    future_match = re.search(future_pattern, response_text, re.IGNORECASE)
+
+    if past_match:
+        values["v9_past"] = float(past_match.group(1))
+    if present_match:
+        values["v9_present"] = float(present_match.group(1))
+    if future_match:
+        values["v9_future"] = float(future_match.group(1))
+
+    return values
+
+def extract_section(text, section_name, next_section=None):
+    pattern = rf"##\s*{section_name}(.*?)"
+    if next_section:
+        pattern += rf"(?=##\s*{next_section}|$)"
+    else:
+        pattern += r"$"
+
+    match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+    if match:
+        return match.group(1).strip()
+    return ""
+
+def extract_recommendations(text):
+    recommendations_text = extract_section(text, "Recomendações")
+
+    pattern = r"(?:^\d+\.\s*|\*\s*|-)?\s*(.+?)(?=$|\n\d+\.|\n\*|\n-)"
+    matches = re.findall(pattern, recommendations_text, re.MULTILINE)
+
+    recommendations = [item.strip() for item in matches if item.strip()]
+
+    if not recommendations and recommendations_text:
+        return [recommendations_text]
+
+    return recommendations
+
+def parse_response(text):
+    """Mesma saída de `app.services.response_parser.parse_response`, pelo caminho antigo"""
+    return {
+        **extract_dimensional_values(text),
+        "sintese_narrativa": extract_section(text, "Síntese Narrativa", "Formulação Integrativa"),
+        "formulacao_integrativa": extract_section(text, "Formulação Integrativa", "Recomendações"),
+        "recomendacoes": extract_recommendations(text),
+    }
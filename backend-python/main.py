@@ -1,10 +1,15 @@
 import os
 import time
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
-from app.api.endpoints import patients, analysis
+from app.api.endpoints import patients, analysis, batch, jobs, files
+from app.services.container import ServiceContainer
+from app.services.jobs.worker_pool import JobWorkerPool
 
 # Configurar logging
 logging.basicConfig(
@@ -13,12 +18,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger("vintra-backend")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serviços compartilhados por todo o worker (clientes construídos uma única vez)
+    services = app.state.services
+    await services.startup()
+    
+    # Workers da fila de análises (JOB_WORKERS=0 desativa neste processo)
+    job_workers = JobWorkerPool(services.get("jobs"), jobs.build_job_handlers(services))
+    await job_workers.start()
+    try:
+        yield
+    finally:
+        await job_workers.stop()
+        await services.shutdown()
+
 app = FastAPI(
     title="VINTRA Backend Python",
     version="1.0.0",
-    description="Backend Python para o sistema VINTRA de análise dimensional clínica"
+    description="Backend Python para o sistema VINTRA de análise dimensional clínica",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Contêiner de serviços; testes podem usar app.state.services.override(...)
+app.state.services = ServiceContainer()
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -28,9 +53,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressão das respostas grandes (análises, listagens, exportações NDJSON)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "1024")),
+    compresslevel=int(os.getenv("GZIP_COMPRESS_LEVEL", "6"))
+)
+
 # Adicionar routers
 app.include_router(patients.router, prefix="/api/pacientes", tags=["pacientes"])
+# Lote antes da análise: /analisar/lote não deve ser capturado por /analisar/{sessao_id}
+app.include_router(batch.router, prefix="/api/vintra", tags=["analise"])
 app.include_router(analysis.router, prefix="/api/vintra", tags=["analise"])
+app.include_router(jobs.router, prefix="/api/vintra", tags=["jobs"])
+app.include_router(files.router, prefix="/api", tags=["arquivos"])
 
 # Middleware para logging de requisições
 @app.middleware("http")
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints.jobs import ANALYSIS_JOB, build_job_handlers
+from app.services.jobs.job_queue import RUNNING, JobQueue
+from app.services.jobs.worker_pool import JobContext
+from app.services.structured_output import DIMENSION_FIELDS
+
+class FakeClaude:
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze_dimensional_cached(self, transcription, patient_context=None):
+        self.calls += 1
+        return {name: 5.0 for name in DIMENSION_FIELDS}, "miss"
+
+class FakeFirestore:
+    def __init__(self, failures):
+        self.failures = failures
+        self.ids = []
+
+    async def store_dimensional_analysis(self, session_id, analysis_data, analysis_id=None):
+        self.ids.append(analysis_id)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Firestore indisponível")
+        return analysis_id
+
+class FakeNeo4j:
+    def __init__(self):
+        self.state_ids = []
+
+    async def preview_trajectory(self, session_id, dimensional_values):
+        return None
+
+    async def create_dimensional_state(self, session_id, dimensional_data, state_id=None):
+        self.state_ids.append(state_id)
+        return state_id
+
+class FakeVector:
+    async def create_dimensional_embedding(self, analysis, transcription):
+        return [1.0]
+
+    async def store_embedding(self, session_id, embedding):
+        return True
+
+class FakeServices:
+    def __init__(self, **instances):
+        self.instances = instances
+
+    async def aget(self, name):
+        return self.instances[name]
+
+def test_analysis_retry_reuses_generation_and_analysis_id(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    claude, firestore, neo4j = FakeClaude(), FakeFirestore(failures=1), FakeNeo4j()
+    handler = build_job_handlers(FakeServices(
+        claude=claude, firestore=firestore, neo4j=neo4j, vector=FakeVector()
+    ))[ANALYSIS_JOB]
+    job_id = queue.enqueue(ANALYSIS_JOB, {"transcricao": "texto", "sessao_id": "s1"})
+
+    async def attempt():
+        job = queue.claim("worker")
+        try:
+            return await handler(job["payload"], JobContext(queue, job, "worker"))
+        finally:
+            # Devolve o job à fila, como o pool faz após uma falha
+            if queue.get(job_id)["status"] == RUNNING:
+                queue.fail(job_id, "worker", "falha")
+                with queue._lock:
+                    queue._conn.execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job_id,))
+
+    with pytest.raises(HTTPException):
+        asyncio.run(attempt())
+    resultado = asyncio.run(attempt())
+
+    assert claude.calls == 1
+    assert firestore.ids == [job_id, job_id]
+    assert neo4j.state_ids == [job_id]
+    assert resultado["id"] == job_id
+    assert resultado["cache"] == "miss"
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.services.graph.neo4j_service import Neo4jService
+from app.services.graph.state_index import DimensionalStateIndex
+from app.services.structured_output import DIMENSION_FIELDS
+
+def _state(node_id, value, created_at):
+    return {
+        "node_id": node_id,
+        "session_id": f"sessao-{node_id}",
+        "patient_id": "p1",
+        "created_at": created_at,
+        **{name: value for name in DIMENSION_FIELDS}
+    }
+
+def test_negative_weights_are_rejected():
+    index = DimensionalStateIndex()
+    index.add_many([_state("a", 1.0, 1.0)])
+
+    with pytest.raises(ValueError):
+        index.search({name: 1.0 for name in DIMENSION_FIELDS}, weights={"v1": -1.0})
+
+def test_states_written_elsewhere_are_found_on_the_next_search(monkeypatch):
+    monkeypatch.setenv("NEO4J_URI", "bolt://localhost:7687")
+    monkeypatch.setenv("NEO4J_USERNAME", "neo4j")
+    monkeypatch.setenv("NEO4J_PASSWORD", "senha")
+    monkeypatch.delenv("NEO4J_STATE_INDEX_REFRESH_SECONDS", raising=False)
+    service = Neo4jService()
+    # Estados no banco (created_at em milissegundos, como em LOAD_STATES)
+    stored = [_state("a", 1.0, 1000)]
+    reads = []
+
+    async def execute_read(work, since=None):
+        reads.append(since)
+        return [dict(state) for state in stored if since is None or state["created_at"] >= since]
+
+    service._execute_read = execute_read
+
+    async def run():
+        query = {name: 5.0 for name in DIMENSION_FIELDS}
+        first = await service.find_similar_states(query, limit=1)
+        # Gravado por outro processo: não passa por _index_new_states deste
+        stored.append(_state("b", 5.0, 2000))
+        second = await service.find_similar_states(query, limit=1)
+        with pytest.raises(ValueError):
+            await service.find_similar_states(query, weights={"v2": -0.5})
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        asyncio.run(service.driver.close())
+
+    assert first[0]["node_id"] == "a"
+    assert second[0]["node_id"] == "b"
+    # Carga completa, depois só os estados desde a marca d'água
+    assert reads == [None, 1000]
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.services.storage_service import StorageService
+
+def _service(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCAL_DEVELOPMENT", "true")
+    monkeypatch.setenv("STORAGE_UPLOAD_DIR", str(tmp_path / "uploads"))
+    service = StorageService()
+    service.temp_dir = str(tmp_path / "storage")
+    return service
+
+async def _chunks(*parts):
+    for part in parts:
+        await asyncio.sleep(0.01)
+        yield part
+
+def test_concurrent_appends_to_the_same_offset_write_once(tmp_path, monkeypatch):
+    service = _service(tmp_path, monkeypatch)
+
+    async def run():
+        upload = await service.start_upload("sessoes/longa.wav", size=8)
+        results = await asyncio.gather(
+            service.append_upload(upload["upload_id"], 0, _chunks(b"ab", b"cd")),
+            service.append_upload(upload["upload_id"], 0, _chunks(b"wx", b"yz")),
+            return_exceptions=True
+        )
+        final = await service.append_upload(upload["upload_id"], 4, _chunks(b"efgh"), final=True)
+        return results, final, await service.download_file("sessoes/longa.wav")
+
+    (first, second), final, content = asyncio.run(run())
+
+    # A segunda parte espera a primeira e é recusada pelo offset já avançado
+    assert first["offset"] == 4
+    assert isinstance(second, ValueError)
+    assert final["complete"] and final["offset"] == 8
+    assert content == b"abcdefgh"
+    assert service._upload_locks == {}
+
+def test_append_to_unknown_upload_raises(tmp_path, monkeypatch):
+    service = _service(tmp_path, monkeypatch)
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(service.append_upload("0" * 32, 0, _chunks(b"x")))
+    assert not (tmp_path / "uploads" / f"{'0' * 32}.lock").exists()
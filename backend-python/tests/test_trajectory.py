@@ -0,0 +1,34 @@
+import asyncio
+
+from app.services.graph.trajectory import Trajectory, TrajectoryEngine
+from app.services.structured_output import DIMENSION_FIELDS
+
+def _state(index, value):
+    return {"node_id": index, "session_id": f"s{index}", "created_at": index,
+            **{name: value for name in DIMENSION_FIELDS}}
+
+def test_append_ignores_any_state_already_in_the_series():
+    trajectory = Trajectory.from_history([_state(index, float(index % 5)) for index in range(40)])
+
+    trajectory.append(_state(2, 9.0))
+    trajectory.append(_state(40, 1.0))
+    trajectory.append(_state(40, 1.0))
+
+    assert len(trajectory) == 41
+
+def test_preview_many_chains_states_of_the_same_patient():
+    history = [_state(index, float(index)) for index in range(3)]
+
+    async def loader(patient_id):
+        return history
+
+    engine = TrajectoryEngine(loader)
+    first, second = _state(3, 6.0), _state(4, 2.0)
+
+    previews = asyncio.run(engine.preview_many("p", [first, second]))
+
+    expected = Trajectory.from_history(history + [first, second]).summary()
+    assert previews[1] == expected
+    assert previews[0] == Trajectory.from_history(history + [first]).summary()
+    # A série em cache não recebe os estados da prévia
+    assert len(engine.cache.get("p")) == 3
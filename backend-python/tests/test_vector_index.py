@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from app.services.vector.vector_index import VectorIndex
+
+def _vectors(count, dim=8):
+    return np.random.default_rng(0).normal(size=(count, dim)).astype(np.float32)
+
+def test_writes_from_another_instance_are_visible(tmp_path):
+    vectors = _vectors(6)
+    first, second = VectorIndex(str(tmp_path)), VectorIndex(str(tmp_path))
+    first.add_many([(f"s{i}", vectors[i], {"i": i}) for i in range(3)])
+    second.add_many([(f"s{i}", vectors[i], {"i": i}) for i in range(3, 6)])
+    first.delete("s4")
+
+    assert first.search(vectors[5], 1)[0][0] == "s5"
+    assert second.search(vectors[1], 1)[0][0] == "s1"
+    assert second.get("s4") is None
+
+def test_compact_swaps_files_and_other_instances_reload(tmp_path):
+    vectors = _vectors(6)
+    writer, reader = VectorIndex(str(tmp_path)), VectorIndex(str(tmp_path))
+    writer.add_many([(f"s{i}", vectors[i], {"i": i}) for i in range(6)])
+    for i in range(4):
+        writer.delete(f"s{i}")
+
+    writer.compact()
+
+    assert sorted(os.listdir(tmp_path)) == ["lock", "meta.jsonl", "vectors.1.f32"]
+    assert [item_id for item_id, _, _ in reader.search(vectors[5], 2)] == ["s5", "s4"]
+    reader.add("s0", vectors[0])
+    assert writer.search(vectors[0], 1)[0][0] == "s0"
+
+def test_interrupted_compaction_leaves_the_previous_index(tmp_path):
+    vectors = _vectors(3)
+    index = VectorIndex(str(tmp_path))
+    index.add_many([(f"s{i}", vectors[i], None) for i in range(3)])
+    index.close()
+    # Arquivo da próxima geração gravado, log ainda não substituído
+    (tmp_path / "vectors.1.f32").write_bytes(b"\0" * 64)
+    with open(tmp_path / "meta.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"id": "parcial"')
+
+    index = VectorIndex(str(tmp_path))
+
+    assert len(index) == 3
+    assert not (tmp_path / "vectors.1.f32").exists()
+    index.add("s3", vectors[0])
+    index.close()
+    assert len(VectorIndex(str(tmp_path))) == 4
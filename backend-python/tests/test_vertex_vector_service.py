@@ -0,0 +1,53 @@
+import asyncio
+
+import numpy as np
+
+from app.services.vector import vertex_vector_service
+from app.services.vector.vertex_vector_service import VertexVectorService
+from app.services.structured_output import DIMENSION_FIELDS
+
+class FakeEmbedding:
+    def __init__(self, values):
+        self.values = values
+
+class FakeEmbeddingModel:
+    """Vetor determinístico por texto, no lugar do textembedding-gecko"""
+
+    def get_embeddings(self, texts):
+        return [FakeEmbedding(self._vector(text)) for text in texts]
+
+    @staticmethod
+    def _vector(text):
+        rng = np.random.default_rng(sum(text.encode("utf-8")))
+        return rng.normal(size=16).tolist()
+
+def _service(tmp_path, monkeypatch):
+    monkeypatch.setenv("VECTOR_INDEX_PATH", str(tmp_path / "index"))
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.db"))
+    monkeypatch.setattr(vertex_vector_service.vertexai, "init", lambda **kwargs: None)
+    monkeypatch.setattr(
+        vertex_vector_service.TextEmbeddingModel, "from_pretrained",
+        staticmethod(lambda model_id: FakeEmbeddingModel())
+    )
+    return VertexVectorService()
+
+def test_stored_embeddings_are_searchable_by_session(tmp_path, monkeypatch):
+    service = _service(tmp_path, monkeypatch)
+
+    async def run():
+        for index in range(3):
+            analysis = {name: float(index + 1) for name in DIMENSION_FIELDS}
+            embedding = await service.create_dimensional_embedding(analysis, f"sessão {index}")
+            assert embedding["dimensions"] == 16
+            assert embedding["created_at"]
+            status = await service.store_embedding(f"s{index}", embedding)
+            assert status["success"]
+        return await service.search_similar_to_session("s0", limit=5)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        service.close()
+
+    assert sorted(result["session_id"] for result in results) == ["s1", "s2"]
+    assert results[0]["dimensions"]["v1"] in (2.0, 3.0)
@@ -0,0 +1,126 @@
+import asyncio
+
+from app.services.jobs.job_queue import FAILED, RUNNING, SUCCEEDED, JobQueue
+from app.services.jobs.worker_pool import JobWorkerPool
+
+def _queue(tmp_path, visibility_timeout=30):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.visibility_timeout = visibility_timeout
+    queue.retry_base_delay = 0.01
+    return queue
+
+async def _wait_for_status(queue, job_id, statuses, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await queue.aget(job_id)
+        if job["status"] in statuses:
+            return job
+        assert asyncio.get_running_loop().time() < deadline, job
+        await asyncio.sleep(0.01)
+
+def test_retry_resumes_from_checkpoint(tmp_path):
+    queue = _queue(tmp_path)
+    generations = []
+
+    async def handler(payload, job):
+        if "analise" not in job.checkpoint:
+            generations.append(job.attempt)
+            await job.save(analise={"v1": payload["v1"]})
+        if job.attempt == 1:
+            raise RuntimeError("Firestore indisponível")
+        return job.checkpoint["analise"]
+
+    async def run():
+        pool = JobWorkerPool(queue, {"analise": handler}, concurrency=1, poll_interval=0.01)
+        job_id = queue.enqueue("analise", {"v1": 7.0})
+        await pool.start()
+        try:
+            return await _wait_for_status(queue, job_id, (SUCCEEDED, FAILED))
+        finally:
+            await pool.stop()
+
+    job = asyncio.run(run())
+
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 2
+    assert job["result"] == {"v1": 7.0}
+    # A etapa gravada no checkpoint não se repete na nova tentativa
+    assert generations == [1]
+
+def test_lost_lease_cancels_the_handler(tmp_path):
+    queue = _queue(tmp_path, visibility_timeout=0.1)
+    started, cancelled = [], []
+
+    async def handler(payload, job):
+        started.append(job.attempt)
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(job.attempt)
+            raise
+        return "não deveria concluir"
+
+    async def run():
+        pool = JobWorkerPool(queue, {"analise": handler}, concurrency=1, poll_interval=0.01)
+        job_id = queue.enqueue("analise", {})
+        await pool.start()
+        try:
+            while not started:
+                await asyncio.sleep(0.01)
+            # Outro worker assume o job (como após o prazo de visibilidade expirar)
+            with queue._lock:
+                queue._conn.execute("UPDATE jobs SET worker_id = 'outro' WHERE id = ?", (job_id,))
+            while not cancelled:
+                await asyncio.sleep(0.01)
+            return await queue.aget(job_id), pool._tasks[0].done()
+        finally:
+            await pool.stop(timeout=1)
+
+    job, worker_done = asyncio.run(run())
+
+    assert cancelled == [1]
+    assert job["status"] == RUNNING
+    assert job["worker_id"] == "outro"
+    assert not worker_done
+
+def test_worker_survives_queue_and_heartbeat_errors(tmp_path):
+    queue = _queue(tmp_path, visibility_timeout=0.1)
+    extend_lease = queue.aextend_lease
+    complete = queue.acomplete
+    errors = {"extend": 1, "complete": 1}
+
+    async def flaky_extend(job_id, worker_id):
+        if errors["extend"]:
+            errors["extend"] -= 1
+            raise RuntimeError("banco bloqueado")
+        return await extend_lease(job_id, worker_id)
+
+    async def flaky_complete(job_id, worker_id, result):
+        if errors["complete"]:
+            errors["complete"] -= 1
+            raise RuntimeError("banco bloqueado")
+        return await complete(job_id, worker_id, result)
+
+    queue.aextend_lease = flaky_extend
+    queue.acomplete = flaky_complete
+
+    async def handler(payload, job):
+        await asyncio.sleep(0.2)
+        return payload["n"]
+
+    async def run():
+        pool = JobWorkerPool(queue, {"analise": handler}, concurrency=1, poll_interval=0.01)
+        queue.enqueue("analise", {"n": 1})
+        await pool.start()
+        try:
+            # A conclusão do primeiro job falha; o worker segue e conclui o segundo
+            second = queue.enqueue("analise", {"n": 2})
+            return await _wait_for_status(queue, second, (SUCCEEDED, FAILED))
+        finally:
+            await pool.stop()
+
+    job = asyncio.run(run())
+
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == 2
+    assert errors == {"extend": 0, "complete": 0}
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.services.graph.write_buffer import GraphWriteBuffer
+
+class FakeIngest:
+    """ingest que falha o lote inteiro se alguma linha for inválida"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, **rows):
+        (kind, batch), = rows.items()
+        self.calls.append([row["id"] for row in batch])
+        if any(row.get("invalid") for row in batch):
+            raise ValueError("linha inválida")
+        return {kind: [f"node-{row['id']}" for row in batch]}
+
+async def _submit_all(buffer, rows):
+    return await asyncio.gather(
+        *(buffer.submit("states", row) for row in rows), return_exceptions=True
+    )
+
+def test_batch_failure_only_fails_the_invalid_write():
+    ingest = FakeIngest()
+    buffer = GraphWriteBuffer(ingest, max_size=8, max_wait_ms=1000)
+    rows = [{"id": index, "invalid": index == 5} for index in range(8)]
+
+    results = asyncio.run(_submit_all(buffer, rows))
+
+    assert isinstance(results[5], ValueError)
+    assert [result for index, result in enumerate(results) if index != 5] == [
+        f"node-{index}" for index in range(8) if index != 5
+    ]
+    # Lote inteiro, depois as metades, até a linha inválida sozinha
+    assert ingest.calls[0] == list(range(8))
+    assert [5] in ingest.calls
+    assert len(ingest.calls) < 1 + len(rows)
+
+def test_successful_batch_is_written_once():
+    ingest = FakeIngest()
+    buffer = GraphWriteBuffer(ingest, max_size=4, max_wait_ms=1000)
+
+    results = asyncio.run(_submit_all(buffer, [{"id": index} for index in range(4)]))
+
+    assert results == ["node-0", "node-1", "node-2", "node-3"]
+    assert ingest.calls == [[0, 1, 2, 3]]
+
+def test_single_invalid_write_raises():
+    buffer = GraphWriteBuffer(FakeIngest(), max_size=1)
+
+    with pytest.raises(ValueError):
+        asyncio.run(buffer.submit("states", {"id": 0, "invalid": True}))